@@ -1,18 +1,35 @@
+import os
 import time
+import argparse
 import json
 import logging
 import threading
 import random
+import heapq
+import itertools
+import csv
+import sqlite3
+import math
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+from collections import deque, OrderedDict
 import requests
+import httpx
+import websockets
+from requests.adapters import HTTPAdapter
 import hmac
 import hashlib
 import urllib.parse
 import queue
 import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait as futures_wait, FIRST_COMPLETED
 import numpy as np
 import pandas as pd
 # Import pandas_ta instead of talib
 import pandas_ta as ta
+try:
+    import orjson # Optional: faster JSON decoding for large payloads such as klines
+except ImportError:
+    orjson = None
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup,  constants
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
@@ -35,6 +52,8 @@ BINANCE_API_KEY = "API_KEY"  # Your Binance API key
 BINANCE_API_SECRET = "API_SECRET" 
 BINANCE_API_URL = "https://fapi.binance.com"  # Futures API URL
 BINANCE_TEST_API_URL = "https://testnet.binancefuture.com"  # Testnet URL for testing
+BINANCE_WS_URL = "wss://fstream.binance.com"  # Futures market/user data streams
+BINANCE_TEST_WS_URL = "wss://stream.binancefuture.com"  # Testnet streams
 
 # Trading modes
 TRADING_MODES = {
@@ -74,7 +93,12 @@ INDICATOR_SETTINGS = {
     "bb_period": 20,
     "bb_std": 2.0,
     "signal_check_interval": 30,  # Check for signals every 30 seconds
-    "candle_timeframe": "5m"  # 5-minute candles
+    "candle_timeframe": "5m",  # 5-minute candles
+    "candle_store_capacity": 500,  # Candles kept in memory per (symbol, timeframe)
+    "candle_refresh_min_interval": 1.0,  # Seconds during which a refreshed series is reused without any request
+    "use_incremental_indicators": False,  # Update RSI/EMA/BB per candle over the whole stored history instead of recomputing the last window
+    "indicator_cache_size": 1000,  # Indicator results kept for reuse (least recently used are dropped first)
+    "indicator_cache_ttl_seconds": 600  # Drop cached indicator results older than this
 }
 
 # Bot configuration
@@ -91,12 +115,19 @@ CONFIG = {
     "trading_mode": "safe",     # Current trading mode
     "max_daily_trades": 10,    # Maximum number of trades per day
     "signal_check_interval": 30,  # Check for signals every 30 seconds
+    "signal_evaluation_mode": "candle_close", # "candle_close": evaluate each pair once per closed candle; "poll": every signal_check_interval
+    "intra_candle_update_seconds": 0, # In candle_close mode, also re-evaluate a pair this often while its candle is open (0 = off)
+    "candle_close_grace_seconds": 2, # Without the market stream, wait this long after a candle closes before evaluating it
     "use_testnet": False,        # Use Binance testnet for testing
     "use_real_trading": True,  # Set to True to enable real trading with Binance API
     "daily_profit_target": 5.0,    # Daily profit target in percentage
     "daily_loss_limit": 3.0,       # Daily loss limit in percentage
     "hedge_mode": True,  # Use hedge mode (separate long and short positions)
     "post_trade_delay_seconds": 2, # jika Anda mau jeda setelah trade(detik)
+    "account_snapshot_ttl_seconds": 2.0, # Reuse one /fapi/v2/account response for this long across sizing, stats and commands
+    "entry_fill_timeout_seconds": 3, # Cancel what is left of an entry order that hasn't filled after this long
+    "position_monitor_interval": 5, # Seconds between batched position/order checks that complete active trades
+    "position_monitor_grace_seconds": 10, # Don't treat a missing position as closed until the trade is this old
     "dynamic_watchlist_symbols": [ # Daftar koin XXXUSDT yang diizinkan untuk dipantau
         "BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "ADAUSDT", "XRPUSDT", "DOGEUSDT", 
         "AVAXUSDT", "DOTUSDT", "MATICUSDT", "SHIBUSDT", "TRXUSDT", "LINKUSDT", 
@@ -109,13 +140,394 @@ CONFIG = {
     "min_24h_volume_usdt_for_scan": 5000000, # Min volume 24jam (USDT) agar koin dipertimbangkan (5 Juta USDT)
     "dynamic_scan_interval_seconds": 300, # Seberapa sering scan (detik), misal 5 menit
     "dynamic_pair_selection": True,  # Aktifkan/Nonaktifkan fitur ini     
-    "api_call_delay_seconds": 0.5, # Jeda 0.5 detik antar panggilan API klines di scanner    
+    "ticker_24hr_cache_ttl_seconds": 60, # Reuse one bulk 24h ticker download for this long
+    "scan_max_workers": 8,          # Worker threads evaluating watchlist symbols in parallel
+    "scan_symbol_timeout_seconds": 15, # Give up on a symbol whose evaluation takes longer than this
+    "rate_limit_weight_per_minute": 2400, # Binance request-weight limit per IP per minute
+    "rate_limit_orders_per_10s": 300,     # Binance order limit per 10 seconds
+    "rate_limit_orders_per_minute": 1200, # Binance order limit per minute
+    "rate_limit_safety_margin": 0.9,      # Fraction of each limit the bot allows itself to use
+    "http_pool_size": 20,          # Max keep-alive connections kept open to the Binance API
+    "http_connect_timeout": 3.05,  # Seconds to wait for a TCP/TLS connection
+    "http_read_timeout": 10.0,     # Seconds to wait for a response once connected
+    "use_market_stream": True,     # Keep candles of active pairs current over WebSocket instead of polling REST
+    "market_stream_url": None,     # Override the stream endpoint (e.g. a local replay server); None = Binance default
+    "use_user_data_stream": True,  # Mirror balances, positions and open orders from the user data stream instead of polling the account
+    "user_stream_url": None,       # Override the user data stream endpoint; None = Binance default
+    "listen_key_keepalive_seconds": 1800, # How often the listenKey is extended (it expires after 60 minutes)
+    "historical_data_dir": "data/klines", # Where downloaded candle history (.npy per symbol/timeframe) is kept
+    "warm_candle_store_from_disk": True,  # Preload stored history into the candle store at startup
+    "symbol_metadata_dir": "data",     # Where the exchangeInfo symbol filters are kept between restarts
+    "symbol_metadata_ttl_seconds": 21600, # Download exchangeInfo again once the stored copy is this old
+    "completed_trades_in_memory": 500, # Completed trades kept in memory; older ones are appended to completed_trades_spill_path
+    "completed_trades_spill_path": "data/completed_trades.jsonl",
+    "trade_journal_path": "data/trades.db", # SQLite journal of trades and daily stats, replayed on startup; None = memory only
+    "trade_journal_flush_interval": 0.5,   # Seconds the journal writer gathers updates before committing them together
+    "margin_type": None,           # "ISOLATED" or "CROSSED" to enforce per traded symbol; None = leave the account setting alone
     "leverage": 5                  # Default leverage
 }
 
+class TradeRecord:
+    """
+    One trade. Fixed __slots__ keep it compact; dict-style access (trade['symbol'],
+    trade.get('exit_price', 0)) keeps it a drop-in for the trade dicts used so far.
+    Fields that were never set behave like missing dict keys.
+    """
+
+    __slots__ = (
+        'id', 'timestamp', 'symbol', 'action', 'position_side', 'order_side', 'entry_price', 'quantity',
+        'take_profit', 'stop_loss', 'leverage', 'entry_time', 'completed', 'mode', 'entry_order_id',
+        'tp_order_id', 'sl_order_id', 'real_trade', 'order_latency_ms', 'exit_price', 'exit_time',
+        'exit_timestamp', 'profit_pct', 'leveraged_profit_pct', 'profit_usdt', 'exit_reason'
+    )
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(f"Unknown trade field: {key}") from None
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__ if hasattr(self, key)}
+
+class TradeStore:
+    """
+    Thread-safe store of open and completed trades.
+
+    Open trades are indexed by id, symbol, position side and entry/TP/SL order id, so the
+    checks made every cycle are dict lookups. Completed trades keep running totals; only
+    the newest `max_completed` stay in memory, older ones are appended to `spill_path`
+    as JSON lines. When `journal` is set, every added or completed trade is also
+    handed to it.
+    """
+
+    def __init__(self, max_completed=500, spill_path=None, journal=None):
+        self.lock = threading.RLock()
+        self.journal = journal # TradeJournal, or None to keep trades in memory only
+        self.max_completed = max_completed
+        self.spill_path = spill_path
+        self.open = {} # id -> TradeRecord
+        self.open_by_symbol = {} # symbol -> {id: TradeRecord}
+        self.open_by_side = {} # position side -> {id: TradeRecord}
+        self.open_by_order_id = {} # entry/TP/SL order id -> TradeRecord
+        self.completed = deque()
+        self.spilled = 0
+        self.completed_totals = {'count': 0, 'wins': 0, 'losses': 0, 'profit_usdt': 0.0, 'leveraged_profit_pct': 0.0}
+        self._last_id = 0
+
+    def next_id(self):
+        """Unique, increasing trade id (milliseconds since the epoch)"""
+        with self.lock:
+            self._last_id = max(int(time.time() * 1000), self._last_id + 1)
+            return self._last_id
+
+    def _order_ids(self, trade):
+        return [order_id for order_id in (trade.get('entry_order_id'), trade.get('tp_order_id'), trade.get('sl_order_id')) if order_id]
+
+    def _add_open(self, trade):
+        self.open[trade['id']] = trade
+        self.open_by_symbol.setdefault(trade['symbol'], {})[trade['id']] = trade
+        self.open_by_side.setdefault(trade['position_side'], {})[trade['id']] = trade
+        for order_id in self._order_ids(trade):
+            self.open_by_order_id[order_id] = trade
+
+    def add(self, trade):
+        with self.lock:
+            self._add_open(trade)
+        if self.journal:
+            self.journal.record_trade(trade)
+        return trade
+
+    def restore(self, open_trades, completed_trades, completed_totals):
+        """Load trades replayed from the journal, without writing them back to it"""
+        with self.lock:
+            for trade in open_trades:
+                self._add_open(trade)
+            self.completed.extend(completed_trades)
+            while len(self.completed) > self.max_completed:
+                self.completed.popleft()
+            self.completed_totals.update(completed_totals)
+            ids = [t['id'] for t in open_trades] + [t['id'] for t in completed_trades]
+            self._last_id = max([self._last_id] + ids)
+
+    def _remove_open(self, trade):
+        if self.open.pop(trade['id'], None) is None:
+            return False
+        for index, key in ((self.open_by_symbol, trade['symbol']), (self.open_by_side, trade['position_side'])):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(trade['id'], None)
+                if not bucket:
+                    del index[key]
+        for order_id in self._order_ids(trade):
+            if self.open_by_order_id.get(order_id) is trade:
+                del self.open_by_order_id[order_id]
+        return True
+
+    def complete(self, trade):
+        """Move an open trade to the completed trades; False if it wasn't open"""
+        with self.lock:
+            if not self._remove_open(trade):
+                return False
+            profit_usdt = trade.get('profit_usdt', 0.0)
+            totals = self.completed_totals
+            totals['count'] += 1
+            totals['profit_usdt'] += profit_usdt
+            totals['leveraged_profit_pct'] += trade.get('leveraged_profit_pct', 0.0)
+            if profit_usdt > 0:
+                totals['wins'] += 1
+            elif profit_usdt < 0:
+                totals['losses'] += 1
+            self.completed.append(trade)
+            overflow = [self.completed.popleft() for _ in range(len(self.completed) - self.max_completed)]
+        if self.journal:
+            self.journal.record_trade(trade)
+        if overflow:
+            self._spill(overflow)
+        return True
+
+    def _spill(self, trades):
+        if not self.spill_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+            with open(self.spill_path, 'a') as f:
+                for trade in trades:
+                    f.write(json.dumps(trade.to_dict()) + "\n")
+            with self.lock:
+                self.spilled += len(trades)
+        except Exception as e:
+            logger.error(f"TradeStore: failed to spill {len(trades)} completed trades to {self.spill_path}: {e}")
+
+    def has_open_trade(self, symbol):
+        with self.lock:
+            return symbol in self.open_by_symbol
+
+    def get_open_trades(self, symbol=None, position_side=None):
+        with self.lock:
+            if symbol is not None:
+                trades = self.open_by_symbol.get(symbol, {}).values()
+            elif position_side is not None:
+                trades = self.open_by_side.get(position_side, {}).values()
+            else:
+                trades = self.open.values()
+            return [t for t in trades if position_side is None or t['position_side'] == position_side]
+
+    def open_count(self):
+        with self.lock:
+            return len(self.open)
+
+    def find_open_by_order_id(self, order_id):
+        with self.lock:
+            return self.open_by_order_id.get(order_id)
+
+    def get_completed_trades(self):
+        """Completed trades still in memory, oldest first"""
+        with self.lock:
+            return list(self.completed)
+
+    def get_completed_totals(self):
+        """Count, wins, losses and summed P/L over every completed trade, including spilled ones"""
+        with self.lock:
+            return dict(self.completed_totals)
+
+    def get_recent_trades(self, limit):
+        """Newest `limit` trades, open and completed"""
+        with self.lock:
+            candidates = list(self.open.values()) + list(itertools.islice(reversed(self.completed), limit))
+        return sorted(candidates, key=lambda t: t['timestamp'], reverse=True)[:limit]
+
+class TradeJournal:
+    """
+    Trades and daily stats persisted to SQLite, so a restart can pick up the open trades.
+
+    record_trade() and record_daily_stats() only copy the row onto a queue. A writer
+    thread commits everything that queued up within `flush_interval` seconds in one
+    transaction, so the trading threads never wait on the disk and a crash loses at most
+    the last interval. Rows of a failed commit are kept and retried every `retry_interval`
+    seconds, merged with newer updates. The database runs in WAL mode; load() replays it
+    at startup.
+    """
+
+    def __init__(self, path, flush_interval=0.5, max_batch=500, retry_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval
+        self.queue = queue.Queue()
+        self.writer_thread = None
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY, symbol TEXT, completed INTEGER, "
+                "profit_usdt REAL, leveraged_profit_pct REAL, data TEXT)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS daily_stats (date TEXT PRIMARY KEY, data TEXT)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self.writer_thread and self.writer_thread.is_alive():
+            return
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="TradeJournal", daemon=True)
+        self.writer_thread.start()
+
+    def record_trade(self, trade):
+        self.queue.put(('trade', trade.to_dict() if isinstance(trade, TradeRecord) else dict(trade)))
+
+    def record_daily_stats(self, stats):
+        self.queue.put(('daily_stats', dict(stats)))
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is committed; False on timeout (e.g. while commits fail)"""
+        if not self.writer_thread or not self.writer_thread.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Commit what is queued and stop the writer thread"""
+        if self.writer_thread and self.writer_thread.is_alive():
+            self.queue.put(('stop', None))
+            self.writer_thread.join(timeout)
+        self.writer_thread = None
+
+    def _writer_loop(self):
+        conn = self._connect()
+        # Latest unwritten state of each trade / day, kept until a commit succeeds
+        pending_trades, pending_stats, waiting = {}, {}, []
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    # With rows left over from a failed commit, wake up to retry them
+                    batch = [self.queue.get(timeout=self.retry_interval if pending_trades or pending_stats else None)]
+                except queue.Empty:
+                    batch = []
+                # Collect what else arrives within the interval so a burst becomes one commit
+                deadline = time.monotonic() + self.flush_interval
+                while batch and len(batch) < self.max_batch and batch[-1][0] not in ('flush', 'stop'):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                for kind, payload in batch:
+                    if kind == 'trade':
+                        pending_trades[payload['id']] = payload
+                    elif kind == 'daily_stats':
+                        pending_stats[payload['date']] = payload
+                    elif kind == 'flush':
+                        waiting.append(payload)
+                    elif kind == 'stop':
+                        stopping = True
+
+                if self._write(conn, pending_trades, pending_stats):
+                    pending_trades.clear()
+                    pending_stats.clear()
+                    for done in waiting:
+                        done.set()
+                    waiting.clear()
+            if pending_trades or pending_stats:
+                logger.error(f"TradeJournal: stopped with {len(pending_trades)} trades and {len(pending_stats)} daily stats unwritten")
+        finally:
+            conn.close()
+
+    def _write(self, conn, trades, stats):
+        """Commit {id: trade} and {date: stats} in one transaction; False if it failed"""
+        if not trades and not stats:
+            return True
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO trades (id, symbol, completed, profit_usdt, leveraged_profit_pct, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(t['id'], t['symbol'], int(bool(t.get('completed'))), t.get('profit_usdt', 0.0),
+                      t.get('leveraged_profit_pct', 0.0), json.dumps(t)) for t in trades.values()]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO daily_stats (date, data) VALUES (?, ?)",
+                    [(date, json.dumps(s)) for date, s in stats.items()]
+                )
+            self.rows_written += len(trades) + len(stats)
+            self.batches_written += 1
+            return True
+        except Exception as e:
+            self.write_errors += 1
+            logger.error(
+                f"TradeJournal: failed to write {len(trades)} trades and {len(stats)} daily stats to {self.path}, "
+                f"retrying in {self.retry_interval}s: {e}"
+            )
+            return False
+
+    def _decode(self, data):
+        fields = json.loads(data)
+        return TradeRecord(**{key: value for key, value in fields.items() if key in TradeRecord.__slots__})
+
+    def load(self, max_completed=500, date=None):
+        """
+        Replay the journal: open trades, the newest `max_completed` completed trades
+        (oldest first), totals over all completed trades and the stats stored for `date`.
+        """
+        conn = self._connect()
+        try:
+            open_trades = [self._decode(row[0]) for row in conn.execute("SELECT data FROM trades WHERE completed = 0 ORDER BY id")]
+            completed_trades = [self._decode(row[0]) for row in conn.execute(
+                "SELECT data FROM (SELECT id, data FROM trades WHERE completed = 1 ORDER BY id DESC LIMIT ?) ORDER BY id",
+                (max_completed,)
+            )]
+            count, wins, losses, profit_usdt, leveraged_profit_pct = conn.execute(
+                "SELECT COUNT(*), SUM(profit_usdt > 0), SUM(profit_usdt < 0), TOTAL(profit_usdt), TOTAL(leveraged_profit_pct) "
+                "FROM trades WHERE completed = 1"
+            ).fetchone()
+            row = conn.execute("SELECT data FROM daily_stats WHERE date = ?", (date,)).fetchone() if date else None
+        finally:
+            conn.close()
+        return {
+            'open_trades': open_trades,
+            'completed_trades': completed_trades,
+            'completed_totals': {
+                'count': count, 'wins': wins or 0, 'losses': losses or 0,
+                'profit_usdt': profit_usdt, 'leveraged_profit_pct': leveraged_profit_pct
+            },
+            'daily_stats': json.loads(row[0]) if row else None
+        }
+
 # Active trades and daily statistics
-ACTIVE_TRADES = []
-COMPLETED_TRADES = []
+TRADE_STORE = TradeStore(
+    max_completed=CONFIG.get("completed_trades_in_memory", 500),
+    spill_path=CONFIG.get("completed_trades_spill_path")
+)
 DAILY_STATS = {
     "date": datetime.now().strftime("%Y-%m-%d"),
     "total_trades": 0,
@@ -128,15 +540,501 @@ DAILY_STATS = {
     "roi": 0.0
 }
 
-# Symbol information cache
-SYMBOL_INFO = {}
+# Symbol metadata indexes, one per API base URL (see get_symbol_index)
+SYMBOL_INDEXES = {}
+SYMBOL_INDEXES_LOCK = threading.Lock()
+
+def _klines_weight(params):
+    """Request weight of /fapi/v1/klines, which scales with the limit parameter"""
+    limit = int((params or {}).get('limit', 500))
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+# Request weight per (method, path). Callables receive the request params for
+# endpoints whose weight depends on them (e.g. "all symbols" variants).
+ENDPOINT_WEIGHTS = {
+    ('GET', '/fapi/v1/exchangeInfo'): 1,
+    ('GET', '/fapi/v1/time'): 1,
+    ('GET', '/fapi/v2/account'): 5,
+    ('GET', '/fapi/v2/positionRisk'): 5,
+    ('GET', '/fapi/v1/ticker/price'): lambda params: 1 if (params or {}).get('symbol') else 2,
+    ('GET', '/fapi/v1/ticker/24hr'): lambda params: 1 if (params or {}).get('symbol') else 40,
+    ('GET', '/fapi/v1/klines'): _klines_weight,
+    ('POST', '/fapi/v1/leverage'): 1,
+    ('POST', '/fapi/v1/marginType'): 1,
+    ('GET', '/fapi/v1/positionSide/dual'): 30,
+    ('POST', '/fapi/v1/positionSide/dual'): 1,
+    ('POST', '/fapi/v1/order'): 0,
+    ('POST', '/fapi/v1/batchOrders'): 5,
+    ('GET', '/fapi/v1/openOrders'): lambda params: 1 if (params or {}).get('symbol') else 40,
+    ('GET', '/fapi/v1/order'): 1,
+    ('DELETE', '/fapi/v1/order'): 1,
+    ('DELETE', '/fapi/v1/allOpenOrders'): 1,
+}
+
+# Endpoints that count against the order rate limits rather than (only) the IP weight,
+# with what one request costs on the (10s, 1m) order counters
+ORDER_ENDPOINTS = {
+    ('POST', '/fapi/v1/order'): (1, 1),
+    ('POST', '/fapi/v1/batchOrders'): (5, 1),
+}
+
+class BinanceRateLimiter:
+    """Token-bucket limiter for Binance request weight and order counts.
+
+    Requests reserve their endpoint weight up front; callers only wait when the
+    bucket would go negative, so bursts run at full speed until the budget is
+    actually tight. The X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-* response
+    headers keep the local estimate in line with what Binance has counted, and
+    a 429/418 response blocks all callers until its Retry-After has passed.
+    """
+
+    def __init__(self, weight_per_minute=2400, orders_per_10s=300, orders_per_minute=1200, safety_margin=0.9):
+        self.lock = threading.Lock()
+        self.weight_limit = weight_per_minute
+        # Each bucket: [capacity, tokens, refill per second]
+        self.buckets = {
+            'weight': self._new_bucket(weight_per_minute * safety_margin, 60),
+            'orders_10s': self._new_bucket(orders_per_10s * safety_margin, 10),
+            'orders_1m': self._new_bucket(orders_per_minute * safety_margin, 60),
+        }
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.server_used_weight = None
+        self.server_order_count_10s = None
+        self.server_order_count_1m = None
+        self.throttled_requests = 0
+        self.total_wait = 0.0
+
+    def _new_bucket(self, capacity, window_seconds):
+        return [capacity, capacity, capacity / window_seconds]
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            for bucket in self.buckets.values():
+                bucket[1] = min(bucket[0], bucket[1] + elapsed * bucket[2])
+            self.last_refill = now
+
+    def get_request_weight(self, method, path, params=None):
+        """Look up the request weight of an endpoint (defaults to 1 for unknown endpoints)"""
+        weight = ENDPOINT_WEIGHTS.get((method.upper(), path), 1)
+        return weight(params) if callable(weight) else weight
+
+    def reserve(self, method, path, params=None):
+        """Reserve budget for a request and return how many seconds the caller must wait"""
+        method = method.upper()
+        weight = self.get_request_weight(method, path, params)
+        order_cost = ORDER_ENDPOINTS.get((method, path))
+
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self.blocked_until - now, 0.0)
+
+            reservations = [('weight', weight)]
+            if order_cost:
+                reservations += [('orders_10s', order_cost[0]), ('orders_1m', order_cost[1])]
+            for bucket_name, cost in reservations:
+                if cost <= 0:
+                    continue
+                bucket = self.buckets[bucket_name]
+                bucket[1] -= cost
+                if bucket[1] < 0:
+                    wait = max(wait, -bucket[1] / bucket[2])
+
+            if wait > 0:
+                self.throttled_requests += 1
+                self.total_wait += wait
+        return wait
+
+    def acquire(self, method, path, params=None):
+        """Blocking variant of reserve() for threaded callers; returns the seconds waited"""
+        wait = self.reserve(method, path, params)
+        if wait > 0:
+            logger.debug(f"RateLimiter: throttling {method} {path} for {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, method, path, params=None):
+        """asyncio variant of acquire()"""
+        wait = self.reserve(method, path, params)
+        if wait > 0:
+            logger.debug(f"RateLimiter: throttling {method} {path} for {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers, status_code=200):
+        """Sync the buckets with the usage Binance reports in the response headers"""
+        def header_int(name):
+            value = headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
+
+        used_weight = header_int('X-MBX-USED-WEIGHT-1M')
+        order_count_10s = header_int('X-MBX-ORDER-COUNT-10S')
+        order_count_1m = header_int('X-MBX-ORDER-COUNT-1M')
+
+        with self.lock:
+            self._refill(time.monotonic())
+            for bucket_name, used in (
+                ('weight', used_weight),
+                ('orders_10s', order_count_10s),
+                ('orders_1m', order_count_1m),
+            ):
+                if used is None:
+                    continue
+                bucket = self.buckets[bucket_name]
+                # Never trust a smaller local usage than the one the server reports
+                bucket[1] = min(bucket[1], bucket[0] - used)
+
+            if used_weight is not None:
+                self.server_used_weight = used_weight
+            if order_count_10s is not None:
+                self.server_order_count_10s = order_count_10s
+            if order_count_1m is not None:
+                self.server_order_count_1m = order_count_1m
+
+            if status_code in (418, 429):
+                retry_after = header_int('Retry-After') or 60
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                logger.warning(f"RateLimiter: Binance returned {status_code}, pausing requests for {retry_after}s")
+
+    def get_headroom(self):
+        """Return the remaining budget in each bucket and the last server-reported usage"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            weight_bucket = self.buckets['weight']
+            return {
+                'weight_available': max(weight_bucket[1], 0.0),
+                'weight_capacity': weight_bucket[0],
+                'weight_limit': self.weight_limit,
+                'server_used_weight_1m': self.server_used_weight,
+                'orders_available_10s': max(self.buckets['orders_10s'][1], 0.0),
+                'orders_available_1m': max(self.buckets['orders_1m'][1], 0.0),
+                'server_order_count_10s': self.server_order_count_10s,
+                'server_order_count_1m': self.server_order_count_1m,
+                'blocked_for': max(self.blocked_until - now, 0.0),
+                'throttled_requests': self.throttled_requests,
+                'total_wait_seconds': self.total_wait
+            }
+
+# Shared by every Binance client in the process, since Binance counts weight per IP
+BINANCE_RATE_LIMITER = BinanceRateLimiter(
+    weight_per_minute=CONFIG.get("rate_limit_weight_per_minute", 2400),
+    orders_per_10s=CONFIG.get("rate_limit_orders_per_10s", 300),
+    orders_per_minute=CONFIG.get("rate_limit_orders_per_minute", 1200),
+    safety_margin=CONFIG.get("rate_limit_safety_margin", 0.9)
+)
+
+class BinanceHTTPTransport:
+    """Pooled keep-alive HTTP session shared by all Binance REST calls"""
+
+    def __init__(self, pool_size=20, connect_timeout=3.05, read_timeout=10.0, rate_limiter=None, signer=None):
+        self.session = requests.Session()
+        self.rate_limiter = rate_limiter
+        self.signer = signer # Re-signs signed params whose timestamp went stale while throttled
+        # All traffic goes to a single host, so a handful of host pools is plenty;
+        # pool_maxsize is what bounds the number of concurrent keep-alive sockets.
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.default_timeout = (connect_timeout, read_timeout)
+
+        self._stats_lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.total_latency = 0.0
+
+    def request(self, method, url, params=None, headers=None, timeout=None, **kwargs):
+        """Send a request over the pooled session with a per-request timeout"""
+        path = urllib.parse.urlsplit(url).path
+        if self.rate_limiter:
+            waited = self.rate_limiter.acquire(method, path, params)
+            if waited > 0 and self.signer and params and 'signature' in params:
+                # Binance rejects a timestamp older than recvWindow (5s) with -1021, and a
+                # Retry-After block can hold a request far longer than that
+                params = {key: value for key, value in params.items() if key != 'signature'}
+                params['timestamp'] = int(time.time() * 1000)
+                params['signature'] = self.signer(params)
+
+        start = time.monotonic()
+        failed = False
+        try:
+            response = self.session.request(
+                method, url, params=params, headers=headers,
+                timeout=timeout if timeout is not None else self.default_timeout,
+                **kwargs
+            )
+            if self.rate_limiter:
+                self.rate_limiter.update_from_headers(response.headers, response.status_code)
+            return response
+        except requests.RequestException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            with self._stats_lock:
+                self.request_count += 1
+                self.total_latency += elapsed
+                if failed:
+                    self.error_count += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def get_connection_stats(self):
+        """Return request/connection counters so connection reuse can be verified"""
+        connections_opened = 0
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections_opened += getattr(pool, 'num_connections', 0)
+            pool_requests += getattr(pool, 'num_requests', 0)
+
+        with self._stats_lock:
+            request_count = self.request_count
+            error_count = self.error_count
+            avg_latency_ms = (self.total_latency / request_count * 1000) if request_count else 0.0
+
+        reuse_ratio = (1 - connections_opened / pool_requests) if pool_requests else 0.0
+        return {
+            'requests': request_count,
+            'errors': error_count,
+            'connections_opened': connections_opened,
+            'reused_requests': max(pool_requests - connections_opened, 0),
+            'reuse_ratio': reuse_ratio,
+            'avg_latency_ms': avg_latency_ms
+        }
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+def decode_json(content):
+    """Parse a JSON response body (bytes), using orjson when it is installed"""
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+class SymbolMetadataIndex:
+    """
+    Precision and PRICE_FILTER / LOT_SIZE / MIN_NOTIONAL values of every symbol, built from
+    one exchangeInfo download and stored as JSON so a restart starts warm.
+
+    Filter values stay strings, as Binance sends them, so they remain exact. The index is
+    refreshed once it is older than `ttl_seconds`; a symbol missing from a fresh index
+    (e.g. a new listing) triggers at most one download per `min_refresh_interval`.
+    """
+
+    def __init__(self, path, ttl_seconds=21600, min_refresh_interval=60.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock() # Held by the thread downloading exchangeInfo
+        self.symbols = {}
+        self.quantizers = {} # symbol -> SymbolQuantizer, built on first use
+        self.updated_at = 0.0 # Wall-clock time of the download the index was built from
+        self._last_refresh_attempt = None
+        self.load()
+
+    @staticmethod
+    def parse_symbol(sym_info):
+        """Extract the precision and filter values we need from an exchangeInfo symbol entry"""
+        filters = {f['filterType']: f for f in sym_info.get('filters', [])}
+        price_filter = filters.get('PRICE_FILTER', {})
+        lot_size = filters.get('LOT_SIZE', {})
+        return {
+            'status': sym_info.get('status'),
+            'pricePrecision': sym_info['pricePrecision'],
+            'quantityPrecision': sym_info['quantityPrecision'],
+            'tickSize': price_filter.get('tickSize', '0.01'),
+            'minPrice': price_filter.get('minPrice', '0'),
+            'maxPrice': price_filter.get('maxPrice', '0'),
+            'stepSize': lot_size.get('stepSize', '0.001'),
+            'minQty': lot_size.get('minQty', '0.001'),
+            'maxQty': lot_size.get('maxQty', '0'),
+            'minNotional': filters.get('MIN_NOTIONAL', {}).get('notional', '10')
+        }
+
+    def load(self):
+        """Load the stored index; returns False if there is none or it can't be read"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            with self.lock:
+                self.symbols = data['symbols']
+                self.quantizers = {}
+                self.updated_at = float(data['updated_at'])
+            logger.info(f"SymbolIndex: loaded {len(self.symbols)} symbols from {self.path}")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"SymbolIndex: ignoring unreadable {self.path}: {e}")
+            return False
+
+    def save(self):
+        with self.lock:
+            data = {'updated_at': self.updated_at, 'symbols': self.symbols}
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"SymbolIndex: failed to save {self.path}: {e}")
+
+    def update(self, exchange_info):
+        """Rebuild the index from a full exchangeInfo payload and persist it"""
+        symbols = {sym_info['symbol']: self.parse_symbol(sym_info) for sym_info in exchange_info['symbols']}
+        with self.lock:
+            self.symbols = symbols
+            self.quantizers = {}
+            self.updated_at = time.time()
+        self.save()
+        logger.info(f"SymbolIndex: indexed {len(symbols)} symbols")
+
+    def get(self, symbol):
+        with self.lock:
+            return self.symbols.get(symbol)
+
+    def get_quantizer(self, symbol):
+        with self.lock:
+            quantizer = self.quantizers.get(symbol)
+            if quantizer is None and symbol in self.symbols:
+                quantizer = self.quantizers[symbol] = SymbolQuantizer(self.symbols[symbol])
+            return quantizer
+
+    def is_stale(self):
+        return time.time() - self.updated_at >= self.ttl_seconds
+
+    def needs_refresh(self, symbol):
+        """Cheap pre-check for claim_refresh(): the symbol is unknown or the index is stale"""
+        with self.lock:
+            return symbol not in self.symbols or time.time() - self.updated_at >= self.ttl_seconds
+
+    def claim_refresh(self, symbol):
+        """True if the caller should download exchangeInfo now (stale index, or unknown symbol)"""
+        with self.lock:
+            if symbol in self.symbols and time.time() - self.updated_at < self.ttl_seconds:
+                return False
+            now = time.monotonic()
+            if self._last_refresh_attempt is not None and now - self._last_refresh_attempt < self.min_refresh_interval:
+                return False
+            self._last_refresh_attempt = now
+            return True
+
+class SymbolQuantizer:
+    """
+    Exact price/quantity rounding for one symbol, precompiled from its index entry.
+
+    Prices snap to the nearest tickSize and quantities down to stepSize through Decimal,
+    so results are exact multiples that Binance accepts. check() applies the LOT_SIZE and
+    MIN_NOTIONAL limits before an order is sent. The *_array variants do the same on NumPy
+    arrays in float tick/step units, for batch use.
+    """
+
+    # Guards the float array variants against x / tick landing just below a whole number
+    ARRAY_EPSILON = 1e-9
+
+    def __init__(self, symbol_info):
+        self.tick_size = Decimal(symbol_info['tickSize'])
+        self.step_size = Decimal(symbol_info['stepSize'])
+        self.min_price = Decimal(symbol_info.get('minPrice', '0'))
+        self.max_price = Decimal(symbol_info.get('maxPrice', '0'))
+        self.min_qty = Decimal(symbol_info['minQty'])
+        self.max_qty = Decimal(symbol_info.get('maxQty', '0'))
+        self.min_notional = Decimal(symbol_info['minNotional'])
+        self.price_decimals = max(-self.tick_size.normalize().as_tuple().exponent, 0)
+        self.quantity_decimals = max(-self.step_size.normalize().as_tuple().exponent, 0)
+        self._tick = float(self.tick_size)
+        self._step = float(self.step_size)
+
+    def price(self, price, rounding=ROUND_HALF_UP):
+        """Nearest valid price (a multiple of tickSize)"""
+        units = (Decimal(repr(float(price))) / self.tick_size).to_integral_value(rounding)
+        return float(units * self.tick_size)
+
+    def quantity(self, quantity, rounding=ROUND_DOWN):
+        """Largest valid quantity (a multiple of stepSize) not above `quantity`"""
+        units = (Decimal(repr(float(quantity))) / self.step_size).to_integral_value(rounding)
+        return float(units * self.step_size)
+
+    def check(self, price, quantity):
+        """None if an order of `quantity` at `price` passes the symbol's filters, else the reason it wouldn't"""
+        price = Decimal(repr(float(price)))
+        quantity = Decimal(repr(float(quantity)))
+        if quantity < self.min_qty:
+            return f"quantity {quantity} is below minQty {self.min_qty}"
+        if self.max_qty > 0 and quantity > self.max_qty:
+            return f"quantity {quantity} is above maxQty {self.max_qty}"
+        if price < self.min_price or (self.max_price > 0 and price > self.max_price):
+            return f"price {price} is outside [{self.min_price}, {self.max_price}]"
+        if price * quantity < self.min_notional:
+            return f"notional {price * quantity} is below minNotional {self.min_notional}"
+        return None
+
+    def price_array(self, prices):
+        units = np.floor(np.asarray(prices, dtype=np.float64) / self._tick + (0.5 + self.ARRAY_EPSILON))
+        return np.round(units * self._tick, self.price_decimals)
+
+    def quantity_array(self, quantities):
+        units = np.floor(np.asarray(quantities, dtype=np.float64) / self._step + self.ARRAY_EPSILON)
+        return np.round(units * self._step, self.quantity_decimals)
+
+    def check_array(self, prices, quantities):
+        """Boolean mask of the (price, quantity) pairs that pass the symbol's filters"""
+        prices = np.asarray(prices, dtype=np.float64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+        valid = (quantities >= float(self.min_qty)) & (prices * quantities >= float(self.min_notional))
+        valid &= prices >= float(self.min_price)
+        if self.max_qty > 0:
+            valid &= quantities <= float(self.max_qty)
+        if self.max_price > 0:
+            valid &= prices <= float(self.max_price)
+        return valid
+
+def get_symbol_index(config, base_url):
+    """The SymbolMetadataIndex of an API base URL, shared by every client of that environment"""
+    with SYMBOL_INDEXES_LOCK:
+        index = SYMBOL_INDEXES.get(base_url)
+        if index is None:
+            file_name = "exchange_info_testnet.json" if base_url == BINANCE_TEST_API_URL else "exchange_info.json"
+            index = SYMBOL_INDEXES[base_url] = SymbolMetadataIndex(
+                os.path.join(config.get("symbol_metadata_dir", "data"), file_name),
+                ttl_seconds=config.get("symbol_metadata_ttl_seconds", 21600)
+            )
+        return index
+
+class BinanceAPIBase:
+    """Signing and response parsing shared by the blocking and asyncio Binance clients"""
 
-class BinanceFuturesAPI:
     def __init__(self, config):
         self.config = config
         self.api_key = config["api_key"]
         self.api_secret = config["api_secret"]
         self.base_url = BINANCE_TEST_API_URL if config["use_testnet"] else BINANCE_API_URL
+        self.symbol_index = get_symbol_index(config, self.base_url)
 
     def _generate_signature(self, data):
         """Generate HMAC SHA256 signature for Binance API"""
@@ -154,11 +1052,133 @@ class BinanceFuturesAPI:
             'X-MBX-APIKEY': self.api_key
         }
 
+    def _klines_to_dataframe(self, data):
+        """Convert a raw klines payload to a DataFrame with numeric OHLCV columns"""
+        df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 
+                                        'close_time', 'quote_asset_volume', 'number_of_trades', 
+                                        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
+        
+        # Convert string values to float for calculations
+        df['open'] = df['open'].astype(float)
+        df['high'] = df['high'].astype(float)
+        df['low'] = df['low'].astype(float)
+        df['close'] = df['close'].astype(float)
+        df['volume'] = df['volume'].astype(float)
+        
+        # Convert timestamp to datetime
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        
+        return df
+
+    def _klines_to_arrays(self, data):
+        """
+        Convert a raw klines payload to (open_times int64[n], ohlcv float64[5, n]),
+        skipping the 12-column DataFrame; rows of ohlcv follow OHLCV_FIELDS.
+        """
+        if not data:
+            return np.empty(0, dtype=np.int64), np.empty((5, 0), dtype=np.float64)
+        columns = list(zip(*data)) # Transpose rows into per-field tuples
+        open_times = np.array(columns[0], dtype=np.int64)
+        ohlcv = np.array(columns[1:6], dtype=np.float64)
+        return open_times, ohlcv
+
+    def _klines_params(self, symbol, interval, limit, start_time, end_time):
+        params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+        if start_time is not None:
+            params['startTime'] = int(start_time)
+        if end_time is not None:
+            params['endTime'] = int(end_time)
+        return params
+
+    def _order_params(self, symbol, side, order_type, quantity=None, price=None, stop_price=None,
+                      position_side=None, reduce_only=False, time_in_force="GTC", close_position=False,
+                      new_order_resp_type=None):
+        """Build the (unsigned) parameters of a new order"""
+        params = {
+            'symbol': symbol,
+            'side': side,  # BUY or SELL
+            'type': order_type,  # LIMIT, MARKET, STOP, TAKE_PROFIT, etc.
+            'timeInForce': time_in_force  # GTC, IOC, FOK
+        }
+
+        if quantity:
+            params['quantity'] = quantity
+
+        if price and order_type not in ['MARKET', 'STOP_MARKET', 'TAKE_PROFIT_MARKET']:
+            params['price'] = price
+
+        if stop_price and order_type in ['STOP', 'STOP_MARKET', 'TAKE_PROFIT', 'TAKE_PROFIT_MARKET']:
+            params['stopPrice'] = stop_price
+
+        if position_side:
+            params['positionSide'] = position_side  # LONG or SHORT
+
+        # In hedge mode the LONG/SHORT position side already makes an opposite order a close,
+        # and Binance rejects reduceOnly there (-1106)
+        if reduce_only and position_side in (None, 'BOTH'):
+            params['reduceOnly'] = 'true'
+
+        if close_position:
+            params['closePosition'] = 'true'
+
+        if new_order_resp_type:
+            params['newOrderRespType'] = new_order_resp_type  # ACK or RESULT
+
+        return params
+
+    def _batch_orders_params(self, orders):
+        """Encode up to 5 order parameter dicts for /fapi/v1/batchOrders (all values as strings)"""
+        if not 0 < len(orders) <= 5:
+            raise ValueError("batchOrders takes between 1 and 5 orders")
+        batch = [{key: str(value) for key, value in order.items()} for order in orders]
+        return {'batchOrders': json.dumps(batch, separators=(',', ':'))}
+
+    def _parse_balance(self, account_info):
+        """Extract the USDT balance from an account info payload"""
+        if account_info and 'assets' in account_info:
+            for asset in account_info['assets']:
+                if asset['asset'] == 'USDT':
+                    return {
+                        'total': float(asset['walletBalance']),
+                        'available': float(asset['availableBalance']),
+                        'unrealized_pnl': float(asset['unrealizedProfit'])
+                    }
+        return None
+
+    def _filter_open_positions(self, account_info):
+        """Return the positions with a non-zero amount from an account info payload"""
+        if account_info and 'positions' in account_info:
+            return [p for p in account_info['positions'] if float(p['positionAmt']) != 0]
+        return []
+
+    def round_step_size(self, quantity, step_size):
+        """Round quantity down to a multiple of step size"""
+        step_size = Decimal(str(step_size))
+        return float((Decimal(repr(float(quantity))) / step_size).to_integral_value(ROUND_DOWN) * step_size)
+
+    def get_decimal_places(self, value):
+        """Get decimal places in a number"""
+        return max(-Decimal(str(value)).as_tuple().exponent, 0)
+
+class BinanceFuturesAPI(BinanceAPIBase):
+    def __init__(self, config):
+        super().__init__(config)
+        self.transport = BinanceHTTPTransport(
+            pool_size=config.get("http_pool_size", 20),
+            connect_timeout=config.get("http_connect_timeout", 3.05),
+            read_timeout=config.get("http_read_timeout", 10.0),
+            rate_limiter=BINANCE_RATE_LIMITER,
+            signer=self._generate_signature
+        )
+        # Bulk 24h ticker cache: (fetched_at, {symbol: ticker})
+        self._ticker_24hr_cache = None
+        self._ticker_24hr_lock = threading.Lock()
+
     def get_exchange_info(self):
         """Get exchange information"""
         try:
             url = f"{self.base_url}/fapi/v1/exchangeInfo"
-            response = requests.get(url)
+            response = self.transport.get(url)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -168,6 +1188,20 @@ class BinanceFuturesAPI:
             logger.error(f"Error getting exchange info: {e}")
             return None
 
+    def get_server_time(self):
+        """Binance server time in milliseconds"""
+        try:
+            url = f"{self.base_url}/fapi/v1/time"
+            response = self.transport.get(url)
+            if response.status_code == 200:
+                return int(response.json()['serverTime'])
+            else:
+                logger.error(f"Failed to get server time: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting server time: {e}")
+            return None
+
     def get_account_info(self):
         """Get account information"""
         try:
@@ -180,7 +1214,7 @@ class BinanceFuturesAPI:
 
             headers = self._get_headers()
 
-            response = requests.get(url, params=params, headers=headers)
+            response = self.transport.get(url, params=params, headers=headers)
 
             if response.status_code != 200:
                 logger.error(f"API error response: {response.text}")
@@ -206,7 +1240,7 @@ class BinanceFuturesAPI:
             url = f"{self.base_url}/fapi/v1/ticker/price"
             params = {'symbol': symbol}
 
-            response = requests.get(url, params=params)
+            response = self.transport.get(url, params=params)
             if response.status_code == 200:
                 return float(response.json()['price'])
             else:
@@ -216,35 +1250,85 @@ class BinanceFuturesAPI:
             logger.error(f"Error getting ticker price: {e}")
             return None
 
-    def get_klines(self, symbol, interval, limit=100):
-        """Get klines/candlestick data"""
+    def get_all_ticker_prices(self):
+        """Get the current price of every symbol in one request, as {symbol: price}"""
+        try:
+            url = f"{self.base_url}/fapi/v1/ticker/price"
+
+            response = self.transport.get(url)
+            if response.status_code == 200:
+                return {item['symbol']: float(item['price']) for item in response.json()}
+            else:
+                logger.error(f"Failed to get ticker prices: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting ticker prices: {e}")
+            return None
+
+    def get_ticker_24hr(self, symbol=None):
+        """Get 24h ticker statistics for one symbol, or for all symbols if none is given"""
+        try:
+            url = f"{self.base_url}/fapi/v1/ticker/24hr"
+            params = {'symbol': symbol} if symbol else None
+
+            response = self.transport.get(url, params=params)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get 24h ticker: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting 24h ticker: {e}")
+            return None
+
+    def get_ticker_24hr_map(self, max_age=None):
+        """
+        Get 24h ticker statistics for all symbols as a {symbol: ticker} map.
+        The bulk download (weight 40) is cached for ticker_24hr_cache_ttl_seconds and
+        shared by every caller; concurrent callers wait for a single in-flight fetch.
+        """
+        if max_age is None:
+            max_age = self.config.get("ticker_24hr_cache_ttl_seconds", 60)
+
+        with self._ticker_24hr_lock:
+            if self._ticker_24hr_cache and time.monotonic() - self._ticker_24hr_cache[0] < max_age:
+                return self._ticker_24hr_cache[1]
+
+            all_tickers_data = self.get_ticker_24hr()
+            if not all_tickers_data:
+                # Serve stale data rather than nothing if the refresh failed
+                return self._ticker_24hr_cache[1] if self._ticker_24hr_cache else None
+
+            tickers_map = {item['symbol']: item for item in all_tickers_data}
+            self._ticker_24hr_cache = (time.monotonic(), tickers_map)
+            return tickers_map
+
+    def get_klines(self, symbol, interval, limit=100, start_time=None, end_time=None):
+        """Get klines/candlestick data, optionally bounded by open time in milliseconds"""
         try:
             url = f"{self.base_url}/fapi/v1/klines"
-            params = {
-                'symbol': symbol,
-                'interval': interval,
-                'limit': limit
-            }
+            params = self._klines_params(symbol, interval, limit, start_time, end_time)
 
-            response = requests.get(url, params=params)
+            response = self.transport.get(url, params=params)
             if response.status_code == 200:
                 # Convert to pandas DataFrame for easier manipulation
-                data = response.json()
-                df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 
-                                                'close_time', 'quote_asset_volume', 'number_of_trades', 
-                                                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-                
-                # Convert string values to float for calculations
-                df['open'] = df['open'].astype(float)
-                df['high'] = df['high'].astype(float)
-                df['low'] = df['low'].astype(float)
-                df['close'] = df['close'].astype(float)
-                df['volume'] = df['volume'].astype(float)
-                
-                # Convert timestamp to datetime
-                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                
-                return df
+                return self._klines_to_dataframe(response.json())
+            else:
+                logger.error(f"Failed to get klines: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting klines: {e}")
+            return None
+
+    def get_klines_arrays(self, symbol, interval, limit=100, start_time=None, end_time=None):
+        """Like get_klines, but returns (open_times, ohlcv) NumPy arrays decoded straight from the payload"""
+        try:
+            url = f"{self.base_url}/fapi/v1/klines"
+            params = self._klines_params(symbol, interval, limit, start_time, end_time)
+
+            response = self.transport.get(url, params=params)
+            if response.status_code == 200:
+                return self._klines_to_arrays(decode_json(response.content))
             else:
                 logger.error(f"Failed to get klines: {response.text}")
                 return None
@@ -264,7 +1348,7 @@ class BinanceFuturesAPI:
             }
             params['signature'] = self._generate_signature(params)
 
-            response = requests.post(url, params=params, headers=self._get_headers())
+            response = self.transport.post(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 logger.info(f"Changed leverage for {symbol} to {leverage}x")
                 return response.json()
@@ -287,7 +1371,7 @@ class BinanceFuturesAPI:
             }
             params['signature'] = self._generate_signature(params)
 
-            response = requests.post(url, params=params, headers=self._get_headers())
+            response = self.transport.post(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 logger.info(f"Changed margin type for {symbol} to {margin_type}")
                 return response.json()
@@ -311,7 +1395,7 @@ class BinanceFuturesAPI:
             }
             params['signature'] = self._generate_signature(params)
 
-            response = requests.get(url, params=params, headers=self._get_headers())
+            response = self.transport.get(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 return response.json()
             else:
@@ -332,7 +1416,7 @@ class BinanceFuturesAPI:
             }
             params['signature'] = self._generate_signature(params)
 
-            response = requests.post(url, params=params, headers=self._get_headers())
+            response = self.transport.post(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 mode = "Hedge Mode" if dual_side_position else "One-way Mode"
                 logger.info(f"Changed position mode to {mode}")
@@ -349,60 +1433,77 @@ class BinanceFuturesAPI:
 
     def create_order(self, symbol, side, order_type, quantity=None, price=None, 
                     stop_price=None, position_side=None, reduce_only=False, 
-                    time_in_force="GTC", close_position=False):
-        """Create a new order"""
+                    time_in_force="GTC", close_position=False, new_order_resp_type=None):
+        """Create a new order. new_order_resp_type="RESULT" returns the final state (fill price) of MARKET orders"""
         try:
             url = f"{self.base_url}/fapi/v1/order"
-            timestamp = int(time.time() * 1000)
-
-            params = {
-                'symbol': symbol,
-                'side': side,  # BUY or SELL
-                'type': order_type,  # LIMIT, MARKET, STOP, TAKE_PROFIT, etc.
-                'timestamp': timestamp,
-                'timeInForce': time_in_force  # GTC, IOC, FOK
-            }
-
-            if quantity:
-                params['quantity'] = quantity
 
-            if price and order_type not in ['MARKET', 'STOP_MARKET', 'TAKE_PROFIT_MARKET']:
-                params['price'] = price
+            params = self._order_params(symbol, side, order_type, quantity, price, stop_price,
+                                        position_side, reduce_only, time_in_force, close_position,
+                                        new_order_resp_type)
+            params['timestamp'] = int(time.time() * 1000)
+            params['signature'] = self._generate_signature(params)
 
-            if stop_price and order_type in ['STOP', 'STOP_MARKET', 'TAKE_PROFIT', 'TAKE_PROFIT_MARKET']:
-                params['stopPrice'] = stop_price
+            response = self.transport.post(url, params=params, headers=self._get_headers())
+            if response.status_code == 200:
+                logger.info(f"Created order: {symbol} {side} {order_type} {quantity}")
+                return response.json()
+            else:
+                logger.error(f"Failed to create order: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating order: {e}")
+            return None
 
-            if position_side:
-                params['positionSide'] = position_side  # LONG or SHORT
+    def create_batch_orders(self, orders):
+        """
+        Place up to 5 orders (parameter dicts from _order_params) in one request.
+        Returns one entry per order, in order: the order, or a {'code', 'msg'} error.
+        """
+        try:
+            url = f"{self.base_url}/fapi/v1/batchOrders"
 
-            if reduce_only:
-                params['reduceOnly'] = 'true'
+            params = self._batch_orders_params(orders)
+            params['timestamp'] = int(time.time() * 1000)
+            params['signature'] = self._generate_signature(params)
 
-            if close_position:
-                params['closePosition'] = 'true'
+            response = self.transport.post(url, params=params, headers=self._get_headers())
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to create batch orders: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating batch orders: {e}")
+            return None
 
+    def get_position_risk(self, symbol=None):
+        """Get position information (leverage, margin type, side, ...) for one or all symbols"""
+        try:
+            url = f"{self.base_url}/fapi/v2/positionRisk"
+            params = {
+                'timestamp': int(time.time() * 1000)
+            }
+            if symbol:
+                params['symbol'] = symbol
             params['signature'] = self._generate_signature(params)
 
-            response = requests.post(url, params=params, headers=self._get_headers())
+            response = self.transport.get(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
-                logger.info(f"Created order: {symbol} {side} {order_type} {quantity}")
                 return response.json()
             else:
-                logger.error(f"Failed to create order: {response.text}")
+                logger.error(f"Failed to get position risk: {response.text}")
                 return None
         except Exception as e:
-            logger.error(f"Error creating order: {e}")
+            logger.error(f"Error getting position risk: {e}")
             return None
 
     def get_open_positions(self):
         """Get all open positions"""
         try:
             account_info = self.get_account_info()
-            if account_info and 'positions' in account_info:
-                # Filter positions with non-zero amount
-                open_positions = [p for p in account_info['positions'] if float(p['positionAmt']) != 0]
-                return open_positions
-            return []
+            # Filter positions with non-zero amount
+            return self._filter_open_positions(account_info)
         except Exception as e:
             logger.error(f"Error getting open positions: {e}")
             return []
@@ -422,7 +1523,7 @@ class BinanceFuturesAPI:
 
             params['signature'] = self._generate_signature(params)
 
-            response = requests.get(url, params=params, headers=self._get_headers())
+            response = self.transport.get(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 return response.json()
             else:
@@ -432,6 +1533,68 @@ class BinanceFuturesAPI:
             logger.error(f"Error getting open orders: {e}")
             return None
 
+    def get_order(self, symbol, order_id):
+        """Get the status of one order (status, avgPrice, executedQty, ...)"""
+        try:
+            url = f"{self.base_url}/fapi/v1/order"
+            params = {
+                'symbol': symbol,
+                'orderId': order_id,
+                'timestamp': int(time.time() * 1000)
+            }
+            params['signature'] = self._generate_signature(params)
+
+            response = self.transport.get(url, params=params, headers=self._get_headers())
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get order: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting order: {e}")
+            return None
+
+    def create_listen_key(self):
+        """Start (or extend) the user data stream and return its listenKey"""
+        try:
+            url = f"{self.base_url}/fapi/v1/listenKey"
+
+            response = self.transport.post(url, headers=self._get_headers())
+            if response.status_code == 200:
+                return response.json()['listenKey']
+            else:
+                logger.error(f"Failed to create listenKey: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating listenKey: {e}")
+            return None
+
+    def keepalive_listen_key(self):
+        """Extend the validity of the user data stream by 60 minutes"""
+        try:
+            url = f"{self.base_url}/fapi/v1/listenKey"
+
+            response = self.transport.put(url, headers=self._get_headers())
+            if response.status_code == 200:
+                return True
+            else:
+                logger.error(f"Failed to keep listenKey alive: {response.text}")
+                return False
+        except Exception as e:
+            logger.error(f"Error keeping listenKey alive: {e}")
+            return False
+
+    def close_listen_key(self):
+        """Close the user data stream"""
+        try:
+            url = f"{self.base_url}/fapi/v1/listenKey"
+
+            response = self.transport.delete(url, headers=self._get_headers())
+            return response.status_code == 200
+        except Exception as e:
+            logger.error(f"Error closing listenKey: {e}")
+            return False
+
     def cancel_order(self, symbol, order_id=None, orig_client_order_id=None):
         """Cancel an order"""
         try:
@@ -453,7 +1616,7 @@ class BinanceFuturesAPI:
 
             params['signature'] = self._generate_signature(params)
 
-            response = requests.delete(url, params=params, headers=self._get_headers())
+            response = self.transport.delete(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 return response.json()
             else:
@@ -476,7 +1639,7 @@ class BinanceFuturesAPI:
 
             params['signature'] = self._generate_signature(params)
 
-            response = requests.delete(url, params=params, headers=self._get_headers())
+            response = self.transport.delete(url, params=params, headers=self._get_headers())
             if response.status_code == 200:
                 return response.json()
             else:
@@ -487,108 +1650,1774 @@ class BinanceFuturesAPI:
             return None
 
     def get_symbol_info(self, symbol):
-        """Get symbol information including precision"""
-        global SYMBOL_INFO
-        
-        # Return from cache if available
-        if symbol in SYMBOL_INFO:
-            return SYMBOL_INFO[symbol]
-            
+        """Get symbol information including precision, from the symbol index (one exchangeInfo download for all symbols)"""
+        index = self.symbol_index
         try:
-            exchange_info = self.get_exchange_info()
-            if not exchange_info:
-                return None
-                
-            for sym_info in exchange_info['symbols']:
-                if sym_info['symbol'] == symbol:
-                    # Cache the result
-                    SYMBOL_INFO[symbol] = {
-                        'pricePrecision': sym_info['pricePrecision'],
-                        'quantityPrecision': sym_info['quantityPrecision'],
-                        'minQty': next((f['minQty'] for f in sym_info['filters'] if f['filterType'] == 'LOT_SIZE'), '0.001'),
-                        'tickSize': next((f['tickSize'] for f in sym_info['filters'] if f['filterType'] == 'PRICE_FILTER'), '0.01'),
-                        'minNotional': next((f['notional'] for f in sym_info['filters'] if f['filterType'] == 'MIN_NOTIONAL'), '10')
-                    }
-                    return SYMBOL_INFO[symbol]
-            
-            logger.error(f"Symbol {symbol} not found in exchange info")
-            return None
+            # Only an unknown symbol waits for a running download; a known one is served from
+            # the (possibly stale) index meanwhile, so the order path never blocks on exchangeInfo
+            if index.needs_refresh(symbol) and index.refresh_lock.acquire(blocking=index.get(symbol) is None):
+                try:
+                    if index.claim_refresh(symbol):
+                        exchange_info = self.get_exchange_info()
+                        if exchange_info:
+                            index.update(exchange_info)
+                finally:
+                    index.refresh_lock.release()
+
+            symbol_info = index.get(symbol) # May be stale if the refresh failed, which beats no info
+            if symbol_info is None:
+                logger.error(f"Symbol {symbol} not found in exchange info")
+            return symbol_info
         except Exception as e:
             logger.error(f"Error getting symbol info: {e}")
             return None
 
-    def round_step_size(self, quantity, step_size):
-        """Round quantity to step size"""
-        step_size_decimal = self.get_decimal_places(step_size)
-        return round(quantity - (quantity % float(step_size)), step_size_decimal)
-
-    def get_decimal_places(self, value):
-        """Get decimal places in a number"""
-        value_str = str(value)
-        if '.' in value_str:
-            return len(value_str.split('.')[1])
-        return 0
+    def get_quantizer(self, symbol):
+        """SymbolQuantizer for a symbol, or None if its filters are unknown"""
+        if not self.get_symbol_info(symbol):
+            return None
+        return self.symbol_index.get_quantizer(symbol)
 
     def round_price(self, symbol, price):
-        """Round price according to symbol's price precision"""
-        symbol_info = self.get_symbol_info(symbol)
-        if not symbol_info:
+        """Round price to the symbol's tick size"""
+        quantizer = self.get_quantizer(symbol)
+        if not quantizer:
             # Default to 2 decimal places if we can't get the info
             return round(price, 2)
-        
-        price_precision = symbol_info['pricePrecision']
-        return round(price, price_precision)
+        return quantizer.price(price)
 
     def round_quantity(self, symbol, quantity):
-        """Round quantity according to symbol's quantity precision"""
-        symbol_info = self.get_symbol_info(symbol)
-        if not symbol_info:
+        """Round quantity down to the symbol's step size"""
+        quantizer = self.get_quantizer(symbol)
+        if not quantizer:
             # Default to 3 decimal places if we can't get the info
             return round(quantity, 3)
-        
-        quantity_precision = symbol_info['quantityPrecision']
-        return round(quantity, quantity_precision)
+        return quantizer.quantity(quantity)
 
     def get_balance(self):
         """Get USDT balance"""
         try:
             account_info = self.get_account_info()
-            if account_info and 'assets' in account_info:
-                for asset in account_info['assets']:
-                    if asset['asset'] == 'USDT':
-                        return {
-                            'total': float(asset['walletBalance']),
-                            'available': float(asset['availableBalance']),
-                            'unrealized_pnl': float(asset['unrealizedProfit'])
-                        }
-            return None
+            return self._parse_balance(account_info)
         except Exception as e:
             logger.error(f"Error getting balance: {e}")
             return None
 
-# In TechnicalAnalysis class
-
-class TechnicalAnalysis:
-    def __init__(self, binance_api):
-        self.binance_api = binance_api
-        self.settings = INDICATOR_SETTINGS
+class AsyncBinanceFuturesAPI(BinanceAPIBase):
+    """asyncio counterpart of BinanceFuturesAPI built on httpx.AsyncClient.
 
-    def calculate_indicators(self, symbol: str, timeframe: str = None) -> dict | None:
-        """
-        Calculates technical indicators for a given symbol and timeframe.
+    Exposes the same methods (as coroutines) with the same signing and return
+    values, so Telegram handlers can await several REST calls concurrently
+    without blocking the event loop.
+    """
 
-        Args:
-            symbol (str): The trading symbol (e.g., "BTCUSDT").
-            timeframe (str, optional): The candle timeframe (e.g., "5m", "1h"). 
-                                       Defaults to self.settings['candle_timeframe'].
+    def __init__(self, config):
+        super().__init__(config)
+        self._client = None
+
+    def _get_client(self):
+        """Create the AsyncClient lazily so it binds to the running event loop"""
+        if self._client is None or self._client.is_closed:
+            pool_size = self.config.get("http_pool_size", 20)
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(
+                    self.config.get("http_read_timeout", 10.0),
+                    connect=self.config.get("http_connect_timeout", 3.05)
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the underlying AsyncClient and its pooled connections"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _send(self, method, path, params=None, signed=False, timeout=None):
+        """Send a (optionally signed) request and return the httpx response"""
+        params = dict(params or {})
+        headers = None
+        # Wait for rate-limit budget before stamping, so a throttled request isn't sent
+        # with a timestamp already outside Binance's recvWindow
+        await BINANCE_RATE_LIMITER.acquire_async(method, path, params)
+        if signed:
+            params['timestamp'] = int(time.time() * 1000)
+            params['signature'] = self._generate_signature(params)
+            headers = self._get_headers()
+        kwargs = {'params': params, 'headers': headers}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        response = await self._get_client().request(method, f"{self.base_url}{path}", **kwargs)
+        BINANCE_RATE_LIMITER.update_from_headers(response.headers, response.status_code)
+        return response
+
+    async def get_exchange_info(self):
+        """Get exchange information"""
+        try:
+            response = await self._send('GET', "/fapi/v1/exchangeInfo")
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get exchange info: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting exchange info: {e}")
+            return None
 
-        Returns:
-            dict | None: A dictionary containing calculated indicators and other relevant data,
-                         or None if calculation fails or data is insufficient.
+    async def get_account_info(self):
+        """Get account information"""
+        try:
+            response = await self._send('GET', "/fapi/v2/account", signed=True)
+            if response.status_code == 200:
+                return response.json()
+            elif response.status_code == 401:
+                logger.error("Authentication failed: Invalid API key or secret")
+                return None
+            elif response.status_code == 403:
+                logger.error("Forbidden: This API key doesn't have permission to access this resource")
+                return None
+            else:
+                logger.error(f"Failed to get account info: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting account info: {e}")
+            return None
+
+    async def get_ticker_price(self, symbol):
+        """Get current price for a symbol"""
+        try:
+            response = await self._send('GET', "/fapi/v1/ticker/price", params={'symbol': symbol})
+            if response.status_code == 200:
+                return float(response.json()['price'])
+            else:
+                logger.error(f"Failed to get ticker price: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting ticker price: {e}")
+            return None
+
+    async def get_all_ticker_prices(self):
+        """Get the current price of every symbol in one request, as {symbol: price}"""
+        try:
+            response = await self._send('GET', "/fapi/v1/ticker/price")
+            if response.status_code == 200:
+                return {item['symbol']: float(item['price']) for item in response.json()}
+            else:
+                logger.error(f"Failed to get ticker prices: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting ticker prices: {e}")
+            return None
+
+    async def get_ticker_24hr(self, symbol=None):
+        """Get 24h ticker statistics for one symbol, or for all symbols if none is given"""
+        try:
+            params = {'symbol': symbol} if symbol else None
+            response = await self._send('GET', "/fapi/v1/ticker/24hr", params=params)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get 24h ticker: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting 24h ticker: {e}")
+            return None
+
+    async def get_klines(self, symbol, interval, limit=100, start_time=None, end_time=None):
+        """Get klines/candlestick data, optionally bounded by open time in milliseconds"""
+        try:
+            params = self._klines_params(symbol, interval, limit, start_time, end_time)
+            response = await self._send('GET', "/fapi/v1/klines", params=params)
+            if response.status_code == 200:
+                return self._klines_to_dataframe(response.json())
+            else:
+                logger.error(f"Failed to get klines: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting klines: {e}")
+            return None
+
+    async def get_klines_arrays(self, symbol, interval, limit=100, start_time=None, end_time=None):
+        """Like get_klines, but returns (open_times, ohlcv) NumPy arrays decoded straight from the payload"""
+        try:
+            params = self._klines_params(symbol, interval, limit, start_time, end_time)
+            response = await self._send('GET', "/fapi/v1/klines", params=params)
+            if response.status_code == 200:
+                return self._klines_to_arrays(decode_json(response.content))
+            else:
+                logger.error(f"Failed to get klines: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting klines: {e}")
+            return None
+
+    async def change_leverage(self, symbol, leverage):
+        """Change leverage for a symbol"""
+        try:
+            params = {'symbol': symbol, 'leverage': leverage}
+            response = await self._send('POST', "/fapi/v1/leverage", params=params, signed=True)
+            if response.status_code == 200:
+                logger.info(f"Changed leverage for {symbol} to {leverage}x")
+                return response.json()
+            else:
+                logger.error(f"Failed to change leverage: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error changing leverage: {e}")
+            return None
+
+    async def change_margin_type(self, symbol, margin_type):
+        """Change margin type for a symbol (ISOLATED or CROSSED)"""
+        try:
+            params = {'symbol': symbol, 'marginType': margin_type}
+            response = await self._send('POST', "/fapi/v1/marginType", params=params, signed=True)
+            if response.status_code == 200:
+                logger.info(f"Changed margin type for {symbol} to {margin_type}")
+                return response.json()
+            elif "already" in response.text:
+                # Already in this margin type, not an error
+                return {"msg": f"Margin type already set to {margin_type}"}
+            else:
+                logger.error(f"Failed to change margin type: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error changing margin type: {e}")
+            return None
+
+    async def get_position_mode(self):
+        """Get position mode (Hedge Mode or One-way Mode)"""
+        try:
+            response = await self._send('GET', "/fapi/v1/positionSide/dual", signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get position mode: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting position mode: {e}")
+            return None
+
+    async def change_position_mode(self, dual_side_position):
+        """Change position mode (Hedge Mode or One-way Mode)"""
+        try:
+            params = {'dualSidePosition': 'true' if dual_side_position else 'false'}
+            response = await self._send('POST', "/fapi/v1/positionSide/dual", params=params, signed=True)
+            if response.status_code == 200:
+                mode = "Hedge Mode" if dual_side_position else "One-way Mode"
+                logger.info(f"Changed position mode to {mode}")
+                return response.json()
+            elif "already" in response.text:
+                # Already in this mode, not an error
+                return {"msg": "Position mode already set"}
+            else:
+                logger.error(f"Failed to change position mode: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error changing position mode: {e}")
+            return None
+
+    async def create_order(self, symbol, side, order_type, quantity=None, price=None, 
+                           stop_price=None, position_side=None, reduce_only=False, 
+                           time_in_force="GTC", close_position=False, new_order_resp_type=None):
+        """Create a new order. new_order_resp_type="RESULT" returns the final state (fill price) of MARKET orders"""
+        try:
+            params = self._order_params(symbol, side, order_type, quantity, price, stop_price,
+                                        position_side, reduce_only, time_in_force, close_position,
+                                        new_order_resp_type)
+            response = await self._send('POST', "/fapi/v1/order", params=params, signed=True)
+            if response.status_code == 200:
+                logger.info(f"Created order: {symbol} {side} {order_type} {quantity}")
+                return response.json()
+            else:
+                logger.error(f"Failed to create order: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating order: {e}")
+            return None
+
+    async def create_batch_orders(self, orders):
         """
-        if timeframe is None:
-            timeframe = self.settings.get('candle_timeframe', '5m') # Default jika tidak ada di settings
+        Place up to 5 orders (parameter dicts from _order_params) in one request.
+        Returns one entry per order, in order: the order, or a {'code', 'msg'} error.
+        """
+        try:
+            response = await self._send('POST', "/fapi/v1/batchOrders", params=self._batch_orders_params(orders), signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to create batch orders: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating batch orders: {e}")
+            return None
+
+    async def get_position_risk(self, symbol=None):
+        """Get position information (leverage, margin type, side, ...) for one or all symbols"""
+        try:
+            params = {'symbol': symbol} if symbol else {}
+            response = await self._send('GET', "/fapi/v2/positionRisk", params=params, signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get position risk: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting position risk: {e}")
+            return None
+
+    async def get_open_positions(self):
+        """Get all open positions"""
+        try:
+            account_info = await self.get_account_info()
+            return self._filter_open_positions(account_info)
+        except Exception as e:
+            logger.error(f"Error getting open positions: {e}")
+            return []
+
+    async def get_open_orders(self, symbol=None):
+        """Get all open orders for a symbol or all symbols"""
+        try:
+            params = {'symbol': symbol} if symbol else {}
+            response = await self._send('GET', "/fapi/v1/openOrders", params=params, signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get open orders: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting open orders: {e}")
+            return None
+
+    async def get_order(self, symbol, order_id):
+        """Get the status of one order (status, avgPrice, executedQty, ...)"""
+        try:
+            params = {'symbol': symbol, 'orderId': order_id}
+            response = await self._send('GET', "/fapi/v1/order", params=params, signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to get order: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error getting order: {e}")
+            return None
+
+    async def cancel_order(self, symbol, order_id=None, orig_client_order_id=None):
+        """Cancel an order"""
+        try:
+            params = {'symbol': symbol}
+            if order_id:
+                params['orderId'] = order_id
+            elif orig_client_order_id:
+                params['origClientOrderId'] = orig_client_order_id
+            else:
+                logger.error("Either orderId or origClientOrderId must be provided")
+                return None
+
+            response = await self._send('DELETE', "/fapi/v1/order", params=params, signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to cancel order: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error canceling order: {e}")
+            return None
+
+    async def cancel_all_orders(self, symbol):
+        """Cancel all orders for a symbol"""
+        try:
+            response = await self._send('DELETE', "/fapi/v1/allOpenOrders", params={'symbol': symbol}, signed=True)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to cancel all orders: {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error canceling all orders: {e}")
+            return None
+
+    async def get_symbol_info(self, symbol):
+        """Get symbol information including precision, from the symbol index (one exchangeInfo download for all symbols)"""
+        index = self.symbol_index
+        try:
+            if index.needs_refresh(symbol):
+                # Same rules as the threaded client: a known symbol never waits for a running
+                # download, an unknown one does. refresh_lock is a threading lock, so poll it
+                # rather than block the event loop (or leave it held if we are cancelled)
+                acquired = index.refresh_lock.acquire(blocking=False)
+                while not acquired and index.get(symbol) is None:
+                    await asyncio.sleep(0.05)
+                    acquired = index.refresh_lock.acquire(blocking=False)
+                if acquired:
+                    try:
+                        if index.claim_refresh(symbol):
+                            exchange_info = await self.get_exchange_info()
+                            if exchange_info:
+                                await asyncio.to_thread(index.update, exchange_info)
+                    finally:
+                        index.refresh_lock.release()
+
+            symbol_info = index.get(symbol) # May be stale if the refresh failed, which beats no info
+            if symbol_info is None:
+                logger.error(f"Symbol {symbol} not found in exchange info")
+            return symbol_info
+        except Exception as e:
+            logger.error(f"Error getting symbol info: {e}")
+            return None
+
+    async def get_quantizer(self, symbol):
+        """SymbolQuantizer for a symbol, or None if its filters are unknown"""
+        if not await self.get_symbol_info(symbol):
+            return None
+        return self.symbol_index.get_quantizer(symbol)
+
+    async def round_price(self, symbol, price):
+        """Round price to the symbol's tick size"""
+        quantizer = await self.get_quantizer(symbol)
+        if not quantizer:
+            return round(price, 2)
+        return quantizer.price(price)
+
+    async def round_quantity(self, symbol, quantity):
+        """Round quantity down to the symbol's step size"""
+        quantizer = await self.get_quantizer(symbol)
+        if not quantizer:
+            return round(quantity, 3)
+        return quantizer.quantity(quantity)
+
+    async def get_balance(self):
+        """Get USDT balance"""
+        try:
+            account_info = await self.get_account_info()
+            return self._parse_balance(account_info)
+        except Exception as e:
+            logger.error(f"Error getting balance: {e}")
+            return None
+
+TIMEFRAME_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000,
+    '1w': 604_800_000, '1M': 2_592_000_000
+}
+
+def timeframe_to_ms(timeframe):
+    """Length of one candle of the given Binance interval in milliseconds"""
+    if timeframe not in TIMEFRAME_MS:
+        raise ValueError(f"Unsupported candle timeframe: {timeframe}")
+    return TIMEFRAME_MS[timeframe]
+
+# Column order of the OHLCV rows kept by CandleSeries
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+class CandleSeries:
+    """
+    Fixed-capacity OHLCV buffer for one (symbol, timeframe), oldest candle first.
+
+    Backed by arrays twice the capacity: new candles are written after the
+    current window and the window is only copied back to the front when the
+    spare room runs out, so appends are amortised O(1) and every field of the
+    window is always one contiguous slice that can be handed out as a view.
+    Hold `lock` while using views, since a later write may move the data.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.open_time = np.zeros(2 * capacity, dtype=np.int64)
+        self.ohlcv = np.zeros((len(OHLCV_FIELDS), 2 * capacity), dtype=np.float64)
+        self.start = 0
+        self.end = 0
+        self.lock = threading.RLock()
+        self.last_refresh = 0.0
+        self.streaming = False # True while a live stream keeps this series current
+
+    def __len__(self):
+        return self.end - self.start
+
+    def clear(self):
+        self.start = 0
+        self.end = 0
+
+    def last_open_time(self):
+        return int(self.open_time[self.end - 1]) if self.end > self.start else None
+
+    def _append(self, open_times, rows):
+        count = len(open_times)
+        if count > self.capacity:
+            open_times, rows = open_times[-self.capacity:], rows[:, -self.capacity:]
+            count = self.capacity
+        if self.end + count > len(self.open_time):
+            # Out of spare room: move the newest candles that we keep to the front
+            keep = min(len(self), self.capacity - count)
+            self.open_time[:keep] = self.open_time[self.end - keep:self.end]
+            self.ohlcv[:, :keep] = self.ohlcv[:, self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        self.open_time[self.end:self.end + count] = open_times
+        self.ohlcv[:, self.end:self.end + count] = rows
+        self.end += count
+        if len(self) > self.capacity:
+            self.start = self.end - self.capacity
+
+    def upsert(self, open_times, rows):
+        """
+        Merge candles (open_times: int64[n], rows: float64[5, n], sorted by time).
+        A candle with the same open time as the newest stored one replaces it
+        (the in-progress candle being amended); older candles are ignored.
+        """
+        open_times = np.asarray(open_times, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.float64)
+        if len(open_times) == 0:
+            return
+        last = self.last_open_time()
+        if last is not None:
+            same = open_times == last
+            if same.any():
+                index = int(np.flatnonzero(same)[-1])
+                self.ohlcv[:, self.end - 1] = rows[:, index]
+            newer = open_times > last
+            open_times, rows = open_times[newer], rows[:, newer]
+        if len(open_times):
+            self._append(open_times, rows)
+
+    def window(self, count=None, until_open_time=None):
+        """
+        Zero-copy views (open_time, ohlcv[5, n]) of the newest `count` candles, or of the
+        `count` candles ending at the one opened at `until_open_time` (empty if it isn't stored)
+        """
+        end = self.end
+        if until_open_time is not None:
+            end = self.start + int(np.searchsorted(self.open_time[self.start:self.end], until_open_time, side='right'))
+            if end == self.start or self.open_time[end - 1] != until_open_time:
+                end = self.start
+        start = self.start if count is None else max(self.start, end - count)
+        return self.open_time[start:end], self.ohlcv[:, start:end]
+
+class CandleStore:
+    """
+    In-memory candle cache per (symbol, timeframe) built on CandleSeries.
+
+    refresh() only downloads candles from the newest stored open time onwards,
+    so keeping a series current costs one small klines request, or none at
+    all if it was refreshed within the last `min_refresh_interval` seconds or
+    is being kept current by MarketDataStream.
+    """
+
+    def __init__(self, binance_api, capacity=500, min_refresh_interval=1.0):
+        self.binance_api = binance_api
+        self.capacity = capacity
+        self.min_refresh_interval = min_refresh_interval
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def get_series(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = CandleSeries(self.capacity)
+                self._series[key] = series
+            return series
+
+    def update(self, symbol, timeframe, open_times, rows):
+        """Merge externally obtained candles into the store"""
+        series = self.get_series(symbol, timeframe)
+        with series.lock:
+            series.upsert(open_times, rows)
+
+    def refresh(self, symbol, timeframe, min_candles):
+        """Bring a series up to date; returns False if it could not provide min_candles candles"""
+        series = self.get_series(symbol, timeframe)
+        with series.lock:
+            now = time.monotonic()
+            if len(series) >= min_candles and (series.streaming or now - series.last_refresh < self.min_refresh_interval):
+                return True
+
+            last_open = series.last_open_time()
+            start_time = None
+            limit = min(max(min_candles, 1), 1500)
+            missing = None
+            if last_open is not None and len(series) >= min_candles:
+                missing = int((time.time() * 1000 - last_open) // timeframe_to_ms(timeframe)) + 1
+            if missing is not None and missing < min(self.capacity, 1500):
+                # Re-fetch the newest stored candle (it may still have been forming) plus anything newer
+                start_time = last_open
+                limit = missing + 1
+            else:
+                series.clear() # Empty, too short or too far behind: reload the window from scratch
+
+            klines = self.binance_api.get_klines_arrays(symbol, timeframe, limit=limit, start_time=start_time)
+            if klines is None or len(klines[0]) == 0:
+                return len(series) >= min_candles
+
+            series.upsert(*klines)
+            series.last_refresh = now
+            return len(series) >= min_candles
+
+class HistoricalKlinesDownloader:
+    """
+    Pages /fapi/v1/klines over arbitrary date ranges and keeps the candles on disk.
+
+    Each (symbol, timeframe) is one <SYMBOL>_<timeframe>.npy file holding an (N, 6)
+    float64 array of [open_time, open, high, low, close, volume] rows sorted by open
+    time, so files can be loaded memory-mapped. Only closed candles are stored, and
+    later runs only download the part of a requested range that is not on disk yet.
+    Requests go through the API's transport and therefore the shared rate limiter.
+    """
+
+    PAGE_LIMIT = 1000 # Largest page in the 5-weight klines bracket
+
+    def __init__(self, binance_api, data_dir, max_workers=4):
+        self.binance_api = binance_api
+        self.data_dir = data_dir
+        self.max_workers = max_workers
+        os.makedirs(data_dir, exist_ok=True)
+
+    def get_path(self, symbol, timeframe):
+        return os.path.join(self.data_dir, f"{symbol}_{timeframe}.npy")
+
+    def load(self, symbol, timeframe, mmap=True):
+        """Returns the stored (N, 6) array (memory-mapped by default), or None if nothing is stored"""
+        path = self.get_path(symbol, timeframe)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r' if mmap else None)
+
+    def get_coverage(self, symbol, timeframe):
+        """(first open time, last open time) on disk in ms, or None"""
+        data = self.load(symbol, timeframe)
+        if data is None or len(data) == 0:
+            return None
+        return int(data[0, 0]), int(data[-1, 0])
+
+    def _missing_ranges(self, coverage, start_ms, end_ms, timeframe_ms):
+        if coverage is None:
+            return [(start_ms, end_ms)]
+        first, last = coverage
+        ranges = []
+        if start_ms < first:
+            ranges.append((start_ms, first))
+        if end_ms > last + timeframe_ms:
+            ranges.append((last + timeframe_ms, end_ms))
+        return ranges
+
+    def _download_range(self, symbol, timeframe, start_ms, end_ms):
+        """Downloads closed candles with start_ms <= open time < end_ms; returns (N, 6) rows or None on failure"""
+        timeframe_ms = timeframe_to_ms(timeframe)
+        closed_before = int(time.time() * 1000) - timeframe_ms # Open times after this belong to unfinished candles
+        end_ms = min(end_ms, closed_before + 1)
+        pages = []
+        cursor = start_ms
+        while cursor < end_ms:
+            klines = self.binance_api.get_klines_arrays(
+                symbol, timeframe, limit=self.PAGE_LIMIT, start_time=cursor, end_time=end_ms - 1
+            )
+            if klines is None:
+                return None
+            open_times, ohlcv = klines
+            if len(open_times) == 0:
+                break
+            pages.append(np.column_stack((open_times.astype(np.float64), ohlcv.T)))
+            cursor = int(open_times[-1]) + timeframe_ms
+            if len(open_times) < self.PAGE_LIMIT:
+                break
+        if not pages:
+            return np.empty((0, 6), dtype=np.float64)
+        rows = np.concatenate(pages)
+        return rows[rows[:, 0] < end_ms]
+
+    def _save(self, symbol, timeframe, new_rows):
+        existing = self.load(symbol, timeframe, mmap=False)
+        rows = new_rows if existing is None else np.concatenate((existing, new_rows))
+        _, unique_index = np.unique(rows[:, 0], return_index=True) # Sorted by open time, duplicates dropped
+        rows = np.ascontiguousarray(rows[unique_index])
+        path = self.get_path(symbol, timeframe)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, rows)
+        os.replace(tmp_path, path) # Readers never see a half-written file
+        return len(rows)
+
+    def download(self, symbol, timeframe, start_ms, end_ms=None):
+        """Fills the missing parts of [start_ms, end_ms) for one series; returns the number of candles added or None"""
+        if end_ms is None:
+            end_ms = int(time.time() * 1000)
+        try:
+            timeframe_ms = timeframe_to_ms(timeframe)
+            added = 0
+            for range_start, range_end in self._missing_ranges(self.get_coverage(symbol, timeframe), start_ms, end_ms, timeframe_ms):
+                rows = self._download_range(symbol, timeframe, range_start, range_end)
+                if rows is None:
+                    # Saving part of a leading range would leave a hole that later runs cannot see
+                    logger.error(f"History: Download of {symbol}@{timeframe} failed, range not saved.")
+                    return None
+                if len(rows):
+                    self._save(symbol, timeframe, rows)
+                    added += len(rows)
+            logger.info(f"History: {symbol}@{timeframe} +{added} candles")
+            return added
+        except Exception as e:
+            logger.error(f"History: Error downloading {symbol}@{timeframe}: {e}", exc_info=True)
+            return None
+
+    def download_many(self, symbols, timeframes, start_ms, end_ms=None):
+        """Downloads several series concurrently; returns {(symbol, timeframe): candles added or None}"""
+        jobs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="history") as executor:
+            futures = {executor.submit(self.download, symbol, timeframe, start_ms, end_ms): (symbol, timeframe)
+                       for symbol, timeframe in jobs}
+            return {futures[future]: future.result() for future in futures}
+
+    def warm_candle_store(self, candle_store, symbols, timeframe):
+        """Loads the newest stored candles into the live candle store; returns the symbols warmed"""
+        warmed = []
+        for symbol in symbols:
+            data = self.load(symbol, timeframe)
+            if data is None or len(data) == 0:
+                continue
+            tail = np.asarray(data[-candle_store.capacity:])
+            candle_store.update(symbol, timeframe, tail[:, 0].astype(np.int64), tail[:, 1:6].T)
+            warmed.append(symbol)
+        return warmed
+
+class MarketDataStream:
+    """
+    Keeps a CandleStore current from Binance's combined <symbol>@kline_<tf> streams.
+
+    Runs its own asyncio loop in a background thread. The set of subscribed
+    streams follows `symbols_provider()` (checked every second, so any change to
+    trading_pairs is picked up), dropped connections are retried with
+    exponential backoff, and every subscription is replayed after a reconnect.
+    Unless the first frame of a new subscription amends the newest stored candle,
+    the series is cleared, so a candle that closed unseen is reloaded over REST.
+    `url` can point at a local stand-in server that replays recorded frames.
+    """
+
+    def __init__(self, candle_store, timeframe, symbols_provider, url, on_candle=None,
+                 reconnect_min_delay=1.0, reconnect_max_delay=60.0):
+        self.candle_store = candle_store
+        self.timeframe = timeframe
+        self.symbols_provider = symbols_provider
+        self.url = url
+        self.on_candle = on_candle # Called as on_candle(symbol, timeframe, open_time, is_closed)
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.running = False
+        self.connected = False
+        self.thread = None
+        self.subscribed = set()
+        self.awaiting_first_frame = set() # Streams (re)subscribed since their last frame
+        self.messages_received = 0
+        self.reconnects = 0
+        self._loop = None
+        self._ws = None
+        self._request_id = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._thread_main, name="market-data-stream", daemon=True)
+        self.thread.start()
+        logger.info(f"MarketStream: started for {self.timeframe} candles via {self.url}")
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        if self._loop and self._ws is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+            except RuntimeError:
+                pass # Loop already closed
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        logger.info("MarketStream: stopped")
+
+    def _stream_name(self, symbol):
+        return f"{symbol.lower()}@kline_{self.timeframe}"
+
+    def _set_streaming(self, stream_names, streaming):
+        for name in stream_names:
+            symbol = name.split('@', 1)[0].upper()
+            series = self.candle_store.get_series(symbol, self.timeframe)
+            with series.lock:
+                series.streaming = streaming
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._run())
+        except Exception as e:
+            logger.error(f"MarketStream: event loop crashed: {e}", exc_info=True)
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _run(self):
+        backoff = self.reconnect_min_delay
+        while self.running:
+            try:
+                async with websockets.connect(f"{self.url}/stream", ping_interval=20, ping_timeout=20) as ws:
+                    self._ws = ws
+                    self.connected = True
+                    backoff = self.reconnect_min_delay
+                    logger.info("MarketStream: connected")
+                    sync_task = asyncio.create_task(self._sync_subscriptions(ws))
+                    try:
+                        async for raw_message in ws:
+                            self._handle_message(raw_message)
+                    finally:
+                        sync_task.cancel()
+            except Exception as e:
+                if self.running:
+                    logger.warning(f"MarketStream: connection error: {e}")
+            finally:
+                self._ws = None
+                self.connected = False
+                # Until we are resubscribed, the candle store falls back to REST refreshes
+                self._set_streaming(self.subscribed, False)
+                self.subscribed = set()
+                self.awaiting_first_frame = set()
+
+            if not self.running:
+                break
+            delay = backoff * (0.5 + random.random())
+            self.reconnects += 1
+            logger.info(f"MarketStream: reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.reconnect_max_delay)
+
+    async def _send_method(self, ws, method, stream_names):
+        # Binance limits incoming messages per connection, so batch the stream names
+        names = sorted(stream_names)
+        for i in range(0, len(names), 50):
+            self._request_id += 1
+            await ws.send(json.dumps({"method": method, "params": names[i:i + 50], "id": self._request_id}))
+
+    async def _sync_subscriptions(self, ws):
+        while self.running:
+            try:
+                desired = {self._stream_name(symbol) for symbol in self.symbols_provider()}
+                to_add = desired - self.subscribed
+                to_remove = self.subscribed - desired
+                if to_remove:
+                    await self._send_method(ws, "UNSUBSCRIBE", to_remove)
+                    self.subscribed -= to_remove
+                    self.awaiting_first_frame -= to_remove
+                    self._set_streaming(to_remove, False)
+                    logger.info(f"MarketStream: unsubscribed {sorted(to_remove)}")
+                if to_add:
+                    await self._send_method(ws, "SUBSCRIBE", to_add)
+                    self.subscribed |= to_add
+                    self.awaiting_first_frame |= to_add
+                    logger.info(f"MarketStream: subscribed {sorted(to_add)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MarketStream: error syncing subscriptions: {e}", exc_info=True)
+            await asyncio.sleep(1)
+
+    def _handle_message(self, raw_message):
+        try:
+            message = json.loads(raw_message)
+        except ValueError:
+            logger.warning(f"MarketStream: ignoring non-JSON frame: {raw_message[:100]}")
+            return
+
+        data = message.get('data') if isinstance(message, dict) else None
+        if not data or data.get('e') != 'kline':
+            if isinstance(message, dict) and message.get('error'):
+                logger.error(f"MarketStream: server error: {message['error']}")
+            return
+
+        kline = data['k']
+        symbol = data['s']
+        timeframe = kline['i']
+        stream_name = self._stream_name(symbol)
+        if stream_name not in self.subscribed:
+            return # Late frame for a stream we already dropped
+        first_frame = stream_name in self.awaiting_first_frame
+        self.awaiting_first_frame.discard(stream_name)
+
+        self.messages_received += 1
+        open_time = int(kline['t'])
+        row = [[float(kline['o'])], [float(kline['h'])], [float(kline['l'])], [float(kline['c'])], [float(kline['v'])]]
+
+        series = self.candle_store.get_series(symbol, timeframe)
+        with series.lock:
+            last_open = series.last_open_time()
+            if last_open is not None and (open_time > last_open + timeframe_to_ms(timeframe) or (first_frame and open_time != last_open)):
+                # Candles were missed (e.g. while disconnected), or the newest stored candle closed
+                # before we were subscribed and never got its final values; let the next refresh()
+                # reload the window
+                series.clear()
+            series.upsert([open_time], row)
+            series.streaming = True
+            series.last_refresh = time.monotonic()
+
+        if self.on_candle:
+            try:
+                self.on_candle(symbol, timeframe, open_time, bool(kline['x']))
+            except Exception as e:
+                logger.error(f"MarketStream: on_candle callback failed for {symbol}: {e}", exc_info=True)
+
+class AccountSnapshot:
+    """One /fapi/v2/account response, parsed once into the views callers use. Treat as read-only."""
+
+    def __init__(self, account_info, balance, open_positions):
+        self.account_info = account_info
+        self.balance = balance
+        self.open_positions = open_positions
+        self.fetched_at = time.monotonic()
+
+class AccountSnapshotProvider:
+    """
+    Shares /fapi/v2/account (weight 5) between position sizing, daily stats and the
+    Telegram commands.
+
+    A snapshot younger than `ttl` seconds is returned as is. Otherwise the first caller
+    fetches it and every concurrent caller, threaded or asyncio, waits on that same
+    in-flight request instead of sending its own. Call invalidate() after anything
+    that changes the account (orders, closed trades).
+    """
+
+    def __init__(self, binance_api, async_binance_api=None, ttl=2.0):
+        self.binance_api = binance_api
+        self.async_binance_api = async_binance_api
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self._in_flight = None # concurrent.futures.Future of the running fetch
+        self.hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+
+    def _claim(self, max_age):
+        """Return (snapshot, None, False) when cached, else (None, future, is_leader)."""
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            if self.snapshot is not None and time.monotonic() - self.snapshot.fetched_at <= max_age:
+                self.hits += 1
+                return self.snapshot, None, False
+            if self._in_flight is not None:
+                self.coalesced += 1
+                return None, self._in_flight, False
+            future = self._in_flight = Future()
+            future.set_running_or_notify_cancel() # A running future can't be cancelled by a waiter
+            self.fetches += 1
+            return None, future, True
+
+    def _publish(self, future, account_info):
+        snapshot = None
+        if account_info:
+            snapshot = AccountSnapshot(
+                account_info,
+                self.binance_api._parse_balance(account_info),
+                self.binance_api._filter_open_positions(account_info)
+            )
+        with self.lock:
+            if snapshot is not None:
+                self.snapshot = snapshot
+            self._in_flight = None
+        future.set_result(snapshot)
+        return snapshot
+
+    def get(self, max_age=None):
+        """Current AccountSnapshot (None if the account could not be fetched)"""
+        snapshot, future, leader = self._claim(max_age)
+        if snapshot is not None:
+            return snapshot
+        if not leader:
+            return future.result()
+        account_info = None
+        try:
+            account_info = self.binance_api.get_account_info()
+        finally:
+            snapshot = self._publish(future, account_info)
+        return snapshot
+
+    async def get_async(self, max_age=None):
+        """asyncio variant of get(), fetching through the async client"""
+        snapshot, future, leader = self._claim(max_age)
+        if snapshot is not None:
+            return snapshot
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        account_info = None
+        try:
+            account_info = await self.async_binance_api.get_account_info()
+        finally:
+            snapshot = self._publish(future, account_info)
+        return snapshot
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshot = None
+
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'fetches': self.fetches, 'coalesced': self.coalesced}
+
+class AccountSettingsCache:
+    """
+    Last known leverage and margin type per symbol, plus the account's position mode.
+
+    Seeded in bulk from /fapi/v2/positionRisk and /fapi/v1/positionSide/dual, so the
+    ensure_* calls only send a change request when the setting actually differs.
+    Settings changed elsewhere (e.g. in the Binance UI) reach the cache through the
+    user data stream's ACCOUNT_CONFIG_UPDATE; a failed change drops the entry so the
+    next call asks Binance again.
+    """
+
+    def __init__(self, binance_api):
+        self.binance_api = binance_api
+        self.lock = threading.Lock()
+        self.leverage = {} # symbol -> int
+        self.margin_type = {} # symbol -> "ISOLATED" or "CROSSED"
+        self.dual_side_position = None # True = Hedge Mode, None = unknown
+        self.skipped_calls = 0
+
+    def seed(self):
+        """Load the settings of every symbol at once (two requests). Returns False if nothing could be loaded."""
+        positions = self.binance_api.get_position_risk()
+        position_mode = self.binance_api.get_position_mode()
+        with self.lock:
+            if positions:
+                for position in positions:
+                    self.leverage[position['symbol']] = int(float(position['leverage']))
+                    self.margin_type[position['symbol']] = self._normalize_margin_type(position['marginType'])
+            if position_mode and 'dualSidePosition' in position_mode:
+                self.dual_side_position = bool(position_mode['dualSidePosition'])
+        logger.info(f"AccountSettings: cached leverage/margin type for {len(self.leverage)} symbols, hedge mode: {self.dual_side_position}")
+        return bool(positions) or position_mode is not None
+
+    @staticmethod
+    def _normalize_margin_type(margin_type):
+        # positionRisk reports "cross"/"isolated", the change endpoint takes "CROSSED"/"ISOLATED"
+        margin_type = margin_type.upper()
+        return "CROSSED" if margin_type == "CROSS" else margin_type
+
+    def set_leverage(self, symbol, leverage):
+        with self.lock:
+            self.leverage[symbol] = int(leverage)
+
+    def ensure_leverage(self, symbol, leverage):
+        """Set the symbol's leverage unless it is already known to be `leverage`. Returns False on failure."""
+        leverage = int(leverage)
+        with self.lock:
+            if self.leverage.get(symbol) == leverage:
+                self.skipped_calls += 1
+                return True
+        result = self.binance_api.change_leverage(symbol, leverage)
+        with self.lock:
+            if result:
+                self.leverage[symbol] = int(result.get('leverage', leverage))
+            else:
+                self.leverage.pop(symbol, None)
+        return bool(result)
+
+    def ensure_margin_type(self, symbol, margin_type):
+        """Set the symbol's margin type ("ISOLATED" or "CROSSED") unless it is already set. Returns False on failure."""
+        margin_type = self._normalize_margin_type(margin_type)
+        with self.lock:
+            if self.margin_type.get(symbol) == margin_type:
+                self.skipped_calls += 1
+                return True
+        result = self.binance_api.change_margin_type(symbol, margin_type)
+        with self.lock:
+            if result:
+                self.margin_type[symbol] = margin_type
+            else:
+                self.margin_type.pop(symbol, None)
+        return bool(result)
+
+    def ensure_position_mode(self, dual_side_position):
+        """Switch Hedge Mode on or off unless the account is already in that mode. Returns False on failure."""
+        with self.lock:
+            if self.dual_side_position == dual_side_position:
+                self.skipped_calls += 1
+                return True
+        result = self.binance_api.change_position_mode(dual_side_position)
+        with self.lock:
+            self.dual_side_position = dual_side_position if result else None
+        return bool(result)
+
+class AccountStateMirror:
+    """
+    Thread-safe local copy of balances, positions and open orders.
+
+    Seeded from /fapi/v2/account and /fapi/v1/openOrders, then kept current by the
+    ACCOUNT_UPDATE, ORDER_TRADE_UPDATE and ACCOUNT_CONFIG_UPDATE events of the user
+    data stream. Entries keep the REST field names, so callers can read either source.
+    The events don't carry availableBalance; between seeds it is estimated from the
+    change in cross wallet balance and in the initial margin of open positions.
+    Getters return None while the mirror is not synced.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.synced = False
+        self.snapshot_time = 0 # Binance server time (ms) of the last seed; older events are already in it
+        self.balances = {} # asset -> REST-style balance fields as floats
+        self.positions = {} # (symbol, positionSide) -> REST-style position dict
+        self.open_orders = {} # orderId -> REST-style order dict
+        self.leverages = {} # symbol -> leverage
+        self.events_applied = 0
+
+    def seed(self, account_info, open_orders, snapshot_time):
+        balances = {
+            asset['asset']: {
+                'walletBalance': float(asset['walletBalance']),
+                'crossWalletBalance': float(asset.get('crossWalletBalance', asset['walletBalance'])),
+                'availableBalance': float(asset['availableBalance']),
+                'unrealizedProfit': float(asset['unrealizedProfit'])
+            }
+            for asset in account_info.get('assets', [])
+        }
+        positions = {}
+        leverages = {}
+        for raw_position in account_info.get('positions', []):
+            position = dict(raw_position)
+            position.setdefault('positionSide', 'BOTH')
+            self._update_mark_price(position)
+            positions[(position['symbol'], position['positionSide'])] = position
+            leverages[position['symbol']] = float(position.get('leverage', 1) or 1)
+
+        with self.lock:
+            self.balances = balances
+            self.positions = positions
+            self.leverages = leverages
+            self.open_orders = {order['orderId']: dict(order) for order in open_orders}
+            self.snapshot_time = snapshot_time
+            self.synced = True
+
+    def invalidate(self):
+        with self.lock:
+            self.synced = False
+
+    def _update_mark_price(self, position):
+        # The account endpoint and ACCOUNT_UPDATE don't carry a mark price; derive it from the unrealized PnL
+        amount = float(position.get('positionAmt', 0))
+        if amount:
+            position['markPrice'] = str(float(position['entryPrice']) + float(position['unrealizedProfit']) / amount)
+        else:
+            position.setdefault('markPrice', '0')
+
+    def _initial_margin(self):
+        return sum(
+            abs(float(p['positionAmt'])) * float(p['entryPrice']) / self.leverages.get(symbol, 1.0)
+            for (symbol, _), p in self.positions.items()
+        )
+
+    def _adjust_available(self, margin_before, asset='USDT'):
+        balance = self.balances.get(asset)
+        if balance is not None:
+            balance['availableBalance'] -= self._initial_margin() - margin_before
+
+    def apply_event(self, event):
+        """Apply one user data stream event. Returns the updated order for ORDER_TRADE_UPDATE, else None."""
+        event_type = event.get('e')
+        with self.lock:
+            if event.get('E', 0) < self.snapshot_time:
+                return None
+            self.events_applied += 1
+            if event_type == 'ACCOUNT_UPDATE':
+                self._apply_account_update(event['a'])
+            elif event_type == 'ORDER_TRADE_UPDATE':
+                return self._apply_order_update(event['o'], event.get('T', event.get('E')))
+            elif event_type == 'ACCOUNT_CONFIG_UPDATE' and 'ac' in event:
+                margin_before = self._initial_margin()
+                symbol, leverage = event['ac']['s'], float(event['ac']['l'])
+                self.leverages[symbol] = leverage
+                for (position_symbol, _), position in self.positions.items():
+                    if position_symbol == symbol:
+                        position['leverage'] = str(int(leverage))
+                self._adjust_available(margin_before)
+        return None
+
+    def _apply_account_update(self, data):
+        margin_before = self._initial_margin()
+        for update in data.get('B', []):
+            balance = self.balances.setdefault(update['a'], {
+                'walletBalance': 0.0, 'crossWalletBalance': 0.0, 'availableBalance': 0.0, 'unrealizedProfit': 0.0
+            })
+            cross_wallet = float(update['cw'])
+            balance['availableBalance'] += cross_wallet - balance['crossWalletBalance']
+            balance['crossWalletBalance'] = cross_wallet
+            balance['walletBalance'] = float(update['wb'])
+
+        for update in data.get('P', []):
+            key = (update['s'], update.get('ps', 'BOTH'))
+            position = self.positions.setdefault(key, {
+                'symbol': key[0], 'positionSide': key[1],
+                'leverage': str(int(self.leverages.get(key[0], 1)))
+            })
+            position['positionAmt'] = update['pa']
+            position['entryPrice'] = update['ep']
+            position['unrealizedProfit'] = update['up']
+            position['isolated'] = update.get('mt') == 'isolated'
+            position['isolatedWallet'] = update.get('iw', '0')
+            self._update_mark_price(position)
+
+        self._adjust_available(margin_before)
+        usdt = self.balances.get('USDT')
+        if usdt is not None:
+            usdt['unrealizedProfit'] = sum(float(p.get('unrealizedProfit', 0)) for p in self.positions.values())
+
+    def _apply_order_update(self, data, update_time):
+        order = {
+            'symbol': data['s'],
+            'orderId': data['i'],
+            'clientOrderId': data['c'],
+            'side': data['S'],
+            'type': data['o'],
+            'origType': data.get('ot', data['o']),
+            'timeInForce': data.get('f'),
+            'origQty': data['q'],
+            'price': data['p'],
+            'avgPrice': data['ap'],
+            'stopPrice': data['sp'],
+            'executedQty': data['z'],
+            'status': data['X'],
+            'positionSide': data.get('ps', 'BOTH'),
+            'reduceOnly': data.get('R', False),
+            'updateTime': update_time
+        }
+        if order['status'] in ('NEW', 'PARTIALLY_FILLED'):
+            self.open_orders[order['orderId']] = order
+        else:
+            self.open_orders.pop(order['orderId'], None)
+        return dict(order)
+
+    def get_balance(self, asset='USDT'):
+        """Same shape as BinanceFuturesAPI.get_balance()"""
+        with self.lock:
+            balance = self.balances.get(asset) if self.synced else None
+            if balance is None:
+                return None
+            return {
+                'total': balance['walletBalance'],
+                'available': balance['availableBalance'],
+                'unrealized_pnl': balance['unrealizedProfit']
+            }
+
+    def get_open_positions(self):
+        """Same shape as BinanceFuturesAPI.get_open_positions()"""
+        with self.lock:
+            if not self.synced:
+                return None
+            return [dict(p) for p in self.positions.values() if float(p.get('positionAmt', 0)) != 0]
+
+    def get_position_amounts(self):
+        """{(symbol, positionSide): absolute position size}"""
+        with self.lock:
+            if not self.synced:
+                return None
+            return {key: abs(float(p.get('positionAmt', 0))) for key, p in self.positions.items()}
+
+    def get_open_orders(self, symbol=None):
+        with self.lock:
+            if not self.synced:
+                return None
+            return [dict(o) for o in self.open_orders.values() if symbol is None or o['symbol'] == symbol]
+
+    def get_open_order_ids(self):
+        with self.lock:
+            return set(self.open_orders) if self.synced else None
+
+class UserDataStream:
+    """
+    Keeps an AccountStateMirror current from the Binance user data stream.
+
+    Creates a listenKey, connects to `{url}/ws/<listenKey>`, then seeds the mirror
+    over REST so nothing that happens while connecting is lost. The key is kept alive
+    (and the mirror re-seeded, which corrects the availableBalance estimate) every
+    `keepalive_interval` seconds; an expired key or a dropped connection leads to a
+    reconnect with a fresh key and exponential backoff. `on_order_update(order)` is
+    called off the event loop for every ORDER_TRADE_UPDATE.
+    `on_leverage_update(symbol, leverage)` is called for every leverage change.
+    """
+
+    def __init__(self, binance_api, mirror, url, on_order_update=None, on_leverage_update=None,
+                 keepalive_interval=1800, reconnect_min_delay=1.0, reconnect_max_delay=60.0):
+        self.binance_api = binance_api
+        self.mirror = mirror
+        self.url = url
+        self.on_order_update = on_order_update
+        self.on_leverage_update = on_leverage_update # Called as on_leverage_update(symbol, leverage)
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.running = False
+        self.connected = False
+        self.thread = None
+        self.listen_key = None
+        self.messages_received = 0
+        self.reconnects = 0
+        self._loop = None
+        self._ws = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._thread_main, name="user-data-stream", daemon=True)
+        self.thread.start()
+        logger.info(f"UserStream: started via {self.url}")
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        if self._loop and self._ws is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+            except RuntimeError:
+                pass # Loop already closed
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        logger.info("UserStream: stopped")
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._run())
+        except Exception as e:
+            logger.error(f"UserStream: event loop crashed: {e}", exc_info=True)
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _seed(self):
+        # Event times are Binance's clock, so the cut-off for events the snapshot already
+        # contains is taken from the server too; ours may be ahead of it
+        snapshot_time = await asyncio.to_thread(self.binance_api.get_server_time)
+        if snapshot_time is None:
+            raise ConnectionError("could not get the server time")
+        account_info, open_orders = await asyncio.gather(
+            asyncio.to_thread(self.binance_api.get_account_info),
+            asyncio.to_thread(self.binance_api.get_open_orders)
+        )
+        if account_info is None or open_orders is None:
+            raise ConnectionError("could not load the account snapshot")
+        self.mirror.seed(account_info, open_orders, snapshot_time)
+
+    async def _run(self):
+        backoff = self.reconnect_min_delay
+        while self.running:
+            try:
+                self.listen_key = await asyncio.to_thread(self.binance_api.create_listen_key)
+                if not self.listen_key:
+                    raise ConnectionError("could not create a listenKey")
+                async with websockets.connect(f"{self.url}/ws/{self.listen_key}", ping_interval=20, ping_timeout=20) as ws:
+                    self._ws = ws
+                    self.connected = True
+                    await self._seed()
+                    backoff = self.reconnect_min_delay
+                    logger.info("UserStream: connected and account mirror seeded")
+                    keepalive_task = asyncio.create_task(self._keepalive(ws))
+                    try:
+                        async for raw_message in ws:
+                            self._handle_message(raw_message, ws)
+                    finally:
+                        keepalive_task.cancel()
+            except Exception as e:
+                if self.running:
+                    logger.warning(f"UserStream: connection error: {e}")
+            finally:
+                self._ws = None
+                self.connected = False
+                self.mirror.invalidate() # Readers fall back to REST until we are seeded again
+
+            if not self.running:
+                break
+            delay = backoff * (0.5 + random.random())
+            self.reconnects += 1
+            logger.info(f"UserStream: reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.reconnect_max_delay)
+
+        if self.listen_key:
+            await asyncio.to_thread(self.binance_api.close_listen_key)
+            self.listen_key = None
+
+    async def _keepalive(self, ws):
+        while self.running:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                if not await asyncio.to_thread(self.binance_api.keepalive_listen_key):
+                    logger.warning("UserStream: listenKey keepalive failed, reconnecting")
+                    await ws.close()
+                    return
+                await self._seed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"UserStream: keepalive error: {e}", exc_info=True)
+
+    def _handle_message(self, raw_message, ws):
+        try:
+            event = json.loads(raw_message)
+        except ValueError:
+            logger.warning(f"UserStream: ignoring non-JSON frame: {raw_message[:100]}")
+            return
+        if not isinstance(event, dict):
+            return
 
+        self.messages_received += 1
+        if event.get('e') == 'listenKeyExpired':
+            logger.warning("UserStream: listenKey expired, reconnecting")
+            asyncio.ensure_future(ws.close())
+            return
+
+        order = self.mirror.apply_event(event)
+        if event.get('e') == 'ACCOUNT_CONFIG_UPDATE' and 'ac' in event and self.on_leverage_update:
+            self.on_leverage_update(event['ac']['s'], event['ac']['l'])
+        if order is not None and self.on_order_update:
+            future = self._loop.run_in_executor(None, self.on_order_update, order)
+            future.add_done_callback(self._log_callback_error)
+
+    def _log_callback_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"UserStream: on_order_update callback failed: {future.exception()}")
+
+class IncrementalEMA:
+    """
+    EMA updated one candle at a time, matching ta.ema (SMA of the first `length` values as seed,
+    then adjust=False smoothing). `amend` replaces the latest value, e.g. while a candle is still open.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = np.nan
+        self.previous = np.nan
+        self._saved = None
+
+    def seed(self, values):
+        self.reset()
+        for value in values:
+            self.update(value)
+        return self.value
+
+    def update(self, value):
+        self._saved = (self.count, self.seed_sum, self.value, self.previous)
+        self.previous = self.value
+        self.count += 1
+        if self.count <= self.length:
+            self.seed_sum += value
+            self.value = self.seed_sum / self.length if self.count == self.length else np.nan
+        else:
+            self.value = self.alpha * value + (1.0 - self.alpha) * self.value
+        return self.value
+
+    def amend(self, value):
+        if self._saved is None:
+            return self.update(value)
+        self.count, self.seed_sum, self.value, self.previous = self._saved
+        return self.update(value)
+
+
+class IncrementalRSI:
+    """
+    RSI updated one candle at a time, matching ta.rsi without TA-Lib: gains and losses are smoothed
+    with an adjusted EWM of alpha=1/length, which converges to Wilder's smoothing once warmed up.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.reset()
+
+    def reset(self):
+        self.prev_close = None
+        self.count = 0 # Price changes seen so far
+        self.gain_sum = 0.0 # Decay-weighted sums; the common weight total cancels out of the ratio
+        self.loss_sum = 0.0
+        self.value = np.nan
+        self.previous = np.nan
+        self._saved = None
+
+    def seed(self, values):
+        self.reset()
+        for value in values:
+            self.update(value)
+        return self.value
+
+    def update(self, close):
+        self._saved = (self.prev_close, self.count, self.gain_sum, self.loss_sum, self.value, self.previous)
+        self.previous = self.value
+        if self.prev_close is None:
+            self.prev_close = close
+            return self.value
+        change = close - self.prev_close
+        self.prev_close = close
+        self.gain_sum = max(change, 0.0) + self.decay * self.gain_sum
+        self.loss_sum = max(-change, 0.0) + self.decay * self.loss_sum
+        self.count += 1
+        total = self.gain_sum + self.loss_sum
+        if self.count >= self.length and total > 0:
+            self.value = 100.0 * self.gain_sum / total
+        else:
+            self.value = np.nan
+        return self.value
+
+    def amend(self, close):
+        if self._saved is None:
+            return self.update(close)
+        self.prev_close, self.count, self.gain_sum, self.loss_sum, self.value, self.previous = self._saved
+        return self.update(close)
+
+
+class IncrementalBollinger:
+    """
+    Bollinger Bands over a rolling window with running sums, matching ta.bbands (SMA middle band,
+    population standard deviation). Sums are rebuilt from the window every `length` updates so
+    floating-point drift cannot accumulate.
+    """
+
+    def __init__(self, length, std=2.0):
+        self.length = length
+        self.std = std
+        self.reset()
+
+    def reset(self):
+        self.window = deque(maxlen=self.length)
+        self.shift = None # Values are stored relative to the first one seen, to keep the variance well conditioned
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.updates_since_rebuild = 0
+        self.value = (np.nan, np.nan, np.nan) # (lower, middle, upper)
+        self.previous = (np.nan, np.nan, np.nan)
+
+    def seed(self, values):
+        self.reset()
+        for value in values:
+            self.update(value)
+        return self.value
+
+    def _bands(self):
+        if len(self.window) < self.length:
+            return (np.nan, np.nan, np.nan)
+        mean = self.sum / self.length
+        deviation = math.sqrt(max(self.sum_sq / self.length - mean * mean, 0.0)) * self.std
+        middle = mean + self.shift
+        return (middle - deviation, middle, middle + deviation)
+
+    def update(self, value):
+        self.previous = self.value
+        if self.shift is None:
+            self.shift = value
+        x = value - self.shift
+        if len(self.window) == self.length:
+            evicted = self.window[0]
+            self.sum -= evicted
+            self.sum_sq -= evicted * evicted
+        self.window.append(x)
+        self.sum += x
+        self.sum_sq += x * x
+        self.updates_since_rebuild += 1
+        if self.updates_since_rebuild >= self.length:
+            self.sum = math.fsum(self.window)
+            self.sum_sq = math.fsum(v * v for v in self.window)
+            self.updates_since_rebuild = 0
+        self.value = self._bands()
+        return self.value
+
+    def amend(self, value):
+        if not self.window:
+            return self.update(value)
+        old = self.window[-1]
+        x = value - self.shift
+        self.window[-1] = x
+        self.sum += x - old
+        self.sum_sq += x * x - old * old
+        self.value = self._bands()
+        return self.value
+
+
+class IncrementalIndicatorSet:
+    """RSI, both EMAs and Bollinger Bands for one (symbol, timeframe), kept in step with its CandleSeries."""
+
+    def __init__(self, settings):
+        self.rsi = IncrementalRSI(settings.get('rsi_period', 14))
+        self.ema_short = IncrementalEMA(settings.get('ema_short', 20))
+        self.ema_long = IncrementalEMA(settings.get('ema_long', 50))
+        self.bollinger = IncrementalBollinger(settings.get('bb_period', 20), settings.get('bb_std', 2.0))
+        self.indicators = (self.rsi, self.ema_short, self.ema_long, self.bollinger)
+        self.last_open_time = None
+
+    def seed(self, open_times, closes):
+        for indicator in self.indicators:
+            indicator.seed(closes)
+        self.last_open_time = int(open_times[-1]) if len(open_times) else None
+
+    def sync(self, open_times, closes):
+        """Catch up with the candles in (open_times, closes); only candles after the last one seen are processed."""
+        if len(open_times) == 0:
+            return
+        index = None
+        if self.last_open_time is not None:
+            index = int(np.searchsorted(open_times, self.last_open_time))
+            if index >= len(open_times) or open_times[index] != self.last_open_time:
+                index = None
+        if index is None:
+            # First use, or the series was reloaded past the point we had reached
+            self.seed(open_times, closes)
+            return
+        # The candle we stopped at may have been still open: apply its final close first
+        for indicator in self.indicators:
+            indicator.amend(float(closes[index]))
+        for close in closes[index + 1:]:
+            close = float(close)
+            for indicator in self.indicators:
+                indicator.update(close)
+        self.last_open_time = int(open_times[-1])
+
+class IndicatorCache:
+    """
+    LRU cache of calculate_indicators results with a time-to-live.
+
+    Keys are (symbol, timeframe, settings hash, last candle open time, last close):
+    the indicators only depend on the closes in the window, so an entry stays valid
+    until a new candle arrives or the still-forming candle's price moves.
+    Cached dicts are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=1000, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (stored_at, value), oldest use first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+# Latest-candle values produced by TechnicalAnalysis.calculate_indicators_batch, one record per symbol
+BATCH_INDICATOR_DTYPE = np.dtype([
+    ('open', 'f8'), ('close', 'f8'),
+    ('rsi', 'f8'), ('ema_short', 'f8'), ('ema_long', 'f8'),
+    ('bb_upper', 'f8'), ('bb_middle', 'f8'), ('bb_lower', 'f8'),
+    ('candle_green', '?'), ('candle_size_pct', 'f8')
+])
+
+# Signal scoring (TechnicalAnalysis.score_signals): action codes index SIGNAL_ACTIONS,
+# reasons are a bitmask of SIGNAL_REASON_* flags rendered by format_signal_reasons
+SIGNAL_ACTIONS = ('WAIT', 'LONG', 'SHORT')
+SIGNAL_WAIT, SIGNAL_LONG, SIGNAL_SHORT = 0, 1, 2
+
+SIGNAL_REASON_RSI_OVERSOLD = 1 << 0
+SIGNAL_REASON_RSI_OVERBOUGHT = 1 << 1
+SIGNAL_REASON_EMA_BULLISH_CONFIRM = 1 << 2
+SIGNAL_REASON_EMA_BULLISH = 1 << 3
+SIGNAL_REASON_EMA_BEARISH_CONFIRM = 1 << 4
+SIGNAL_REASON_EMA_BEARISH = 1 << 5
+SIGNAL_REASON_BB_ABOVE_CONFIRM = 1 << 6
+SIGNAL_REASON_BB_ABOVE = 1 << 7
+SIGNAL_REASON_BB_BELOW_CONFIRM = 1 << 8
+SIGNAL_REASON_BB_BELOW = 1 << 9
+SIGNAL_REASON_INSUFFICIENT = 1 << 10
+SIGNAL_REASON_NO_SIGNAL = 1 << 11
+SIGNAL_REASON_NAN = 1 << 12
+
+# In reporting order; placeholders are filled by format_signal_reasons
+SIGNAL_REASON_TEMPLATES = (
+    (SIGNAL_REASON_NAN, "Critical indicator is NaN"),
+    (SIGNAL_REASON_RSI_OVERSOLD, "RSI oversold ({rsi:.2f}) & green candle"),
+    (SIGNAL_REASON_RSI_OVERBOUGHT, "RSI overbought ({rsi:.2f}) & red candle"),
+    (SIGNAL_REASON_EMA_BULLISH_CONFIRM, "EMA bullish confirmation"),
+    (SIGNAL_REASON_EMA_BULLISH, "EMA bullish crossover"),
+    (SIGNAL_REASON_EMA_BEARISH_CONFIRM, "EMA bearish confirmation"),
+    (SIGNAL_REASON_EMA_BEARISH, "EMA bearish crossover"),
+    (SIGNAL_REASON_BB_ABOVE_CONFIRM, "BB price above upper (confirms SHORT)"),
+    (SIGNAL_REASON_BB_ABOVE, "BB price above upper (potential SHORT reversal)"),
+    (SIGNAL_REASON_BB_BELOW_CONFIRM, "BB price below lower (confirms LONG)"),
+    (SIGNAL_REASON_BB_BELOW, "BB price below lower (potential LONG reversal)"),
+    (SIGNAL_REASON_INSUFFICIENT, "Final strength {raw_strength}/{threshold} insufficient"),
+    (SIGNAL_REASON_NO_SIGNAL, "No strong signal found (strength {strength}/{threshold})"),
+)
+
+SIGNAL_SCORE_DTYPE = np.dtype([
+    ('action', 'i1'),        # Index into SIGNAL_ACTIONS
+    ('strength', 'i4'),      # Final strength (0 when reverted to WAIT)
+    ('raw_strength', 'i4'),  # Strength before the threshold check
+    ('reasons', 'u4'),       # SIGNAL_REASON_* bitmask
+])
+
+def format_signal_reasons(reasons, rsi, strength, raw_strength, threshold):
+    """Renders a SIGNAL_REASON_* bitmask into the reason strings get_signal reports."""
+    values = {'rsi': rsi, 'strength': strength, 'raw_strength': raw_strength, 'threshold': threshold}
+    return [template.format(**values) for flag, template in SIGNAL_REASON_TEMPLATES if reasons & flag]
+
+# In TechnicalAnalysis class
+
+class TechnicalAnalysis:
+    def __init__(self, binance_api):
+        self.binance_api = binance_api
+        self.settings = INDICATOR_SETTINGS
+        self.candle_store = CandleStore(
+            binance_api,
+            capacity=self.settings.get('candle_store_capacity', 500),
+            min_refresh_interval=self.settings.get('candle_refresh_min_interval', 1.0)
+        )
+        self.indicator_states = {} # (symbol, timeframe) -> IncrementalIndicatorSet, when use_incremental_indicators is on
+        self.indicator_cache = IndicatorCache(
+            max_entries=self.settings.get('indicator_cache_size', 1000),
+            ttl_seconds=self.settings.get('indicator_cache_ttl_seconds', 600)
+        )
+
+    def get_settings_hash(self):
+        """Hash of the settings that affect indicator values, part of the indicator cache key."""
+        return hash(tuple(self.settings.get(key) for key in (
+            'rsi_period', 'ema_short', 'ema_long', 'bb_period', 'bb_std', 'use_incremental_indicators'
+        )))
+
+    def _indicator_cache_key(self, symbol, timeframe, open_times, ohlcv):
+        return (symbol, timeframe, self.get_settings_hash(), int(open_times[-1]), float(ohlcv[3][-1]))
+
+    def get_indicator_window(self):
+        """Returns (minimum candles needed, candles used) for one indicator calculation."""
         # Tentukan panjang data minimum yang dibutuhkan berdasarkan indikator terpanjang
         # Misalnya, EMA_long + beberapa candle ekstra untuk stabilitas BB dan RSI
         ema_long_period = self.settings.get('ema_long', 50)
@@ -600,147 +3429,185 @@ class TechnicalAnalysis:
         # di akhir series untuk semua indikator.
         required_initial_candles = max(ema_long_period, bb_period, rsi_period)
         buffer_candles = 30 # Buffer untuk stabilitas dan periode awal NaN
-        limit_request = required_initial_candles + buffer_candles
+        return required_initial_candles, required_initial_candles + buffer_candles
+
+    def calculate_indicators(self, symbol: str, timeframe: str = None, closed_open_time: int = None) -> dict | None:
+        """
+        Calculates technical indicators for a given symbol and timeframe.
+
+        Args:
+            symbol (str): The trading symbol (e.g., "BTCUSDT").
+            timeframe (str, optional): The candle timeframe (e.g., "5m", "1h"). 
+                                       Defaults to self.settings['candle_timeframe'].
+            closed_open_time (int, optional): Open time (ms) of a closed candle to evaluate; the
+                                       window then ends at that candle, as in the backtester.
+                                       Defaults to the newest (possibly still forming) candle.
+
+        Returns:
+            dict | None: A dictionary containing calculated indicators and other relevant data,
+                         or None if calculation fails or data is insufficient.
+        """
+        if timeframe is None:
+            timeframe = self.settings.get('candle_timeframe', '5m') # Default jika tidak ada di settings
+
+        required_initial_candles, limit_request = self.get_indicator_window()
         
-        logger.debug(f"[{symbol}@{timeframe}] Requesting klines from API, limit: {limit_request}")
+        logger.debug(f"[{symbol}@{timeframe}] Refreshing candle store, need {limit_request} candles")
         
-        df: pd.DataFrame | None = None
         try:
-            df = self.binance_api.get_klines(symbol, timeframe, limit=limit_request)
+            self.candle_store.refresh(symbol, timeframe, limit_request)
         except Exception as e_klines:
-            logger.error(f"[{symbol}@{timeframe}] Exception during API call to get_klines: {e_klines}", exc_info=True)
+            logger.error(f"[{symbol}@{timeframe}] Exception while refreshing candles: {e_klines}", exc_info=True)
             return None
 
-        # --- Validasi DataFrame Awal ---
-        if df is None:
-            logger.error(f"[{symbol}@{timeframe}] get_klines returned None. Cannot calculate indicators.")
-            return None
-        
-        if not isinstance(df, pd.DataFrame):
-            logger.error(f"[{symbol}@{timeframe}] get_klines did not return a pandas DataFrame (type: {type(df)}). Cannot calculate.")
-            return None
-            
-        if df.empty:
-            logger.error(f"[{symbol}@{timeframe}] get_klines returned an empty DataFrame. Cannot calculate indicators.")
-            return None
+        series = self.candle_store.get_series(symbol, timeframe)
+        # Hold the series lock while the views are in use: a concurrent update may move the data
+        with series.lock:
+            open_times, ohlcv = series.window(limit_request, until_open_time=closed_open_time)
 
-        # Periksa apakah jumlah baris yang dikembalikan cukup, setidaknya untuk indikator terpanjang
-        if len(df) < required_initial_candles:
-            logger.error(
-                f"[{symbol}@{timeframe}] Insufficient data returned by get_klines. "
-                f"Got {len(df)} rows, needed at least {required_initial_candles} for primary indicators. Aborting calculation."
-            )
-            return None
-        
-        # --- Persiapan Kolom dan Kalkulasi Indikator ---
-        try:
-            # Pastikan kolom OHLCV ada dan bertipe numerik
-            ohlcv_cols = ['open', 'high', 'low', 'close', 'volume']
-            for col in ohlcv_cols:
-                if col not in df.columns:
-                    logger.error(f"[{symbol}@{timeframe}] DataFrame missing required column: '{col}'.")
-                    return None
-                # Konversi ke float jika belum (get_klines idealnya sudah melakukan ini)
-                if not pd.api.types.is_numeric_dtype(df[col]):
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                # Jika setelah konversi masih ada NaN di kolom penting seperti 'close', ini masalah
-                if col == 'close' and df[col].isnull().any():
-                    logger.error(f"[{symbol}@{timeframe}] 'close' column contains NaN values after numeric conversion. Cannot proceed.")
-                    return None
-            
-            # Hapus baris dengan NaN di 'close' jika ada, sebelum kalkulasi TA
-            # Ini penting karena TA lib tidak suka NaN di input utama
-            df.dropna(subset=['close'], inplace=True)
-            if len(df) < required_initial_candles: # Cek lagi setelah dropna
-                logger.error(f"[{symbol}@{timeframe}] Insufficient data after dropping NaN 'close' values. Got {len(df)}, needed {required_initial_candles}.")
+            # --- Validasi Data Awal ---
+            if len(open_times) == 0:
+                if closed_open_time is not None:
+                    logger.error(f"[{symbol}@{timeframe}] Closed candle {closed_open_time} is not in the candle store. Cannot calculate indicators.")
+                else:
+                    logger.error(f"[{symbol}@{timeframe}] Candle store has no data. Cannot calculate indicators.")
                 return None
 
-            # 1. RSI (Relative Strength Index)
-            rsi_len = self.settings.get('rsi_period', 14)
-            df['rsi'] = ta.rsi(close=df['close'], length=rsi_len)
-            
-            # 2. EMAs (Exponential Moving Averages)
-            ema_s_len = self.settings.get('ema_short', 20)
-            ema_l_len = self.settings.get('ema_long', 50)
-            df['ema_short'] = ta.ema(close=df['close'], length=ema_s_len)
-            df['ema_long'] = ta.ema(close=df['close'], length=ema_l_len)
-            
-            # 3. Bollinger Bands
-            bb_len = self.settings.get('bb_period', 20)
-            bb_std = self.settings.get('bb_std', 2.0)
-            bbands_df = ta.bbands(close=df['close'], length=bb_len, std=bb_std)
+            # Reuse the result computed for exactly these candles by another caller
+            cache_key = self._indicator_cache_key(symbol, timeframe, open_times, ohlcv)
+            cached = self.indicator_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # Periksa apakah jumlah candle cukup, setidaknya untuk indikator terpanjang
+            if len(open_times) < required_initial_candles:
+                logger.error(
+                    f"[{symbol}@{timeframe}] Insufficient candle data. "
+                    f"Got {len(open_times)} rows, needed at least {required_initial_candles} for primary indicators. Aborting calculation."
+                )
+                return None
             
-            if bbands_df is not None and not bbands_df.empty:
-                # Nama kolom output pandas-ta bisa bervariasi sedikit, pastikan formatnya benar
-                # Umumnya: BBL_{length}_{stddev}, BBM_{length}_{stddev}, BBU_{length}_{stddev}
-                # Untuk stddev float, pandas-ta mungkin menggunakan format seperti '2.0' atau '2'
-                # Kita coba beberapa format umum jika yang pertama gagal
-                bb_std_str = f"{bb_std:.1f}" # Misal "2.0"
-                bb_l_col = f'BBL_{bb_len}_{bb_std_str}'
-                bb_m_col = f'BBM_{bb_len}_{bb_std_str}'
-                bb_u_col = f'BBU_{bb_len}_{bb_std_str}'
-
-                if bb_l_col not in bbands_df.columns: # Coba format std tanpa desimal jika .0
-                    bb_std_str_alt = str(int(bb_std)) if bb_std == int(bb_std) else bb_std_str
-                    bb_l_col = f'BBL_{bb_len}_{bb_std_str_alt}'
-                    bb_m_col = f'BBM_{bb_len}_{bb_std_str_alt}'
-                    bb_u_col = f'BBU_{bb_len}_{bb_std_str_alt}'
-                
-                if bb_l_col in bbands_df.columns:
-                    df['bb_lower'] = bbands_df[bb_l_col]
-                    df['bb_middle'] = bbands_df[bb_m_col]
-                    df['bb_upper'] = bbands_df[bb_u_col]
+            # --- Kalkulasi Indikator ---
+            try:
+                # Series over zero-copy, read-only views of the candle store
+                open_view, close_view = ohlcv[0], ohlcv[3]
+                open_view.flags.writeable = False
+                close_view.flags.writeable = False
+                open_s = pd.Series(open_view, copy=False)
+                close_s = pd.Series(close_view, copy=False)
+
+                # NaN di 'close' adalah masalah karena TA lib tidak suka NaN di input utama
+                if close_s.isnull().any():
+                    logger.error(f"[{symbol}@{timeframe}] 'close' values contain NaN. Cannot proceed.")
+                    return None
+
+                if self.settings.get('use_incremental_indicators', False):
+                    # Only the last two candles are read below, so expose (previous, latest) pairs
+                    state = self.indicator_states.get((symbol, timeframe))
+                    if state is None:
+                        state = self.indicator_states.setdefault((symbol, timeframe), IncrementalIndicatorSet(self.settings))
+                    all_open_times, all_ohlcv = series.window(until_open_time=closed_open_time)
+                    state.sync(all_open_times, all_ohlcv[3])
+                    rsi = pd.Series([state.rsi.previous, state.rsi.value])
+                    ema_short = pd.Series([state.ema_short.previous, state.ema_short.value])
+                    ema_long = pd.Series([state.ema_long.previous, state.ema_long.value])
+                    bb_lower, bb_middle, bb_upper = (
+                        pd.Series(pair) for pair in zip(state.bollinger.previous, state.bollinger.value)
+                    )
                 else:
-                    logger.warning(f"[{symbol}@{timeframe}] Could not find expected Bollinger Bands columns (e.g., {bb_l_col}). Setting BBs to NaN.")
-                    df['bb_lower'], df['bb_middle'], df['bb_upper'] = pd.NA, pd.NA, pd.NA
-            else:
-                logger.warning(f"[{symbol}@{timeframe}] pandas_ta.bbands returned None or empty. Setting BBs to NaN.")
-                df['bb_lower'], df['bb_middle'], df['bb_upper'] = pd.NA, pd.NA, pd.NA
-            
-            # 4. Candle Color
-            df['candle_color'] = np.where(df['close'] >= df['open'], 'green', 'red')
-            
-            # 5. Candle Size Percentage
-            # Hindari pembagian dengan nol jika 'open' bisa 0 atau NaN
-            df['candle_size_pct'] = ((df['close'] - df['open']).abs() / df['open'].replace(0, np.nan) * 100).fillna(0.0)
-            
-            # --- Ekstrak Baris Data Terakhir ---
-            if df.empty: # Cek lagi jika df menjadi kosong karena error di atas
-                logger.error(f"[{symbol}@{timeframe}] DataFrame is empty before selecting the latest row after TA calculations.")
-                return None
+                    # 1. RSI (Relative Strength Index)
+                    rsi_len = self.settings.get('rsi_period', 14)
+                    rsi = ta.rsi(close=close_s, length=rsi_len)
                 
-            latest_indicators_row = df.iloc[-1].copy() # Baris terakhir untuk sinyal saat ini
-            previous_indicators_row = df.iloc[-2].copy() if len(df) > 1 else None # Baris sebelumnya
-
-            # --- Validasi Akhir untuk NaN di Indikator Kritis pada Baris Terakhir ---
-            # Indikator ini harus ada nilainya (bukan NaN) untuk menghasilkan sinyal yang valid
-            critical_ta_cols_for_signal = ['rsi', 'ema_short', 'ema_long', 'bb_middle']
-            nan_in_critical = latest_indicators_row[critical_ta_cols_for_signal].isnull().any()
-
-            if nan_in_critical:
-                rsi_val_str = f"{latest_indicators_row['rsi']:.2f}" if pd.notna(latest_indicators_row['rsi']) else "NaN"
-                ema_s_val_str = f"{latest_indicators_row['ema_short']:.4f}" if pd.notna(latest_indicators_row['ema_short']) else "NaN"
-                ema_l_val_str = f"{latest_indicators_row['ema_long']:.4f}" if pd.notna(latest_indicators_row['ema_long']) else "NaN"
-                bb_m_val_str = f"{latest_indicators_row['bb_middle']:.4f}" if pd.notna(latest_indicators_row['bb_middle']) else "NaN"
+                    # 2. EMAs (Exponential Moving Averages)
+                    ema_s_len = self.settings.get('ema_short', 20)
+                    ema_l_len = self.settings.get('ema_long', 50)
+                    ema_short = ta.ema(close=close_s, length=ema_s_len)
+                    ema_long = ta.ema(close=close_s, length=ema_l_len)
                 
-                logger.warning(
-                    f"[{symbol}@{timeframe}] Latest indicator row contains NaN in critical TA values: "
-                    f"RSI: {rsi_val_str}, EMA_S: {ema_s_val_str}, EMA_L: {ema_l_val_str}, BB_M: {bb_m_val_str}. "
-                    "Cannot generate a reliable signal."
-                )
-                return None # Jika ada NaN di indikator penting, jangan hasilkan sinyal
+                    # 3. Bollinger Bands
+                    bb_len = self.settings.get('bb_period', 20)
+                    bb_std = self.settings.get('bb_std', 2.0)
+                    bbands_df = ta.bbands(close=close_s, length=bb_len, std=bb_std)
+                    bb_lower = bb_middle = bb_upper = None
+                
+                    if bbands_df is not None and not bbands_df.empty:
+                        # Nama kolom output pandas-ta bisa bervariasi sedikit, pastikan formatnya benar
+                        # Umumnya: BBL_{length}_{stddev}, BBM_{length}_{stddev}, BBU_{length}_{stddev}
+                        # Untuk stddev float, pandas-ta mungkin menggunakan format seperti '2.0' atau '2'
+                        # Kita coba beberapa format umum jika yang pertama gagal
+                        bb_std_str = f"{bb_std:.1f}" # Misal "2.0"
+                        bb_l_col = f'BBL_{bb_len}_{bb_std_str}'
+                        bb_m_col = f'BBM_{bb_len}_{bb_std_str}'
+                        bb_u_col = f'BBU_{bb_len}_{bb_std_str}'
+
+                        if bb_l_col not in bbands_df.columns: # Coba format std tanpa desimal jika .0
+                            bb_std_str_alt = str(int(bb_std)) if bb_std == int(bb_std) else bb_std_str
+                            bb_l_col = f'BBL_{bb_len}_{bb_std_str_alt}'
+                            bb_m_col = f'BBM_{bb_len}_{bb_std_str_alt}'
+                            bb_u_col = f'BBU_{bb_len}_{bb_std_str_alt}'
+                    
+                        if bb_l_col in bbands_df.columns:
+                            bb_lower = bbands_df[bb_l_col]
+                            bb_middle = bbands_df[bb_m_col]
+                            bb_upper = bbands_df[bb_u_col]
+                        else:
+                            logger.warning(f"[{symbol}@{timeframe}] Could not find expected Bollinger Bands columns (e.g., {bb_l_col}). Setting BBs to NaN.")
+                    else:
+                        logger.warning(f"[{symbol}@{timeframe}] pandas_ta.bbands returned None or empty. Setting BBs to NaN.")
+
+                # --- Ekstrak Nilai Candle Terakhir (dan sebelumnya) ---
+                def values_at(index):
+                    open_price = float(open_view[index])
+                    close_price = float(close_view[index])
+                    return {
+                        'timestamp': pd.to_datetime(int(open_times[index]), unit='ms'),
+                        'open': open_price,
+                        'close': close_price,
+                        'rsi': float(rsi.iloc[index]) if rsi is not None else np.nan,
+                        'ema_short': float(ema_short.iloc[index]) if ema_short is not None else np.nan,
+                        'ema_long': float(ema_long.iloc[index]) if ema_long is not None else np.nan,
+                        'bb_upper': float(bb_upper.iloc[index]) if bb_upper is not None else np.nan,
+                        'bb_middle': float(bb_middle.iloc[index]) if bb_middle is not None else np.nan,
+                        'bb_lower': float(bb_lower.iloc[index]) if bb_lower is not None else np.nan,
+                        # 4. Candle Color
+                        'candle_color': 'green' if close_price >= open_price else 'red',
+                        # 5. Candle Size Percentage (hindari pembagian dengan nol)
+                        'candle_size_pct': abs(close_price - open_price) / open_price * 100 if open_price else 0.0
+                    }
 
-        except KeyError as e_key:
-            logger.error(f"[{symbol}@{timeframe}] KeyError during indicator calculation. Missing column or wrong TA lib output format for '{e_key}'.", exc_info=True)
-            return None
-        except Exception as e_calc: # Tangkap error umum lainnya selama kalkulasi
-            logger.error(f"[{symbol}@{timeframe}] Unexpected error during indicator calculation: {e_calc}", exc_info=True)
-            return None
+                latest_indicators_row = values_at(-1) # Candle terakhir untuk sinyal saat ini
+                previous_indicators_row = values_at(-2) if len(open_times) > 1 else None # Candle sebelumnya
+
+            except KeyError as e_key:
+                logger.error(f"[{symbol}@{timeframe}] KeyError during indicator calculation. Missing column or wrong TA lib output format for '{e_key}'.", exc_info=True)
+                return None
+            except Exception as e_calc: # Tangkap error umum lainnya selama kalkulasi
+                logger.error(f"[{symbol}@{timeframe}] Unexpected error during indicator calculation: {e_calc}", exc_info=True)
+                return None
+
+        # --- Validasi Akhir untuk NaN di Indikator Kritis pada Candle Terakhir ---
+        # Indikator ini harus ada nilainya (bukan NaN) untuk menghasilkan sinyal yang valid
+        critical_ta_cols_for_signal = ['rsi', 'ema_short', 'ema_long', 'bb_middle']
+        nan_in_critical = any(pd.isna(latest_indicators_row[col]) for col in critical_ta_cols_for_signal)
+
+        if nan_in_critical:
+            rsi_val_str = f"{latest_indicators_row['rsi']:.2f}" if pd.notna(latest_indicators_row['rsi']) else "NaN"
+            ema_s_val_str = f"{latest_indicators_row['ema_short']:.4f}" if pd.notna(latest_indicators_row['ema_short']) else "NaN"
+            ema_l_val_str = f"{latest_indicators_row['ema_long']:.4f}" if pd.notna(latest_indicators_row['ema_long']) else "NaN"
+            bb_m_val_str = f"{latest_indicators_row['bb_middle']:.4f}" if pd.notna(latest_indicators_row['bb_middle']) else "NaN"
+            
+            logger.warning(
+                f"[{symbol}@{timeframe}] Latest indicator row contains NaN in critical TA values: "
+                f"RSI: {rsi_val_str}, EMA_S: {ema_s_val_str}, EMA_L: {ema_l_val_str}, BB_M: {bb_m_val_str}. "
+                "Cannot generate a reliable signal."
+            )
+            return None # Jika ada NaN di indikator penting, jangan hasilkan sinyal
             
         # Jika semua berhasil, kembalikan dictionary hasil
-        return {
+        indicators = {
             'symbol': symbol,
-            'timestamp': latest_indicators_row['timestamp'], # Seharusnya pd.Timestamp dari get_klines
+            'timestamp': latest_indicators_row['timestamp'],
             'close': latest_indicators_row['close'],
             'rsi': latest_indicators_row['rsi'],
             'ema_short': latest_indicators_row['ema_short'],
@@ -750,173 +3617,679 @@ class TechnicalAnalysis:
             'bb_lower': latest_indicators_row['bb_lower'],
             'candle_color': latest_indicators_row['candle_color'],
             'candle_size_pct': latest_indicators_row['candle_size_pct'],
-            'previous': previous_indicators_row, # Bisa None jika hanya ada 1 baris data
-            # 'df': df # Opsional: Mengembalikan seluruh df bisa memakan banyak memori jika sering dipanggil.
-                      # Berguna untuk debugging, tapi mungkin tidak untuk produksi.
+            'previous': previous_indicators_row, # Bisa None jika hanya ada 1 candle
         }
+        self.indicator_cache.put(cache_key, indicators)
+        return indicators
         
-    def get_signal(self, symbol, timeframe=None):
-        """Get trading signal based on technical indicators"""
+    def calculate_indicators_batch(self, close, open_):
+        """
+        Computes the latest RSI, EMAs, Bollinger Bands and candle stats for many symbols at once.
+
+        Args:
+            close (np.ndarray): (symbols x candles) close prices, oldest candle first.
+            open_ (np.ndarray): (symbols x candles) open prices, same layout.
+
+        Returns:
+            np.ndarray: Structured array of BATCH_INDICATOR_DTYPE, one record per row. Values
+                        match calculate_indicators run over the same candles (NaN where a
+                        row is too short for an indicator).
+        """
+        close = np.asarray(close, dtype=np.float64)
+        open_ = np.asarray(open_, dtype=np.float64)
+        n_symbols, n_candles = close.shape
+        result = np.empty(n_symbols, dtype=BATCH_INDICATOR_DTYPE)
+        result['open'] = open_[:, -1]
+        result['close'] = close[:, -1]
+        result['candle_green'] = close[:, -1] >= open_[:, -1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['candle_size_pct'] = np.where(
+                open_[:, -1] != 0, np.abs(close[:, -1] - open_[:, -1]) / open_[:, -1] * 100, 0.0
+            )
+
+        # RSI: pandas_ta smooths gains/losses with an adjusted EWM (alpha=1/length); its latest
+        # value is a weighted sum over all changes, i.e. one matrix-vector product per side.
+        rsi_len = self.settings.get('rsi_period', 14)
+        result['rsi'] = np.nan
+        if n_candles - 1 >= rsi_len:
+            changes = np.diff(close, axis=1)
+            weights = (1.0 - 1.0 / rsi_len) ** np.arange(n_candles - 2, -1, -1)
+            gains = np.clip(changes, 0.0, None) @ weights
+            losses = np.clip(-changes, 0.0, None) @ weights
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result['rsi'] = 100.0 * gains / (gains + losses)
+
+        # EMAs: SMA of the first `length` closes as seed, then adjust=False smoothing,
+        # unrolled into a weighted sum over the closes after the seed.
+        for field, length in (('ema_short', self.settings.get('ema_short', 20)),
+                              ('ema_long', self.settings.get('ema_long', 50))):
+            if n_candles < length:
+                result[field] = np.nan
+                continue
+            alpha = 2.0 / (length + 1)
+            steps = n_candles - length # Candles after the seed
+            seed = close[:, :length].mean(axis=1)
+            weights = alpha * (1.0 - alpha) ** np.arange(steps - 1, -1, -1)
+            result[field] = seed * (1.0 - alpha) ** steps + close[:, length:] @ weights
+
+        # Bollinger Bands: SMA and population standard deviation of the last bb_period closes
+        bb_len = self.settings.get('bb_period', 20)
+        bb_std = self.settings.get('bb_std', 2.0)
+        if n_candles >= bb_len:
+            window = close[:, -bb_len:]
+            middle = window.mean(axis=1)
+            deviation = window.std(axis=1) * bb_std
+            result['bb_middle'] = middle
+            result['bb_upper'] = middle + deviation
+            result['bb_lower'] = middle - deviation
+        else:
+            result['bb_middle'] = result['bb_upper'] = result['bb_lower'] = np.nan
+        return result
+
+    def calculate_indicator_series(self, close, open_):
+        """
+        Indicator values for every candle of one symbol's history: row t holds what
+        calculate_indicators_batch returns for the get_indicator_window() candles ending
+        at t (rows before the first full window are NaN). The weighted sliding sums are
+        evaluated with np.convolve, so the cost grows linearly with the history length.
+        """
+        close = np.ascontiguousarray(close, dtype=np.float64)
+        open_ = np.ascontiguousarray(open_, dtype=np.float64)
+        n_candles = len(close)
+        _, window = self.get_indicator_window()
+        result = np.empty(n_candles, dtype=BATCH_INDICATOR_DTYPE)
+        result['open'] = open_
+        result['close'] = close
+        result['candle_green'] = close >= open_
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['candle_size_pct'] = np.where(open_ != 0, np.abs(close - open_) / open_ * 100, 0.0)
+        for field in ('rsi', 'ema_short', 'ema_long', 'bb_upper', 'bb_middle', 'bb_lower'):
+            result[field] = np.nan
+        if n_candles < window:
+            return result
+        full = slice(window - 1, None) # Rows with a complete window behind them
+
+        rsi_len = self.settings.get('rsi_period', 14)
+        if window - 1 >= rsi_len:
+            changes = np.diff(close)
+            weights = (1.0 - 1.0 / rsi_len) ** np.arange(window - 2, -1, -1) # Oldest change first
+            gains = np.convolve(np.clip(changes, 0.0, None), weights[::-1], 'valid')
+            losses = np.convolve(np.clip(-changes, 0.0, None), weights[::-1], 'valid')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result['rsi'][full] = 100.0 * gains / (gains + losses)
+
+        for field, length in (('ema_short', self.settings.get('ema_short', 20)),
+                              ('ema_long', self.settings.get('ema_long', 50))):
+            if window < length:
+                continue
+            alpha = 2.0 / (length + 1)
+            steps = window - length
+            seeds = np.lib.stride_tricks.sliding_window_view(close, length).mean(axis=1)[:n_candles - window + 1]
+            value = seeds * (1.0 - alpha) ** steps
+            if steps:
+                weights = alpha * (1.0 - alpha) ** np.arange(steps - 1, -1, -1)
+                value = value + np.convolve(close[length:], weights[::-1], 'valid')
+            result[field][full] = value
+
+        bb_len = self.settings.get('bb_period', 20)
+        if window >= bb_len:
+            bb_windows = np.lib.stride_tricks.sliding_window_view(close, bb_len)[window - bb_len:]
+            middle = bb_windows.mean(axis=1)
+            deviation = bb_windows.std(axis=1) * self.settings.get('bb_std', 2.0)
+            result['bb_middle'][full] = middle
+            result['bb_upper'][full] = middle + deviation
+            result['bb_lower'][full] = middle - deviation
+        return result
+
+    def calculate_indicators_for_symbols(self, symbols, timeframe=None):
+        """
+        Batch counterpart of calculate_indicators for symbols already refreshed in the candle store.
+        Returns {symbol: indicators} in the calculate_indicators format ('previous' is None);
+        symbols without enough candles or with NaN in critical values are left out.
+        """
+        if timeframe is None:
+            timeframe = self.settings.get('candle_timeframe', '5m')
+        _, limit = self.get_indicator_window()
+
+        indicators_by_symbol = {}
+        batch_symbols, cache_keys, open_times, closes, opens = [], [], [], [], []
+        for symbol in symbols:
+            series = self.candle_store.get_series(symbol, timeframe)
+            with series.lock:
+                if len(series) < limit:
+                    logger.debug(f"[{symbol}@{timeframe}] Only {len(series)} candles stored, need {limit} for batch indicators.")
+                    continue
+                times_view, ohlcv = series.window(limit)
+                cache_key = self._indicator_cache_key(symbol, timeframe, times_view, ohlcv)
+                cached = self.indicator_cache.get(cache_key)
+                if cached is not None:
+                    indicators_by_symbol[symbol] = cached
+                    continue
+                batch_symbols.append(symbol)
+                cache_keys.append(cache_key)
+                open_times.append(int(times_view[-1]))
+                opens.append(ohlcv[0].copy())
+                closes.append(ohlcv[3].copy())
+        if not batch_symbols:
+            return indicators_by_symbol
+
+        records = self.calculate_indicators_batch(np.vstack(closes), np.vstack(opens))
+        for symbol, cache_key, open_time, record in zip(batch_symbols, cache_keys, open_times, records):
+            if any(np.isnan(record[field]) for field in ('rsi', 'ema_short', 'ema_long', 'bb_middle')):
+                logger.warning(f"[{symbol}@{timeframe}] Batch indicators contain NaN in critical values. Skipping.")
+                continue
+            indicators_by_symbol[symbol] = {
+                'symbol': symbol,
+                'timestamp': pd.to_datetime(open_time, unit='ms'),
+                'close': float(record['close']),
+                'rsi': float(record['rsi']),
+                'ema_short': float(record['ema_short']),
+                'ema_long': float(record['ema_long']),
+                'bb_upper': float(record['bb_upper']),
+                'bb_middle': float(record['bb_middle']),
+                'bb_lower': float(record['bb_lower']),
+                'candle_color': 'green' if record['candle_green'] else 'red',
+                'candle_size_pct': float(record['candle_size_pct']),
+                'previous': None,
+            }
+            self.indicator_cache.put(cache_key, indicators_by_symbol[symbol])
+        return indicators_by_symbol
+
+    def get_signal(self, symbol, timeframe=None, indicators=None, closed_open_time=None):
+        """
+        Get trading signal based on technical indicators (computed here unless passed in),
+        scoring the closed candle opened at `closed_open_time` when given
+        """
         if not timeframe:
             timeframe = self.settings['candle_timeframe']
         
-        indicators = self.calculate_indicators(symbol, timeframe)
+        if indicators is None:
+            indicators = self.calculate_indicators(symbol, timeframe, closed_open_time)
         if not indicators:
             # calculate_indicators sudah melakukan logging, jadi tidak perlu log lagi di sini
             return None
             
+        return self.get_signals({symbol: indicators}, timeframe)[symbol]
+
+    def score_signals(self, values):
+        """
+        Applies the RSI+candle, EMA-alignment and Bollinger rules to many symbols at once.
+
+        Args:
+            values (np.ndarray): Structured array with at least the close, rsi, ema_short,
+                                 ema_long, bb_upper, bb_lower and candle_green fields
+                                 (e.g. from calculate_indicators_batch).
+
+        Returns:
+            np.ndarray: SIGNAL_SCORE_DTYPE records, one per input row.
+        """
+        close = values['close']
+        rsi = values['rsi']
+        ema_short = values['ema_short']
+        ema_long = values['ema_long']
+        bb_upper = values['bb_upper']
+        bb_lower = values['bb_lower']
+        green = values['candle_green'].astype(bool)
+
+        scores = np.zeros(len(values), dtype=SIGNAL_SCORE_DTYPE)
+        action = np.full(len(values), SIGNAL_WAIT, dtype=np.int8)
+        strength = np.zeros(len(values), dtype=np.int32)
+        reasons = np.zeros(len(values), dtype=np.uint32)
+
+        def apply(mask, new_action, points, flag):
+            action[mask] = new_action
+            strength[mask] += points
+            reasons[mask] |= flag
+
+        with np.errstate(invalid='ignore'):
+            # --- RSI + Candle Color Strategy ---
+            rsi_long = (rsi < self.settings['rsi_oversold']) & green
+            rsi_short = (rsi > self.settings['rsi_overbought']) & ~green & ~rsi_long
+            apply(rsi_long, SIGNAL_LONG, 30, SIGNAL_REASON_RSI_OVERSOLD)
+            apply(rsi_short, SIGNAL_SHORT, 30, SIGNAL_REASON_RSI_OVERBOUGHT)
+
+            # --- EMA Strategy: confirms a matching action, or becomes the primary one ---
+            ema_bullish = (close > ema_short) & (ema_short > ema_long)
+            ema_bearish = (close < ema_short) & (ema_short < ema_long) & ~ema_bullish
+            is_long, is_short, is_wait = action == SIGNAL_LONG, action == SIGNAL_SHORT, action == SIGNAL_WAIT
+            apply(ema_bullish & is_long, SIGNAL_LONG, 20, SIGNAL_REASON_EMA_BULLISH_CONFIRM)
+            apply(ema_bullish & is_wait, SIGNAL_LONG, 20, SIGNAL_REASON_EMA_BULLISH)
+            apply(ema_bearish & is_short, SIGNAL_SHORT, 20, SIGNAL_REASON_EMA_BEARISH_CONFIRM)
+            apply(ema_bearish & is_wait, SIGNAL_SHORT, 20, SIGNAL_REASON_EMA_BEARISH)
+
+            # --- Bollinger Bands Strategy ---
+            above_upper = close > bb_upper
+            below_lower = (close < bb_lower) & ~above_upper
+            is_long, is_short, is_wait = action == SIGNAL_LONG, action == SIGNAL_SHORT, action == SIGNAL_WAIT
+            apply(above_upper & is_short, SIGNAL_SHORT, 20, SIGNAL_REASON_BB_ABOVE_CONFIRM)
+            apply(above_upper & is_wait, SIGNAL_SHORT, 15, SIGNAL_REASON_BB_ABOVE)
+            apply(below_lower & is_long, SIGNAL_LONG, 20, SIGNAL_REASON_BB_BELOW_CONFIRM)
+            apply(below_lower & is_wait, SIGNAL_LONG, 15, SIGNAL_REASON_BB_BELOW)
+
+        # --- Final Strength Check & Decision ---
+        threshold = self.settings.get('signal_strength_threshold', 30)
+        scores['raw_strength'] = strength
+        reverted = (action != SIGNAL_WAIT) & (strength < threshold)
+        action[reverted] = SIGNAL_WAIT
+        strength[reverted] = 0
+        reasons[reverted] = SIGNAL_REASON_INSUFFICIENT
+        reasons[(action == SIGNAL_WAIT) & (reasons == 0)] = SIGNAL_REASON_NO_SIGNAL
+
+        # Rows with a missing critical indicator never produce a signal
+        invalid = np.isnan(rsi) | np.isnan(ema_short) | np.isnan(ema_long) | np.isnan(bb_upper) | np.isnan(bb_lower)
+        action[invalid] = SIGNAL_WAIT
+        strength[invalid] = 0
+        scores['raw_strength'][invalid] = 0
+        reasons[invalid] = SIGNAL_REASON_NAN
+
+        scores['action'] = action
+        scores['strength'] = strength
+        scores['reasons'] = reasons
+        return scores
+
+    def get_signals(self, indicators_by_symbol, timeframe=None):
+        """Scores {symbol: indicators} (calculate_indicators format) in one pass; returns {symbol: signal}."""
+        if not timeframe:
+            timeframe = self.settings['candle_timeframe']
+        symbols = list(indicators_by_symbol)
+        values = np.zeros(len(symbols), dtype=BATCH_INDICATOR_DTYPE)
+        for field in ('close', 'rsi', 'ema_short', 'ema_long', 'bb_upper', 'bb_lower'):
+            values[field] = [indicators_by_symbol[symbol][field] for symbol in symbols]
+        values['candle_green'] = [indicators_by_symbol[symbol]['candle_color'] == 'green' for symbol in symbols]
+        scores = self.score_signals(values)
+
+        threshold = self.settings.get('signal_strength_threshold', 30)
+        return {
+            symbol: self._build_signal(symbol, timeframe, indicators_by_symbol[symbol], score, threshold)
+            for symbol, score in zip(symbols, scores)
+        }
+
+    def _build_signal(self, symbol, timeframe, indicators, score, threshold):
+        action = SIGNAL_ACTIONS[score['action']]
+        strength = int(score['strength'])
+        raw_strength = int(score['raw_strength'])
+        reasons = int(score['reasons'])
         signal = {
             'symbol': symbol,
             'timestamp': indicators['timestamp'],
             'price': indicators['close'],
-            'action': 'WAIT',
-            'strength': 0,
-            'reasons': []
+            'action': action,
+            'strength': strength,
+            'reasons': format_signal_reasons(reasons, indicators['rsi'], strength, raw_strength, threshold)
         }
-        
-        # Defensive check for NaN values that might have slipped through calculate_indicators
-        # or if a calculation failed silently for a specific indicator not checked above.
-        if pd.isna(indicators['rsi']) or pd.isna(indicators['ema_short']) or \
-           pd.isna(indicators['ema_long']) or pd.isna(indicators['bb_upper']) or \
-           pd.isna(indicators['bb_lower']):
+
+        if reasons & SIGNAL_REASON_NAN:
             logger.warning(f"[{symbol}@{timeframe}] Critical indicator is NaN. RSI: {indicators['rsi']}, EMA_S: {indicators['ema_short']}, EMA_L: {indicators['ema_long']}, BB_U: {indicators['bb_upper']}, BB_L: {indicators['bb_lower']}. Skipping signal generation.")
-            signal['reasons'].append("Critical indicator is NaN")
             return signal # Return WAIT signal
 
-        logger.debug(
-            f"[{symbol}@{timeframe}] Indicators Check: "
-            f"Close={indicators['close']:.4f}, RSI={indicators['rsi']:.2f}, "
-            f"EMA_S={indicators['ema_short']:.4f}, EMA_L={indicators['ema_long']:.4f}, "
-            f"BB_U={indicators['bb_upper']:.4f}, BB_L={indicators['bb_lower']:.4f}, "
-            f"Candle='{indicators['candle_color']}'"
-        )
-
-        # --- RSI + Candle Color Strategy ---
-        rsi_is_oversold = indicators['rsi'] < self.settings['rsi_oversold']
-        rsi_is_overbought = indicators['rsi'] > self.settings['rsi_overbought']
-        candle_is_green = indicators['candle_color'] == 'green'
-        candle_is_red = indicators['candle_color'] == 'red'
-
-        logger.debug(
-            f"[{symbol}@{timeframe}] RSI Conditions: "
-            f"Oversold={rsi_is_oversold} (RSI {indicators['rsi']:.2f} < {self.settings['rsi_oversold']}), "
-            f"Overbought={rsi_is_overbought} (RSI {indicators['rsi']:.2f} > {self.settings['rsi_overbought']}), "
-            f"GreenCandle={candle_is_green}, RedCandle={candle_is_red}"
-        )
-
-        if rsi_is_oversold and candle_is_green:
-            signal['action'] = 'LONG'
-            signal['strength'] += 30
-            signal['reasons'].append(f"RSI oversold ({indicators['rsi']:.2f}) & green candle")
-            logger.debug(f"[{symbol}@{timeframe}] Condition: RSI LONG. Action: {signal['action']}, Strength: {signal['strength']}")
-        elif rsi_is_overbought and candle_is_red:
-            signal['action'] = 'SHORT'
-            signal['strength'] += 30
-            signal['reasons'].append(f"RSI overbought ({indicators['rsi']:.2f}) & red candle")
-            logger.debug(f"[{symbol}@{timeframe}] Condition: RSI SHORT. Action: {signal['action']}, Strength: {signal['strength']}")
-
-        # --- EMA Strategy ---
-        # Ensure EMAs are not NaN before comparison
-        ema_s_valid = not pd.isna(indicators['ema_short'])
-        ema_l_valid = not pd.isna(indicators['ema_long'])
-
-        ema_is_bullish = False
-        ema_is_bearish = False
-
-        if ema_s_valid and ema_l_valid:
-            ema_is_bullish = indicators['close'] > indicators['ema_short'] and indicators['ema_short'] > indicators['ema_long']
-            ema_is_bearish = indicators['close'] < indicators['ema_short'] and indicators['ema_short'] < indicators['ema_long']
-        
-        logger.debug(
-            f"[{symbol}@{timeframe}] EMA Conditions: ValidS={ema_s_valid}, ValidL={ema_l_valid}, "
-            f"Bullish={ema_is_bullish}, Bearish={ema_is_bearish}"
-        )
-
-        if ema_is_bullish:
-            if signal['action'] == 'LONG':  # Confirming
-                signal['strength'] += 20
-                signal['reasons'].append("EMA bullish confirmation")
-            elif signal['action'] == 'WAIT':  # Primary
-                signal['action'] = 'LONG'
-                signal['strength'] += 20  # Base strength for EMA signal
-                signal['reasons'].append("EMA bullish crossover")
-            logger.debug(f"[{symbol}@{timeframe}] Condition: EMA Bullish. Action: {signal['action']}, Strength: {signal['strength']}")
-        elif ema_is_bearish:
-            if signal['action'] == 'SHORT':  # Confirming
-                signal['strength'] += 20
-                signal['reasons'].append("EMA bearish confirmation")
-            elif signal['action'] == 'WAIT':  # Primary
-                signal['action'] = 'SHORT'
-                signal['strength'] += 20
-                signal['reasons'].append("EMA bearish crossover")
-            logger.debug(f"[{symbol}@{timeframe}] Condition: EMA Bearish. Action: {signal['action']}, Strength: {signal['strength']}")
-
-        # --- Bollinger Bands Strategy ---
-        bb_u_valid = not pd.isna(indicators['bb_upper'])
-        bb_l_valid = not pd.isna(indicators['bb_lower'])
-
-        price_above_bb_upper = False
-        price_below_bb_lower = False
-
-        if bb_u_valid:
-            price_above_bb_upper = indicators['close'] > indicators['bb_upper']
-        if bb_l_valid:
-            price_below_bb_lower = indicators['close'] < indicators['bb_lower']
-
-        logger.debug(
-            f"[{symbol}@{timeframe}] BB Conditions: ValidU={bb_u_valid}, ValidL={bb_l_valid}, "
-            f"AboveUpper={price_above_bb_upper}, BelowLower={price_below_bb_lower}"
-        )
-
-        if price_above_bb_upper: # Potential SHORT reversal
-            if signal['action'] == 'SHORT': # Confirming
-                signal['strength'] += 20
-                signal['reasons'].append("BB price above upper (confirms SHORT)")
-            elif signal['action'] == 'WAIT': # Primary
-                signal['action'] = 'SHORT'
-                signal['strength'] += 15
-                signal['reasons'].append("BB price above upper (potential SHORT reversal)")
-            logger.debug(f"[{symbol}@{timeframe}] Condition: BB Above Upper. Action: {signal['action']}, Strength: {signal['strength']}")
-        elif price_below_bb_lower: # Potential LONG reversal
-            if signal['action'] == 'LONG': # Confirming
-                signal['strength'] += 20
-                signal['reasons'].append("BB price below lower (confirms LONG)")
-            elif signal['action'] == 'WAIT': # Primary
-                signal['action'] = 'LONG'
-                signal['strength'] += 15
-                signal['reasons'].append("BB price below lower (potential LONG reversal)")
-            logger.debug(f"[{symbol}@{timeframe}] Condition: BB Below Lower. Action: {signal['action']}, Strength: {signal['strength']}")
-
-        # --- Final Strength Check & Decision ---
-        signal_threshold = self.settings.get('signal_strength_threshold', 30) # Ambil dari settings jika ada, default 30
-        logger.debug(f"[{symbol}@{timeframe}] Pre-threshold Check: Action={signal['action']}, Strength={signal['strength']}, Threshold={signal_threshold}")
-
-        if signal['action'] != 'WAIT' and signal['strength'] < signal_threshold:
-            logger.info(
-                f"[{symbol}@{timeframe}] Strength {signal['strength']} < {signal_threshold}. "
-                f"Reverting Action '{signal['action']}' to 'WAIT'."
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"[{symbol}@{timeframe}] Indicators Check: "
+                f"Close={indicators['close']:.4f}, RSI={indicators['rsi']:.2f}, "
+                f"EMA_S={indicators['ema_short']:.4f}, EMA_L={indicators['ema_long']:.4f}, "
+                f"BB_U={indicators['bb_upper']:.4f}, BB_L={indicators['bb_lower']:.4f}, "
+                f"Candle='{indicators['candle_color']}', ReasonMask={reasons:#06x}"
             )
-            signal['action'] = 'WAIT'
-            signal['reasons'] = [f"Final strength {signal['strength']}/{signal_threshold} insufficient"] # Overwrite reasons
-            signal['strength'] = 0 # Reset strength jika di-revert
-        elif signal['action'] == 'WAIT' and not signal['reasons']: # Jika tetap WAIT dan tidak ada alasan spesifik
-             signal['reasons'].append(f"No strong signal found (strength {signal['strength']}/{signal_threshold})")
 
+        if reasons & SIGNAL_REASON_INSUFFICIENT:
+            logger.info(f"[{symbol}@{timeframe}] Strength {raw_strength} < {threshold}. Reverting Action to 'WAIT'.")
 
         if signal['action'] != 'WAIT':
             logger.warning(
                 f"[{symbol}@{timeframe}] <<< TRADE SIGNAL >>> "
-                f"Action: {signal['action']}, Strength: {signal['strength']}/{signal_threshold}, "
+                f"Action: {signal['action']}, Strength: {signal['strength']}/{threshold}, "
                 f"Price: {signal['price']:.4f}, Reasons: {'; '.join(signal['reasons'])}"
             )
         else:
             logger.info(
                 f"[{symbol}@{timeframe}] Final Decision: "
-                f"Action: {signal['action']}, Strength: {signal['strength']}/{signal_threshold}, "
+                f"Action: {signal['action']}, Strength: {signal['strength']}/{threshold}, "
                 f"Price: {signal['price']:.4f}, Reasons: {'; '.join(signal['reasons'])}"
             )
             
         return signal
+
+class Backtester:
+    """
+    Replays the live signal rules over stored candle history and simulates the
+    create_trade TP/SL exits bar by bar.
+
+    Indicators are computed for every candle with calculate_indicator_series (the
+    live window length, sliding) and scored with score_signals, so each candle's
+    signal is what get_signal returns once that candle has closed.
+    Entries fill at the signal candle's close; a position exits on the first later
+    candle whose high/low reaches the TP or SL price (SL first when one candle hits
+    both, at the open when it gaps through the level). One position per symbol,
+    and max_daily_trades and the daily profit target / loss limit apply as in the
+    signal check loop.
+    """
+
+    def __init__(self, technical_analysis, config, mode=None, starting_balance=1000.0, fee_pct=0.05, overrides=None):
+        self.technical_analysis = technical_analysis
+        self.config = config
+        self.mode = mode or config.get("trading_mode", "standard")
+        mode_settings = dict(TRADING_MODES[self.mode], **(overrides or {})) # overrides: TRADING_MODES keys
+        self.take_profit = mode_settings["take_profit"]
+        self.stop_loss = mode_settings["stop_loss"]
+        self.leverage = mode_settings["leverage"]
+        self.position_size_percentage = mode_settings["position_size_percent"]
+        self.max_daily_trades = mode_settings["max_daily_trades"]
+        self.starting_balance = starting_balance
+        self.fee_pct = fee_pct # Charged on entry and exit notional, per side
+
+    def compute_signals(self, data):
+        """Action code (SIGNAL_ACTIONS index) for every candle of an (N, 6) history array"""
+        values = self.technical_analysis.calculate_indicator_series(data[:, 4], data[:, 1])
+        return self.technical_analysis.score_signals(values)['action']
+
+    def _find_exit(self, data, entry_index, is_long, take_profit_price, stop_loss_price):
+        """Returns (exit index, exit price, exit reason) for a position opened at the close of entry_index"""
+        opens, highs, lows = data[:, 1], data[:, 2], data[:, 3]
+        start, step = entry_index + 1, 256
+        while start < len(data):
+            end = min(start + step, len(data))
+            if is_long:
+                hit_tp, hit_sl = highs[start:end] >= take_profit_price, lows[start:end] <= stop_loss_price
+            else:
+                hit_tp, hit_sl = lows[start:end] <= take_profit_price, highs[start:end] >= stop_loss_price
+            hit = hit_tp | hit_sl
+            if hit.any():
+                offset = int(np.argmax(hit))
+                index = start + offset
+                bar_open = opens[index]
+                if hit_sl[offset]:
+                    gapped = bar_open <= stop_loss_price if is_long else bar_open >= stop_loss_price
+                    return index, (bar_open if gapped else stop_loss_price), "stop_loss"
+                gapped = bar_open >= take_profit_price if is_long else bar_open <= take_profit_price
+                return index, (bar_open if gapped else take_profit_price), "take_profit"
+            start, step = end, step * 2
+        return len(data) - 1, data[-1, 4], "end_of_data"
+
+    def run(self, data_by_symbol, timeframe, actions_by_symbol=None):
+        """
+        Args:
+            data_by_symbol (dict): symbol -> (N, 6) [open_time, open, high, low, close, volume] array.
+            timeframe (str): Candle timeframe of the data.
+            actions_by_symbol (dict, optional): Precomputed compute_signals output per symbol.
+
+        Returns:
+            dict: 'trades' (list of trade dicts like create_trade/complete_trade build) and 'stats'.
+        """
+        timeframe_ms = timeframe_to_ms(timeframe)
+        symbols = [symbol for symbol, data in data_by_symbol.items() if data is not None and len(data)]
+        datasets = [np.asarray(data_by_symbol[symbol]) for symbol in symbols]
+
+        # Every non-WAIT candle is a potential entry, processed in time order across symbols
+        event_times, event_symbols, event_indices, event_actions = [], [], [], []
+        for symbol_index, data in enumerate(datasets):
+            if actions_by_symbol is not None:
+                actions = actions_by_symbol[symbols[symbol_index]]
+            else:
+                actions = self.compute_signals(data)
+            indices = np.flatnonzero(actions != SIGNAL_WAIT)
+            event_times.append(data[indices, 0].astype(np.int64) + timeframe_ms)
+            event_symbols.append(np.full(len(indices), symbol_index))
+            event_indices.append(indices)
+            event_actions.append(actions[indices])
+        if not symbols:
+            return {'trades': [], 'stats': self._compute_stats([], [self.starting_balance], 0)}
+        event_times = np.concatenate(event_times)
+        order = np.lexsort((np.concatenate(event_symbols), event_times))
+        event_symbols = np.concatenate(event_symbols)[order]
+        event_indices = np.concatenate(event_indices)[order]
+        event_actions = np.concatenate(event_actions)[order]
+        event_times = event_times[order]
+
+        equity = self.starting_balance
+        margin_in_use = 0.0
+        equity_curve = [equity]
+        open_positions = [] # Heap of (exit time, sequence, trade)
+        busy_until = [-1] * len(symbols) # Last candle index of the open/last position per symbol
+        trades_per_day, day_start_equity = {}, {}
+        trades = []
+
+        def settle(until_ms):
+            nonlocal equity, margin_in_use
+            while open_positions and open_positions[0][0] <= until_ms:
+                _, _, trade = heapq.heappop(open_positions)
+                equity += trade['profit_usdt']
+                margin_in_use -= trade['margin']
+                equity_curve.append(equity)
+
+        for event_time, symbol_index, index, action in zip(event_times, event_symbols, event_indices, event_actions):
+            event_time = int(event_time)
+            settle(event_time)
+            if index <= busy_until[symbol_index]:
+                continue # Active trade for this symbol
+
+            day = event_time // 86_400_000
+            day_start_equity.setdefault(day, equity)
+            if trades_per_day.get(day, 0) >= self.max_daily_trades:
+                continue
+            day_change_pct = (equity - day_start_equity[day]) / day_start_equity[day] * 100
+            if day_change_pct >= self.config["daily_profit_target"] or day_change_pct <= -self.config["daily_loss_limit"]:
+                continue
+
+            data = datasets[symbol_index]
+            price = float(data[index, 4])
+            if self.config.get("use_percentage", True):
+                margin = (equity - margin_in_use) * self.position_size_percentage / 100
+            else:
+                margin = self.config["position_size_usdt"]
+            if margin <= 0:
+                continue
+            quantity = margin * self.leverage / price
+
+            is_long = action == SIGNAL_LONG
+            if is_long:
+                take_profit_price = price * (1 + self.take_profit / 100)
+                stop_loss_price = price * (1 - self.stop_loss / 100)
+            else:
+                take_profit_price = price * (1 - self.take_profit / 100)
+                stop_loss_price = price * (1 + self.stop_loss / 100)
+            exit_index, exit_price, exit_reason = self._find_exit(data, index, is_long, take_profit_price, stop_loss_price)
+            exit_price = float(exit_price)
+
+            # Same P/L arithmetic as complete_trade, plus fees
+            if is_long:
+                profit_pct = (exit_price - price) / price * 100
+            else:
+                profit_pct = (price - exit_price) / price * 100
+            fees = (price + exit_price) * quantity * self.fee_pct / 100
+            trade = {
+                'symbol': symbols[symbol_index],
+                'action': SIGNAL_ACTIONS[action],
+                'entry_price': price,
+                'exit_price': exit_price,
+                'quantity': quantity,
+                'take_profit': take_profit_price,
+                'stop_loss': stop_loss_price,
+                'leverage': self.leverage,
+                'entry_time': event_time,
+                'exit_time': int(data[exit_index, 0]) + timeframe_ms,
+                'profit_pct': profit_pct,
+                'leveraged_profit_pct': profit_pct * self.leverage,
+                'profit_usdt': price * quantity * profit_pct / 100 - fees,
+                'fees_usdt': fees,
+                'margin': margin,
+                'exit_reason': exit_reason,
+            }
+            trades.append(trade)
+            trades_per_day[day] = trades_per_day.get(day, 0) + 1
+            busy_until[symbol_index] = exit_index
+            margin_in_use += margin
+            heapq.heappush(open_positions, (trade['exit_time'], len(trades), trade))
+
+        settle(float('inf'))
+        span_ms = max(int(d[-1, 0]) for d in datasets) + timeframe_ms - min(int(d[0, 0]) for d in datasets)
+        return {'trades': trades, 'stats': self._compute_stats(trades, equity_curve, span_ms)}
+
+    def _compute_stats(self, trades, equity_curve, span_ms):
+        equity = np.asarray(equity_curve, dtype=np.float64)
+        peaks = np.maximum.accumulate(equity)
+        winning = sum(1 for t in trades if t['profit_pct'] > 0)
+
+        # Exposure: share of the tested period with at least one open position
+        exposed_ms, covered_until = 0, None
+        for start, end in sorted((t['entry_time'], t['exit_time']) for t in trades):
+            if covered_until is None or start > covered_until:
+                exposed_ms += end - start
+                covered_until = end
+            elif end > covered_until:
+                exposed_ms += end - covered_until
+                covered_until = end
+
+        final_balance = float(equity[-1])
+        return {
+            'mode': self.mode,
+            'total_trades': len(trades),
+            'winning_trades': winning,
+            'losing_trades': len(trades) - winning,
+            'win_rate': winning / len(trades) * 100 if trades else 0.0,
+            'total_profit_pct': sum(t['leveraged_profit_pct'] for t in trades),
+            'total_profit_usdt': final_balance - self.starting_balance,
+            'fees_usdt': sum(t['fees_usdt'] for t in trades),
+            'starting_balance': self.starting_balance,
+            'final_balance': final_balance,
+            'balance_change': (final_balance - self.starting_balance) / self.starting_balance * 100,
+            'max_drawdown_pct': float(((peaks - equity) / peaks).max() * 100) if len(equity) else 0.0,
+            'exposure_pct': exposed_ms / span_ms * 100 if span_ms > 0 else 0.0,
+        }
+
+    @staticmethod
+    def format_stats(stats):
+        """Text report in the layout of get_daily_stats_message"""
+        return (
+            f"📊 BACKTEST STATS - {stats['mode'].capitalize()} mode\n\n"
+            f"Total Trades: {stats['total_trades']}\n"
+            f"Winning Trades: {stats['winning_trades']}\n"
+            f"Losing Trades: {stats['losing_trades']}\n"
+            f"Win Rate: {stats['win_rate']:.1f}%\n\n"
+            f"Total Profit/Loss: {stats['total_profit_pct']:.2f}%\n"
+            f"Total Profit USDT: ${stats['total_profit_usdt']:.2f} (fees ${stats['fees_usdt']:.2f})\n\n"
+            f"Starting Balance: ${stats['starting_balance']:.2f}\n"
+            f"Final Balance: ${stats['final_balance']:.2f}\n"
+            f"Balance Change: {stats['balance_change']:.2f}%\n\n"
+            f"Max Drawdown: {stats['max_drawdown_pct']:.2f}%\n"
+            f"Exposure: {stats['exposure_pct']:.1f}% of the time"
+        )
+
+# Parameters the sweep command can vary. Indicator parameters change the indicator series,
+# scoring parameters only the signal rules applied to them, trade parameters only the simulation.
+SWEEP_INDICATOR_PARAMETERS = {'rsi_period': int, 'ema_short': int, 'ema_long': int, 'bb_period': int, 'bb_std': float}
+SWEEP_SCORING_PARAMETERS = {'rsi_oversold': float, 'rsi_overbought': float, 'signal_strength_threshold': int}
+SWEEP_TRADE_PARAMETERS = {'take_profit': float, 'stop_loss': float, 'leverage': int,
+                          'position_size_percent': float, 'max_daily_trades': int}
+SWEEP_RESULT_COLUMNS = ('total_trades', 'win_rate', 'total_profit_pct', 'total_profit_usdt', 'final_balance',
+                        'balance_change', 'max_drawdown_pct', 'exposure_pct')
+
+# Per sweep worker process: memory-mapped history and the indicator/signal caches
+SWEEP_WORKER_STATE = {}
+
+def sweep_worker_init(paths, timeframe, start_ms, end_ms):
+    """ProcessPoolExecutor initializer: map the .npy history files instead of receiving pickled arrays"""
+    data = {}
+    for symbol, path in paths.items():
+        history = np.load(path, mmap_mode='r')
+        first = np.searchsorted(history[:, 0], start_ms) if start_ms is not None else 0
+        last = np.searchsorted(history[:, 0], end_ms) if end_ms is not None else len(history)
+        data[symbol] = history[first:last]
+    SWEEP_WORKER_STATE.update(data=data, timeframe=timeframe, series_key=None, series=None, actions=OrderedDict())
+
+def run_sweep_task(task):
+    """Backtests a chunk of parameter combinations sharing the same indicator parameters"""
+    indicator_params, combos, mode, config, starting_balance, fee_pct = task
+    state = SWEEP_WORKER_STATE
+    series_key = tuple(sorted(indicator_params.items()))
+    results = []
+    for combo in combos:
+        scoring_params = {name: combo[name] for name in SWEEP_SCORING_PARAMETERS if name in combo}
+        technical_analysis = TechnicalAnalysis(None)
+        technical_analysis.settings = dict(INDICATOR_SETTINGS, **indicator_params, **scoring_params)
+
+        actions_key = (series_key, tuple(sorted(scoring_params.items())))
+        actions_by_symbol = state['actions'].get(actions_key)
+        if actions_by_symbol is None:
+            # Indicator series only depend on the indicator parameters: keep the last set around
+            if state['series_key'] != series_key:
+                state['series'] = {
+                    symbol: technical_analysis.calculate_indicator_series(data[:, 4], data[:, 1])
+                    for symbol, data in state['data'].items()
+                }
+                state['series_key'] = series_key
+            actions_by_symbol = {
+                symbol: technical_analysis.score_signals(series)['action'] for symbol, series in state['series'].items()
+            }
+            state['actions'][actions_key] = actions_by_symbol
+            if len(state['actions']) > 64:
+                state['actions'].popitem(last=False)
+
+        trade_params = {name: combo[name] for name in SWEEP_TRADE_PARAMETERS if name in combo}
+        backtester = Backtester(technical_analysis, config, mode=mode, starting_balance=starting_balance,
+                                fee_pct=fee_pct, overrides=trade_params)
+        stats = backtester.run(state['data'], state['timeframe'], actions_by_symbol=actions_by_symbol)['stats']
+        results.append((dict(indicator_params, **combo), stats))
+    return results
+
+def parse_sweep_grid(param_specs):
+    """Parses ['rsi_period=10,14,21', 'take_profit=0.5,1'] into {name: [values]}"""
+    known = {**SWEEP_INDICATOR_PARAMETERS, **SWEEP_SCORING_PARAMETERS, **SWEEP_TRADE_PARAMETERS}
+    grid = {}
+    for spec in param_specs:
+        name, _, values = spec.partition('=')
+        if name not in known or not values:
+            raise ValueError(f"Invalid sweep parameter '{spec}'. Use name=v1,v2,... with name in {', '.join(known)}")
+        grid[name] = [known[name](value) for value in values.split(',')]
+    return grid
+
+def run_parameter_sweep(paths, timeframe, grid, mode, config, random_samples=None, seed=None, workers=None,
+                        start_ms=None, end_ms=None, starting_balance=1000.0, fee_pct=0.05):
+    """
+    Backtests every combination of `grid` (or `random_samples` of them) on a process pool.
+    Workers memory-map the history files in `paths` ({symbol: .npy path}); combinations with the
+    same indicator parameters are sent together so each worker reuses its indicator series.
+    Returns [(params, stats)] ranked by profit, then by lower drawdown.
+    """
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    if random_samples and random_samples < len(combos):
+        combos = random.Random(seed).sample(combos, random_samples)
+
+    groups = {}
+    for combo in combos:
+        indicator_params = tuple((name, combo[name]) for name in names if name in SWEEP_INDICATOR_PARAMETERS)
+        groups.setdefault(indicator_params, []).append(
+            {name: value for name, value in combo.items() if name not in SWEEP_INDICATOR_PARAMETERS}
+        )
+
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, math.ceil(len(combos) / (workers * 4))) # Enough tasks to keep every worker busy
+    backtest_config = {key: config[key] for key in ('trading_mode', 'daily_profit_target', 'daily_loss_limit',
+                                                   'use_percentage', 'position_size_usdt')}
+    tasks = [
+        (dict(indicator_params), group[i:i + chunk_size], mode, backtest_config, starting_balance, fee_pct)
+        for indicator_params, group in groups.items()
+        for i in range(0, len(group), chunk_size)
+    ]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=sweep_worker_init,
+                             initargs=(paths, timeframe, start_ms, end_ms)) as executor:
+        for task_results in executor.map(run_sweep_task, tasks):
+            results.extend(task_results)
+    results.sort(key=lambda result: (result[1]['total_profit_usdt'], -result[1]['max_drawdown_pct']), reverse=True)
+    return results
+
+def write_sweep_results(results, path, param_names):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('rank',) + tuple(param_names) + SWEEP_RESULT_COLUMNS)
+        for rank, (params, stats) in enumerate(results, start=1):
+            writer.writerow(
+                [rank] + [params.get(name) for name in param_names] +
+                [round(stats[column], 4) if isinstance(stats[column], float) else stats[column] for column in SWEEP_RESULT_COLUMNS]
+            )
+
 class TradingBot:
     def __init__(self, config, telegram_bot=None):
         self.config = config
@@ -927,10 +4300,28 @@ class TradingBot:
         self.notification_queue = queue.Queue()
         self.notification_thread = None
         self.binance_api = BinanceFuturesAPI(config) if config["api_key"] and config["api_secret"] else None
+        # Non-blocking client for the Telegram handlers running on the asyncio event loop
+        self.async_binance_api = AsyncBinanceFuturesAPI(config) if self.binance_api else None
         self.technical_analysis = TechnicalAnalysis(self.binance_api) if self.binance_api else None
+        self.account_settings = AccountSettingsCache(self.binance_api) if self.binance_api else None
+        self.account_snapshots = AccountSnapshotProvider(
+            self.binance_api, self.async_binance_api, config.get("account_snapshot_ttl_seconds", 2.0)
+        ) if self.binance_api else None
         self.dynamic_pair_scanner_thread = None
+        self.position_monitor_thread = None
         self.currently_scanned_pairs = [] # Untuk menyimpan hasil scan terakhir (list of signal_data dicts)
+        self.scan_executor = None # Bounded worker pool used by the dynamic pair scanner
+        self.market_stream = None # MarketDataStream feeding the candle store, while trading is running
+        self.account_mirror = AccountStateMirror() # Balances/positions/open orders, current while the user stream is connected
+        self.user_stream = None # UserDataStream feeding account_mirror, while trading is running
+        self.trade_completion_lock = threading.Lock() # The user stream and the position monitor may both see a close
+        self.candle_close_events = queue.Queue() # (symbol, open_time) of closed candles reported by the market stream
+        self.last_evaluated_candle = {} # symbol -> open time of the last closed candle get_signal ran on
+        self.last_signal_evaluation = {} # symbol -> time.monotonic() of the last get_signal call
+        self.last_scan_stats = None # Duration and outcome counts of the last completed scan cycle
         self.active_trading_pairs_lock = threading.Lock() # Lock untuk akses aman ke self.config["trading_pairs"]
+        self.journal = None # TradeJournal opened by open_journal()
+        self.daily_stats_restored = False # Today's stats came from the journal; the next start keeps them
         
         # Initialize daily stats
         self.reset_daily_stats()
@@ -947,7 +4338,7 @@ class TradingBot:
         # Get current balance if available
         if self.binance_api and self.config["use_real_trading"]:
             try:
-                balance = self.binance_api.get_balance()
+                balance = self.get_balance()
                 if balance:
                     DAILY_STATS["starting_balance"] = balance['total']
                     DAILY_STATS["current_balance"] = balance['total']
@@ -958,6 +4349,102 @@ class TradingBot:
         else:
             DAILY_STATS["starting_balance"] = 0.0
             DAILY_STATS["current_balance"] = 0.0
+        self.save_daily_stats()
+
+    def save_daily_stats(self):
+        if self.journal:
+            self.journal.record_daily_stats(DAILY_STATS)
+
+    def open_journal(self):
+        """
+        Open the trade journal, restore the open trades and today's stats from it and
+        reconcile them with the exchange. From then on every trade and stats change is
+        journaled.
+        """
+        path = self.config.get("trade_journal_path")
+        if not path:
+            return None
+        try:
+            journal = TradeJournal(path, self.config.get("trade_journal_flush_interval", 0.5))
+            state = journal.load(TRADE_STORE.max_completed, datetime.now().strftime("%Y-%m-%d"))
+        except Exception as e:
+            logger.error(f"TradeJournal: could not open {path}, trades are kept in memory only: {e}")
+            return None
+
+        TRADE_STORE.restore(state['open_trades'], state['completed_trades'], state['completed_totals'])
+        if state['daily_stats']:
+            DAILY_STATS.update(state['daily_stats'])
+            self.daily_stats_restored = True
+        logger.info(
+            f"TradeJournal: restored {len(state['open_trades'])} open and {state['completed_totals']['count']} "
+            f"completed trades from {path} (today's stats {'restored' if state['daily_stats'] else 'not found'})"
+        )
+
+        self.journal = journal
+        TRADE_STORE.journal = journal
+        journal.start()
+        self.reconcile_with_exchange()
+        return journal
+
+    def reconcile_with_exchange(self):
+        """
+        Bring restored trades in line with the exchange: complete the ones whose position
+        closed while the bot was down and track positions that have no trade, so the bot
+        doesn't enter those symbols again.
+        """
+        if not (self.binance_api and self.account_snapshots):
+            return
+        # Trades closed while we were down (TP/SL fills are looked up like in the monitor)
+        closed = self.check_active_trades()
+        if not self.config["use_real_trading"]:
+            return
+
+        snapshot = self.account_snapshots.get(max_age=0)
+        if snapshot is None:
+            logger.warning("TradeJournal: account unavailable, exchange positions not reconciled.")
+            return
+        adopted = []
+        for position in snapshot.open_positions:
+            symbol = position['symbol']
+            amount = float(position['positionAmt'])
+            position_side = position.get('positionSide', 'BOTH')
+            if position_side == 'BOTH':
+                position_side = "LONG" if amount > 0 else "SHORT"
+            if TRADE_STORE.get_open_trades(symbol, position_side):
+                continue
+
+            action = "LONG" if position_side == "LONG" else "SHORT"
+            entry_price = float(position.get('entryPrice', 0))
+            take_profit_price, stop_loss_price = self.calculate_exit_prices(symbol, action, entry_price)
+            trade = TradeRecord(
+                id=TRADE_STORE.next_id(),
+                timestamp=time.time(),
+                symbol=symbol,
+                action=action,
+                position_side=position_side,
+                order_side="BUY" if action == "LONG" else "SELL",
+                entry_price=entry_price,
+                quantity=abs(amount),
+                take_profit=take_profit_price,
+                stop_loss=stop_loss_price,
+                leverage=int(position.get('leverage', self.config["leverage"])),
+                entry_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                completed=False,
+                mode="recovered",
+                entry_order_id=None,
+                tp_order_id=None,
+                sl_order_id=None,
+                real_trade=True
+            )
+            TRADE_STORE.add(trade)
+            adopted.append(trade)
+
+        logger.info(f"TradeJournal: reconciled with exchange, {closed} trades closed while offline, {len(adopted)} untracked positions adopted.")
+        if adopted:
+            self.send_notification(
+                "⚠️ Positions without a trade record were found and are now tracked (no TP/SL orders placed):\n"
+                + "\n".join(f"{t['symbol']} {t['action']} {t['quantity']} @ {t['entry_price']}" for t in adopted)
+            )
 
     def send_notification(self, message, keyboard=None):
         """Send notification to all admin chat IDs"""
@@ -1101,13 +4588,11 @@ class TradingBot:
             return []
 
         try:
-            all_tickers_data = self.binance_api.get_ticker_24hr() # Fetches all symbols
-            if not all_tickers_data:
+            tickers_map = self.binance_api.get_ticker_24hr_map() # Fetches all symbols (cached)
+            if not tickers_map:
                 logger.error("Failed to fetch 24h ticker data for liquidity check.")
                 return watchlist # Fallback to full watchlist if API fails
 
-            tickers_map = {item['symbol']: item for item in all_tickers_data}
-
             for symbol in watchlist:
                 ticker_info = tickers_map.get(symbol)
                 if ticker_info:
@@ -1127,6 +4612,75 @@ class TradingBot:
             logger.error(f"DynamicScan: Error during liquidity check: {e}", exc_info=True)
             return watchlist # Fallback
 
+    def scan_symbols_for_signals(self, symbols):
+        """
+        Refreshes candles for many symbols in parallel on a bounded worker pool, then
+        computes indicators for all of them in one batch and evaluates get_signal.
+        A symbol whose refresh runs longer than scan_symbol_timeout_seconds is
+        abandoned so one slow response cannot stall the whole cycle.
+        Returns (signals, timed_out_symbols, failed_symbols).
+        """
+        if self.scan_executor is None:
+            self.scan_executor = ThreadPoolExecutor(
+                max_workers=self.config.get("scan_max_workers", 8),
+                thread_name_prefix="pair-scan"
+            )
+        symbol_timeout = self.config.get("scan_symbol_timeout_seconds", 15)
+
+        technical_analysis = self.technical_analysis
+        _, candles_needed = technical_analysis.get_indicator_window()
+
+        started_at = {}
+        def refresh(symbol):
+            started_at[symbol] = time.monotonic()
+            return technical_analysis.candle_store.refresh(symbol, technical_analysis.settings['candle_timeframe'], candles_needed)
+
+        pending = {self.scan_executor.submit(refresh, symbol): symbol for symbol in symbols}
+        ready, signals, timed_out, failed = [], [], [], []
+
+        while pending:
+            if not self.running:
+                for future in pending:
+                    future.cancel()
+                break
+
+            done, _ = futures_wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                symbol = pending.pop(future)
+                try:
+                    refreshed = future.result()
+                except Exception as e:
+                    logger.error(f"DynamicScan: Error refreshing candles for {symbol}: {e}", exc_info=True)
+                    failed.append(symbol)
+                    continue
+                if refreshed:
+                    ready.append(symbol)
+                else:
+                    failed.append(symbol)
+
+            # Per-symbol timeout, measured from when a worker actually picked the symbol up
+            now = time.monotonic()
+            for future, symbol in list(pending.items()):
+                symbol_started = started_at.get(symbol)
+                if symbol_started is not None and now - symbol_started > symbol_timeout:
+                    logger.warning(f"DynamicScan: {symbol} timed out after {symbol_timeout}s, skipping it this cycle.")
+                    future.cancel()
+                    del pending[future]
+                    timed_out.append(symbol)
+
+        if not self.running:
+            return signals, timed_out, failed
+
+        indicators_by_symbol = technical_analysis.calculate_indicators_for_symbols(ready)
+        signals_by_symbol = technical_analysis.get_signals(indicators_by_symbol) if indicators_by_symbol else {}
+        for symbol in ready:
+            if symbol in signals_by_symbol:
+                signals.append(signals_by_symbol[symbol])
+            else:
+                failed.append(symbol)
+
+        return signals, timed_out, failed
+
     def dynamic_pair_scan_loop(self):
         """
         Periodically scans watchlist pairs for trading signals and updates 
@@ -1152,26 +4706,39 @@ class TradingBot:
                     time.sleep(self.config.get("dynamic_scan_interval_seconds", 300))
                     continue
 
+                cycle_start = time.monotonic()
+                # Menggunakan timeframe default dari settings indikator.
+                # Workers share BINANCE_RATE_LIMITER, so fan-out never exceeds the weight budget.
+                scanned_signals, timed_out_symbols, failed_symbols = self.scan_symbols_for_signals(potential_pairs)
+                if not self.running:  # Check if bot stopped during scan
+                    logger.info("DynamicScan: Bot stopping, aborting current scan.")
+                    return # Exit loop
+
                 candidate_signals = []
-                for symbol_to_scan in potential_pairs:
-                    if not self.running:  # Check if bot stopped during scan
-                        logger.info("DynamicScan: Bot stopping, aborting current scan.")
-                        return # Exit loop
-                    
-                    logger.debug(f"DynamicScan: Evaluating signal for candidate: {symbol_to_scan}")
-                    # Menggunakan timeframe default dari settings indikator
-                    signal_data = self.technical_analysis.get_signal(symbol_to_scan) 
-                    
-                    if signal_data and signal_data['action'] != 'WAIT' and \
+                for signal_data in scanned_signals:
+                    if signal_data['action'] != 'WAIT' and \
                        signal_data['strength'] >= self.config.get("signal_strength_threshold", 30):
                         candidate_signals.append(signal_data)
                         logger.info(
-                            f"DynamicScan: Strong signal for {symbol_to_scan} - "
+                            f"DynamicScan: Strong signal for {signal_data['symbol']} - "
                             f"Action: {signal_data['action']}, Strength: {signal_data['strength']}"
                         )
-                    # Jeda kecil antar API call untuk klines, terutama jika banyak pair
-                    time.sleep(self.config.get("api_call_delay_seconds", 0.5)) 
 
+                cycle_duration = time.monotonic() - cycle_start
+                self.last_scan_stats = {
+                    'finished_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'duration_seconds': cycle_duration,
+                    'symbols_scanned': len(potential_pairs),
+                    'timed_out': timed_out_symbols,
+                    'failed': failed_symbols,
+                    'candidates': len(candidate_signals)
+                }
+                cache_stats = self.technical_analysis.indicator_cache.get_stats()
+                logger.info(
+                    f"DynamicScan: Evaluated {len(potential_pairs)} pairs in {cycle_duration:.2f}s "
+                    f"({len(timed_out_symbols)} timed out, {len(failed_symbols)} failed). "
+                    f"Indicator cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses."
+                )
 
                 candidate_signals.sort(key=lambda x: x['strength'], reverse=True)
                 self.currently_scanned_pairs = candidate_signals # Store for potential display/debug
@@ -1201,6 +4768,7 @@ class TradingBot:
                         logger.info(f"DynamicScan: No change to active trading pairs: {self.config['trading_pairs']}")
                 
                 scan_successful = True # Scan cycle completed successfully
+                logger.debug(f"DynamicScan: Rate limit headroom after cycle: {BINANCE_RATE_LIMITER.get_headroom()}")
 
             except Exception as e:
                 logger.error(f"DynamicScan: Error in dynamic_pair_scan_loop: {e}", exc_info=True)
@@ -1224,6 +4792,151 @@ class TradingBot:
         
 # Di dalam class TradingBot:
 
+    def warm_candle_store(self):
+        """Preload candles downloaded with the `download` command so the first signal checks need no full reload"""
+        if not self.config.get("warm_candle_store_from_disk", True) or not self.technical_analysis:
+            return
+        data_dir = self.config.get("historical_data_dir")
+        if not data_dir or not os.path.isdir(data_dir):
+            return
+        try:
+            downloader = HistoricalKlinesDownloader(self.binance_api, data_dir)
+            symbols = set(self.config.get("trading_pairs", [])) | set(self.config.get("dynamic_watchlist_symbols", []))
+            warmed = downloader.warm_candle_store(
+                self.technical_analysis.candle_store, sorted(symbols),
+                self.technical_analysis.settings.get('candle_timeframe', '5m')
+            )
+            logger.info(f"Warmed candle store from {data_dir} for {len(warmed)} symbols.")
+        except Exception as e:
+            logger.error(f"Error warming candle store from disk: {e}", exc_info=True)
+
+    def get_stream_symbols(self):
+        """Symbols whose candles the market stream should keep current."""
+        with self.active_trading_pairs_lock:
+            return list(self.config.get("trading_pairs", []))
+
+    def start_market_stream(self):
+        """Start streaming klines for the active trading pairs into the candle store."""
+        if not self.config.get("use_market_stream", True) or not self.technical_analysis:
+            return
+        self.stop_market_stream()
+        url = self.config.get("market_stream_url") or (BINANCE_TEST_WS_URL if self.config.get("use_testnet") else BINANCE_WS_URL)
+        self.market_stream = MarketDataStream(
+            self.technical_analysis.candle_store,
+            self.technical_analysis.settings.get('candle_timeframe', '5m'),
+            self.get_stream_symbols,
+            url,
+            on_candle=self.on_stream_candle
+        )
+        self.market_stream.start()
+
+    def on_stream_candle(self, symbol, timeframe, open_time, is_closed):
+        """MarketDataStream callback; wakes the signal check loop when a candle closes."""
+        if is_closed:
+            self.candle_close_events.put((symbol, open_time))
+
+    def get_symbols_due_for_evaluation(self, timeout=1.0):
+        """
+        Block for up to `timeout` seconds and return (symbol, closed candle open time) for the
+        active pairs whose signal should be evaluated now.
+
+        A pair is due once per closed candle (reported by the market stream, or derived from the clock
+        when the stream is not connected) and when it has not been evaluated yet; both score the last
+        closed candle, like the backtester. When intra_candle_update_seconds has passed since its last
+        evaluation it is also due, with None to score the still-forming candle.
+        """
+        timeframe = self.technical_analysis.settings.get('candle_timeframe', '5m')
+        timeframe_ms = timeframe_to_ms(timeframe)
+        active_pairs = self.get_stream_symbols()
+        closed_candles = {}
+
+        stream = self.market_stream
+        streaming = stream is not None and stream.connected
+        if streaming:
+            events = []
+            try:
+                events.append(self.candle_close_events.get(timeout=timeout))
+                while True:
+                    events.append(self.candle_close_events.get_nowait())
+            except queue.Empty:
+                pass
+            for symbol, open_time in events:
+                closed_candles[symbol] = max(open_time, closed_candles.get(symbol, open_time))
+        now_ms = int(time.time() * 1000)
+        last_closed_open = (now_ms // timeframe_ms - 1) * timeframe_ms
+        if not streaming and now_ms - (last_closed_open + timeframe_ms) >= self.config.get("candle_close_grace_seconds", 2) * 1000:
+            for symbol in active_pairs:
+                closed_candles[symbol] = last_closed_open
+
+        intra_candle_interval = self.config.get("intra_candle_update_seconds", 0)
+        now = time.monotonic()
+        due = []
+        for symbol in active_pairs:
+            closed_open = closed_candles.get(symbol)
+            if closed_open is not None and closed_open > self.last_evaluated_candle.get(symbol, -1):
+                self.last_evaluated_candle[symbol] = closed_open
+                due.append((symbol, closed_open))
+            elif symbol not in self.last_signal_evaluation:
+                due.append((symbol, self.last_evaluated_candle.get(symbol, last_closed_open)))
+            elif intra_candle_interval > 0 and now - self.last_signal_evaluation[symbol] >= intra_candle_interval:
+                due.append((symbol, None))
+
+        if not due and not streaming:
+            time.sleep(timeout) # Clock mode: nothing blocked above, so don't spin
+        return due
+
+    def stop_market_stream(self):
+        if self.market_stream is not None:
+            self.market_stream.stop()
+            self.market_stream = None
+
+    def start_user_stream(self):
+        """Start mirroring the account from the user data stream."""
+        if not self.config.get("use_user_data_stream", True) or not self.binance_api:
+            return
+        self.stop_user_stream()
+        url = self.config.get("user_stream_url") or (BINANCE_TEST_WS_URL if self.config.get("use_testnet") else BINANCE_WS_URL)
+        self.user_stream = UserDataStream(
+            self.binance_api,
+            self.account_mirror,
+            url,
+            on_order_update=self.on_user_order_update,
+            on_leverage_update=self.account_settings.set_leverage,
+            keepalive_interval=self.config.get("listen_key_keepalive_seconds", 1800)
+        )
+        self.user_stream.start()
+
+    def stop_user_stream(self):
+        if self.user_stream is not None:
+            self.user_stream.stop()
+            self.user_stream = None
+        self.account_mirror.invalidate()
+
+    def get_balance(self):
+        """USDT balance from the account mirror, or from a shared account snapshot while the mirror isn't synced."""
+        balance = self.account_mirror.get_balance()
+        if balance is None and self.account_snapshots:
+            snapshot = self.account_snapshots.get()
+            balance = snapshot.balance if snapshot else None
+        return balance
+
+    def on_user_order_update(self, order):
+        """UserDataStream callback; completes the trade whose TP or SL order just filled."""
+        if order['status'] != 'FILLED':
+            return
+        trade = TRADE_STORE.find_open_by_order_id(order['orderId'])
+        if trade is None or trade.get('completed', False):
+            return
+        if order['orderId'] == trade.get('tp_order_id'):
+            exit_reason = "take_profit"
+        elif order['orderId'] == trade.get('sl_order_id'):
+            exit_reason = "stop_loss"
+        else:
+            return # The entry order
+        logger.info(f"UserStream: {trade['symbol']} {trade['action']} closed ({exit_reason}) at {order['avgPrice']}")
+        self.complete_trade(trade, float(order['avgPrice']), exit_reason,
+                            open_order_ids=self.account_mirror.get_open_order_ids())
+
     def start_trading(self):
         """Start the trading bot and its associated threads."""
         if self.running:
@@ -1236,25 +4949,38 @@ class TradingBot:
         # Terapkan pengaturan mode trading
         self.apply_trading_mode_settings()
 
+        # Leverage, margin type and position mode of every symbol in two requests,
+        # so trades only pay for a settings change when something actually differs
+        if self.account_settings:
+            self.account_settings.seed()
+
         # Atur mode hedge jika diaktifkan dan API tersedia
-        if self.config.get("hedge_mode", False) and self.binance_api:
+        if self.config.get("hedge_mode", False) and self.account_settings:
             try:
-                logger.info("Attempting to set position mode to Hedge Mode.")
-                result = self.binance_api.change_position_mode(True) # True untuk Hedge Mode
-                if result and isinstance(result, dict) and result.get('code') == 200:
-                    logger.info(f"Successfully set position mode to Hedge Mode. Response: {result.get('msg', 'OK')}")
-                elif result and isinstance(result, dict) and "already" in result.get('msg', '').lower():
-                     logger.info(f"Position mode already set as Hedge Mode or no change needed: {result.get('msg')}")
+                if self.account_settings.ensure_position_mode(True): # True untuk Hedge Mode
+                    logger.info("Position mode is Hedge Mode.")
                 else:
-                    logger.warning(f"Failed to confirm Hedge Mode setting or unexpected response: {result}")
+                    logger.warning("Failed to confirm Hedge Mode setting.")
             except Exception as e:
                 logger.error(f"Error setting hedge mode: {e}", exc_info=True)
 
+        # Keep candles of the active pairs current over WebSocket, before the first signal check
+        self.last_evaluated_candle.clear()
+        self.last_signal_evaluation.clear()
+        self.start_market_stream()
+        self.start_user_stream()
+
         # Mulai thread untuk memeriksa sinyal trading pada pair yang aktif
         self.signal_check_thread = threading.Thread(target=self.signal_check_loop)
         self.signal_check_thread.daemon = True # Agar thread berhenti saat program utama berhenti
         self.signal_check_thread.start()
         logger.info("Signal check thread started.")
+
+        # Complete trades whose TP/SL filled or whose position was closed
+        self.position_monitor_thread = threading.Thread(target=self.position_monitor_loop)
+        self.position_monitor_thread.daemon = True
+        self.position_monitor_thread.start()
+        logger.info("Position monitor thread started.")
         
         # Mulai thread pemindai pair dinamis jika fitur diaktifkan
         if self.config.get("dynamic_pair_selection", False):
@@ -1270,8 +4996,12 @@ class TradingBot:
         self.notification_thread.start()
         logger.info("Notification processor thread started.")
 
-        # Reset statistik harian saat memulai trading
-        self.reset_daily_stats()
+        # Reset statistik harian saat memulai trading, unless the first start after a
+        # restart picked up today's stats from the journal
+        if self.daily_stats_restored:
+            self.daily_stats_restored = False
+        else:
+            self.reset_daily_stats()
         
         # Kirim notifikasi bahwa bot telah dimulai
         # Gunakan HTML untuk format yang lebih baik
@@ -1319,6 +5049,13 @@ class TradingBot:
         else:
             logger.info("Dynamic Pair Scanner thread was not running or already joined.")
 
+        if self.scan_executor is not None:
+            self.scan_executor.shutdown(wait=False, cancel_futures=True)
+            self.scan_executor = None
+
+        self.stop_market_stream()
+        self.stop_user_stream()
+
         # 2. Hentikan thread Signal Check
         if self.signal_check_thread and self.signal_check_thread.is_alive():
             logger.info("Waiting for Signal Check thread to join...")
@@ -1334,6 +5071,12 @@ class TradingBot:
         else:
             logger.info("Signal Check thread was not running or already joined.")
 
+        if self.position_monitor_thread and self.position_monitor_thread.is_alive():
+            logger.info("Waiting for Position Monitor thread to join...")
+            self.position_monitor_thread.join(timeout=self.config.get("position_monitor_interval", 5) + 5.0)
+            if self.position_monitor_thread.is_alive():
+                logger.warning("Position Monitor thread did not join in time.")
+
         # 3. Kirim notifikasi "Bot Stopped" (jika memungkinkan)
         # Ini dikirim sebelum menghentikan notification_thread agar ada kesempatan diproses
         final_stop_message = "⏹️ <b>Trading Bot Stopped</b> ⏹️"
@@ -1375,90 +5118,14 @@ class TradingBot:
                 except queue.Empty:
                     break # Antrian sudah kosong
             logger.debug("Notification queue cleared.")
+
+        # Everything the stopped threads journaled is on disk before we report stopped
+        if self.journal:
+            self.journal.flush()
         
         logger.warning("Trading bot stop sequence complete. Bot is now stopped.")
         return True
         
-    def signal_check_loop(self):
-        logger.info("Signal check loop (for active trading pairs) initiated.")
-        
-        while self.running:
-            try:
-                if not self.check_daily_limits():
-                    logger.info("Daily limits reached. Stopping trading from signal_check_loop.")
-                    self.stop_trading() # stop_trading akan handle self.running = False
-                    break # Keluar dari loop ini
-                
-                if DAILY_STATS["total_trades"] >= self.config.get("max_daily_trades", 10):
-                    logger.info(
-                        f"Max daily trades ({DAILY_STATS['total_trades']}/{self.config.get('max_daily_trades',10)}) reached. "
-                        "Stopping trading."
-                    )
-                    # Notifikasi dan stop sudah dihandle di dalam check_daily_limits jika diimplementasikan di sana
-                    # atau tambahkan notifikasi di sini jika perlu
-                    self.stop_trading()
-                    break
-                
-                active_pairs_this_iteration = []
-                with self.active_trading_pairs_lock:
-                    # Buat salinan dari daftar pair yang aktif untuk diiterasi
-                    # Ini penting karena daftar bisa diubah oleh dynamic_pair_scan_loop
-                    active_pairs_this_iteration = list(self.config.get("trading_pairs", []))
-
-                if not active_pairs_this_iteration:
-                    if not self.config.get("dynamic_pair_selection", False):
-                        logger.debug("SignalCheck: No trading pairs configured and dynamic selection is OFF. Idling.")
-                    else:
-                        logger.debug("SignalCheck: No active trading pairs currently (waiting for dynamic scanner). Idling.")
-                    # Tetap tidur sesuai interval utama, jangan spin CPU
-                    time.sleep(self.config.get("signal_check_interval", 30))
-                    continue
-
-                logger.debug(f"SignalCheck: Checking signals for active pairs: {active_pairs_this_iteration}")
-                for symbol_to_trade in active_pairs_this_iteration:
-                    if not self.running: # Cek lagi jika bot dihentikan di tengah iterasi pair
-                        logger.info("SignalCheck: Bot stopping, aborting current pair checks.")
-                        break 
-
-                    # Cek apakah sudah ada trade aktif untuk simbol ini
-                    has_active_trade_for_symbol = any(
-                        t['symbol'] == symbol_to_trade and not t.get('completed', False) for t in ACTIVE_TRADES
-                    )
-                    if has_active_trade_for_symbol:
-                        logger.debug(f"SignalCheck: Skipping {symbol_to_trade}, active trade exists.")
-                        continue
-                        
-                    logger.debug(f"SignalCheck: Evaluating signal for active pair: {symbol_to_trade}")
-                    signal = self.technical_analysis.get_signal(symbol_to_trade) # Timeframe default
-                    
-                    if signal and signal['action'] != 'WAIT': # Tidak perlu cek strength lagi, get_signal sudah handle
-                        logger.info(f"SignalCheck: Processing signal for {symbol_to_trade}: {signal['action']}")
-                        self.process_signal(signal) # Ini yang akan membuka posisi
-                        # Mungkin tambahkan jeda kecil setelah berhasil memproses sinyal & membuka trade
-                        time.sleep(self.config.get("post_trade_delay_seconds", 2)) 
-                    # Jeda antar pemeriksaan simbol jika diperlukan untuk rate limit API
-                    # time.sleep(self.config.get("api_call_delay_seconds", 0.2))
-
-
-                if not self.running: break # Cek setelah loop pair
-
-                logger.debug(f"SignalCheck: Cycle complete. Sleeping for {self.config.get('signal_check_interval', 30)}s.")
-                # Tidur dengan cara yang bisa diinterupsi
-                interval = self.config.get("signal_check_interval", 30)
-                for _ in range(interval):
-                    if not self.running:
-                        break
-                    time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"SignalCheck: Error in signal_check_loop: {e}", exc_info=True)
-                # Tidur lebih lama jika ada error, tapi tetap bisa diinterupsi
-                for _ in range(30): # Misal 30 detik
-                    if not self.running: break
-                    time.sleep(1)
-                    
-        logger.info("Signal check loop has stopped.")
-        
     def apply_trading_mode_settings(self):
         """Apply settings from the selected trading mode"""
         mode = self.config["trading_mode"]
@@ -1506,7 +5173,8 @@ class TradingBot:
 
     def signal_check_loop(self):
         """Main loop to check for trading signals"""
-        logger.info("Starting signal check loop")
+        event_driven = self.config.get("signal_evaluation_mode", "candle_close") == "candle_close"
+        logger.info(f"Starting signal check loop ({'on candle close' if event_driven else 'polling'})")
         
         while self.running:
             try:
@@ -1527,14 +5195,26 @@ class TradingBot:
                     self.stop_trading()
                     break
                 
+                # Pairs to evaluate: those with a newly closed candle (scored on that candle),
+                # or all of them on their newest candle when polling
+                if event_driven:
+                    due = self.get_symbols_due_for_evaluation()
+                else:
+                    # Copy under the lock: the dynamic pair scanner replaces the list
+                    due = [(symbol, None) for symbol in self.get_stream_symbols()]
+
                 # Check for signals on each trading pair
-                for symbol in self.config["trading_pairs"]:
+                for symbol, closed_open_time in due:
+                    if not self.running:
+                        break
+                    self.last_signal_evaluation[symbol] = time.monotonic()
+
                     # Skip if we already have an active trade for this symbol
-                    if any(t['symbol'] == symbol and not t.get('completed', False) for t in ACTIVE_TRADES):
+                    if TRADE_STORE.has_open_trade(symbol):
                         continue
                         
                     # Get trading signal
-                    signal = self.technical_analysis.get_signal(symbol)
+                    signal = self.technical_analysis.get_signal(symbol, closed_open_time=closed_open_time)
                     if not signal or signal['action'] == 'WAIT':
                         continue
                         
@@ -1542,7 +5222,8 @@ class TradingBot:
                     self.process_signal(signal)
                     
                 # Sleep for the configured interval
-                time.sleep(self.config["signal_check_interval"])
+                if not event_driven:
+                    time.sleep(self.config["signal_check_interval"])
                 
             except Exception as e:
                 logger.error(f"Error in signal check loop: {e}")
@@ -1568,9 +5249,11 @@ class TradingBot:
             logger.error(f"Failed to calculate position size for {symbol}")
             return
             
-        # Set leverage for the symbol
-        if self.binance_api:
-            self.binance_api.change_leverage(symbol, self.config["leverage"])
+        # Set leverage (and margin type, if configured) for the symbol; no request when already set
+        if self.account_settings:
+            self.account_settings.ensure_leverage(symbol, self.config["leverage"])
+            if self.config.get("margin_type"):
+                self.account_settings.ensure_margin_type(symbol, self.config["margin_type"])
             
         # Create the trade
         trade = self.create_trade(symbol, action, position_side, order_side, price, position_size)
@@ -1589,7 +5272,7 @@ class TradingBot:
                 return self.config["position_size_usdt"] / price
                 
             # Get current balance
-            balance = self.binance_api.get_balance()
+            balance = self.get_balance()
             if not balance:
                 logger.error("Failed to get balance")
                 return None
@@ -1603,8 +5286,15 @@ class TradingBot:
             # Calculate quantity based on price and leverage
             quantity = (position_size_usdt * self.config["leverage"]) / price
             
-            # Round quantity according to symbol's precision
+            # Round quantity according to symbol's step size
             quantity = self.binance_api.round_quantity(symbol, quantity)
+
+            # Catch orders Binance would reject (minQty, minNotional) before sending them
+            quantizer = self.binance_api.get_quantizer(symbol)
+            problem = quantizer.check(price, quantity) if quantizer else None
+            if problem:
+                logger.warning(f"Position size for {symbol} not tradable: {problem}")
+                return None
             
             return quantity
             
@@ -1612,99 +5302,61 @@ class TradingBot:
             logger.error(f"Error calculating position size: {e}")
             return None
 
+    def calculate_exit_prices(self, symbol, action, price):
+        """Take profit and stop loss prices for an entry at `price`, rounded to the symbol's precision"""
+        take_profit_pct = self.config["take_profit"]
+        stop_loss_pct = self.config["stop_loss"]
+
+        if action == "LONG":
+            take_profit_price = price * (1 + take_profit_pct / 100)
+            stop_loss_price = price * (1 - stop_loss_pct / 100)
+        else:  # SHORT
+            take_profit_price = price * (1 - take_profit_pct / 100)
+            stop_loss_price = price * (1 + stop_loss_pct / 100)
+
+        return self.binance_api.round_price(symbol, take_profit_price), self.binance_api.round_price(symbol, stop_loss_price)
+
     def create_trade(self, symbol, action, position_side, order_side, price, quantity):
         """Create a new trade"""
         try:
             # Calculate take profit and stop loss prices
-            take_profit_pct = self.config["take_profit"]
-            stop_loss_pct = self.config["stop_loss"]
-            
-            if action == "LONG":
-                take_profit_price = price * (1 + take_profit_pct / 100)
-                stop_loss_price = price * (1 - stop_loss_pct / 100)
-            else:  # SHORT
-                take_profit_price = price * (1 - take_profit_pct / 100)
-                stop_loss_price = price * (1 + stop_loss_pct / 100)
-                
-            # Round prices according to symbol's precision
-            take_profit_price = self.binance_api.round_price(symbol, take_profit_price)
-            stop_loss_price = self.binance_api.round_price(symbol, stop_loss_price)
+            take_profit_price, stop_loss_price = self.calculate_exit_prices(symbol, action, price)
             
             # Create the trade object
-            trade = {
-                'id': int(time.time()),
-                'timestamp': time.time(),
-                'symbol': symbol,
-                'action': action,
-                'position_side': position_side,
-                'order_side': order_side,
-                'entry_price': price,
-                'quantity': quantity,
-                'take_profit': take_profit_price,
-                'stop_loss': stop_loss_price,
-                'leverage': self.config["leverage"],
-                'entry_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'completed': False,
-                'mode': self.config['trading_mode'],
-                'entry_order_id': None,
-                'tp_order_id': None,
-                'sl_order_id': None,
-                'real_trade': self.config['use_real_trading']
-            }
+            trade = TradeRecord(
+                id=TRADE_STORE.next_id(),
+                timestamp=time.time(),
+                symbol=symbol,
+                action=action,
+                position_side=position_side,
+                order_side=order_side,
+                entry_price=price,
+                quantity=quantity,
+                take_profit=take_profit_price,
+                stop_loss=stop_loss_price,
+                leverage=self.config["leverage"],
+                entry_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                completed=False,
+                mode=self.config['trading_mode'],
+                entry_order_id=None,
+                tp_order_id=None,
+                sl_order_id=None,
+                real_trade=self.config['use_real_trading']
+            )
             
             # If using real trading with Binance API, create the actual orders
             if self.binance_api and self.config["use_real_trading"]:
-                # Place entry order (MARKET)
-                entry_order = self.binance_api.create_order(
-                    symbol=symbol,
-                    side=order_side,
-                    order_type="MARKET",
-                    quantity=quantity,
-                    position_side=position_side
-                )
-                
-                if not entry_order:
-                    logger.error(f"Failed to create entry order for {symbol}")
+                placed = self.place_trade_orders(trade)
+                self.account_snapshots.invalidate()
+                if not placed:
                     return None
-                    
-                trade['entry_order_id'] = entry_order['orderId']
-                
-                # Wait a moment for the order to be executed
-                time.sleep(1)
-                
-                # Place take profit order
-                tp_order = self.binance_api.create_order(
-                    symbol=symbol,
-                    side="SELL" if order_side == "BUY" else "BUY",
-                    order_type="TAKE_PROFIT_MARKET",
-                    quantity=quantity,
-                    stop_price=take_profit_price,
-                    position_side=position_side,
-                    reduce_only=True
-                )
-                
-                if tp_order:
-                    trade['tp_order_id'] = tp_order['orderId']
-                
-                # Place stop loss order
-                sl_order = self.binance_api.create_order(
-                    symbol=symbol,
-                    side="SELL" if order_side == "BUY" else "BUY",
-                    order_type="STOP_MARKET",
-                    quantity=quantity,
-                    stop_price=stop_loss_price,
-                    position_side=position_side,
-                    reduce_only=True
-                )
-                
-                if sl_order:
-                    trade['sl_order_id'] = sl_order['orderId']
             
             # Add the trade to the active trades list
-            ACTIVE_TRADES.append(trade)
+            TRADE_STORE.add(trade)
             
             # Update daily stats
             DAILY_STATS["total_trades"] += 1
+            self.save_daily_stats()
             
             return trade
             
@@ -1712,6 +5364,115 @@ class TradingBot:
             logger.error(f"Error creating trade: {e}")
             return None
 
+    def confirm_entry_fill(self, symbol, order):
+        """
+        Return the final state of an entry order. MARKET orders sent with newOrderRespType=RESULT
+        normally come back FILLED already; otherwise poll the order with a short backoff, and cancel
+        what is left once entry_fill_timeout_seconds have passed.
+        """
+        deadline = time.monotonic() + self.config.get("entry_fill_timeout_seconds", 3)
+        delay = 0.05
+        while order.get('status') not in ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED'):
+            if time.monotonic() >= deadline:
+                logger.warning(f"OrderPipeline: {symbol} entry {order['orderId']} not filled in time ({order.get('status')}), cancelling the rest")
+                self.binance_api.cancel_order(symbol, order_id=order['orderId'])
+                return self.binance_api.get_order(symbol, order['orderId']) or order
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            order = self.binance_api.get_order(symbol, order['orderId']) or order
+        return order
+
+    def place_trade_orders(self, trade):
+        """
+        Open the position of a real trade and protect it.
+
+        The MARKET entry is confirmed from its RESULT response, TP/SL are re-based on the
+        actual fill price and quantity, and both are then placed in one batchOrders request.
+        A protective order the batch rejects is retried on its own; if the position still
+        isn't fully protected it is closed again. Latencies (ms) go to trade['order_latency_ms'].
+        Returns False if no position is left open.
+        """
+        api = self.binance_api
+        symbol = trade['symbol']
+        exit_side = "SELL" if trade['order_side'] == "BUY" else "BUY"
+        latency = trade['order_latency_ms'] = {}
+
+        started = time.monotonic()
+        entry_order = api.create_order(
+            symbol=symbol,
+            side=trade['order_side'],
+            order_type="MARKET",
+            quantity=trade['quantity'],
+            position_side=trade['position_side'],
+            new_order_resp_type="RESULT"
+        )
+        latency['entry'] = (time.monotonic() - started) * 1000
+        if not entry_order:
+            logger.error(f"Failed to create entry order for {symbol}")
+            return False
+        trade['entry_order_id'] = entry_order['orderId']
+
+        started = time.monotonic()
+        entry_order = self.confirm_entry_fill(symbol, entry_order)
+        latency['entry_fill'] = (time.monotonic() - started) * 1000
+        filled_quantity = float(entry_order.get('executedQty', 0))
+        if filled_quantity <= 0:
+            logger.error(f"OrderPipeline: {symbol} entry order {trade['entry_order_id']} did not fill ({entry_order.get('status')})")
+            return False
+
+        trade['entry_price'] = float(entry_order['avgPrice'])
+        trade['quantity'] = filled_quantity
+        trade['take_profit'], trade['stop_loss'] = self.calculate_exit_prices(symbol, trade['action'], trade['entry_price'])
+
+        # reduce_only only reaches Binance in one-way mode (positionSide BOTH), see _order_params
+        common = {'quantity': filled_quantity, 'position_side': trade['position_side'], 'reduce_only': True}
+        protective_orders = {
+            'tp_order_id': {'order_type': "TAKE_PROFIT_MARKET", 'stop_price': trade['take_profit']},
+            'sl_order_id': {'order_type': "STOP_MARKET", 'stop_price': trade['stop_loss']},
+        }
+
+        started = time.monotonic()
+        results = api.create_batch_orders([
+            api._order_params(symbol, exit_side, **order, **common) for order in protective_orders.values()
+        ]) or [None] * len(protective_orders)
+        latency['protective_batch'] = (time.monotonic() - started) * 1000
+
+        for (key, order), result in zip(protective_orders.items(), results):
+            if result and 'orderId' in result:
+                trade[key] = result['orderId']
+                continue
+            logger.warning(f"OrderPipeline: {symbol} {order['order_type']} rejected in batch ({result}), retrying alone")
+            started = time.monotonic()
+            retry = api.create_order(symbol=symbol, side=exit_side, **order, **common)
+            latency[f"{key[:2]}_retry"] = (time.monotonic() - started) * 1000
+            if retry:
+                trade[key] = retry['orderId']
+
+        logger.info(f"OrderPipeline: {symbol} {trade['action']} {filled_quantity} @ {trade['entry_price']} - " +
+                    ", ".join(f"{name} {ms:.0f}ms" for name, ms in latency.items()))
+
+        if trade['tp_order_id'] and trade['sl_order_id']:
+            return True
+
+        # Never leave a position without both exits: undo whatever was placed and flatten it
+        logger.error(f"OrderPipeline: {symbol} could not be protected, closing the position")
+        for key in protective_orders:
+            if trade[key]:
+                api.cancel_order(symbol, order_id=trade[key])
+                trade[key] = None
+        close_order = api.create_order(
+            symbol=symbol,
+            side=exit_side,
+            order_type="MARKET",
+            new_order_resp_type="RESULT",
+            **common
+        )
+        if close_order:
+            self.send_notification(f"⚠️ {symbol}: TP/SL orders were rejected, the new {trade['action']} position was closed again.")
+            return False
+        self.send_notification(f"🚨 {symbol}: TP/SL orders were rejected and the {trade['action']} position could NOT be closed. Please close it manually.")
+        return True # Keep tracking it, so the position monitor completes it once it is closed
+
     def send_trade_notification(self, trade, reasons):
         """Send notification about a new trade"""
         action_emoji = "🟢" if trade['action'] == "LONG" else "🔴"
@@ -1736,8 +5497,12 @@ class TradingBot:
         
         self.send_notification(message)
 
-    def complete_trade(self, trade, exit_price, exit_reason):
-        """Complete a trade with a result"""
+    def complete_trade(self, trade, exit_price, exit_reason, open_order_ids=None):
+        """Complete a trade with a result. open_order_ids, if known, limits which TP/SL orders get cancelled"""
+        with self.trade_completion_lock:
+            if trade.get('completed', False):
+                return False
+            trade['completed'] = True
         try:
             # Calculate profit/loss
             if trade['action'] == "LONG":
@@ -1751,16 +5516,25 @@ class TradingBot:
             # Calculate profit in USDT
             position_value = trade['entry_price'] * trade['quantity']
             profit_usdt = position_value * (profit_pct / 100)
+        except Exception as e:
+            logger.error(f"Error completing trade: {e}")
+            # Still open: let the position monitor try again
+            trade['completed'] = False
+            return False
             
-            # Update trade with completion details
-            trade['completed'] = True
-            trade['exit_price'] = exit_price
-            trade['exit_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            trade['profit_pct'] = profit_pct
-            trade['leveraged_profit_pct'] = leveraged_profit_pct
-            trade['profit_usdt'] = profit_usdt
-            trade['exit_reason'] = exit_reason
-            
+        # Update trade with completion details
+        trade['exit_price'] = exit_price
+        trade['exit_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        trade['profit_pct'] = profit_pct
+        trade['leveraged_profit_pct'] = leveraged_profit_pct
+        trade['profit_usdt'] = profit_usdt
+        trade['exit_reason'] = exit_reason
+
+        # Move the trade from active to completed before anything that can fail (order
+        # cancels, notifications), so a failure there can't leave its symbol blocked
+        TRADE_STORE.complete(trade)
+
+        try:
             # Update daily stats
             DAILY_STATS["total_profit_pct"] += leveraged_profit_pct
             DAILY_STATS["total_profit_usdt"] += profit_usdt
@@ -1777,14 +5551,14 @@ class TradingBot:
             # Calculate ROI
             if DAILY_STATS["starting_balance"] > 0:
                 DAILY_STATS["roi"] = (DAILY_STATS["current_balance"] - DAILY_STATS["starting_balance"]) / DAILY_STATS["starting_balance"] * 100
+            self.save_daily_stats()
             
             # If this was a real trade, cancel any remaining orders
             if trade['real_trade'] and self.binance_api:
-                if trade.get('tp_order_id'):
-                    self.binance_api.cancel_order(trade['symbol'], order_id=trade['tp_order_id'])
-                    
-                if trade.get('sl_order_id'):
-                    self.binance_api.cancel_order(trade['symbol'], order_id=trade['sl_order_id'])
+                self.account_snapshots.invalidate()
+                for order_id in (trade.get('tp_order_id'), trade.get('sl_order_id')):
+                    if order_id and (open_order_ids is None or order_id in open_order_ids):
+                        self.binance_api.cancel_order(trade['symbol'], order_id=order_id)
             
             # Determine if win or loss
             is_win = profit_pct > 0
@@ -1822,16 +5596,94 @@ class TradingBot:
             
             self.send_notification(complete_message)
             
-            # Move the trade from active to completed
-            if trade in ACTIVE_TRADES:
-                ACTIVE_TRADES.remove(trade)
-                COMPLETED_TRADES.append(trade)
-                
-            return True
-            
         except Exception as e:
-            logger.error(f"Error completing trade: {e}")
-            return False
+            logger.error(f"Error finishing completed trade {trade['id']} ({trade['symbol']}): {e}")
+        return True
+
+    def _get_fill_price(self, symbol, order_id):
+        """Average fill price of an order, or None if it did not fill"""
+        order = self.binance_api.get_order(symbol, order_id)
+        if order and order.get('status') == 'FILLED' and float(order.get('avgPrice', 0)) > 0:
+            return float(order['avgPrice'])
+        return None
+
+    def check_active_trades(self):
+        """Complete every active trade whose TP/SL filled or whose position is gone.
+
+        One pass costs a fixed number of requests regardless of how many trades are open:
+        all prices, plus account positions and all open orders when real trades exist and
+        the account mirror isn't synced. Orders are only looked up one by one for trades
+        that turn out to be closed.
+        """
+        trades = [t for t in TRADE_STORE.get_open_trades() if not t.get('completed', False)]
+        if not trades or not self.binance_api:
+            return 0
+
+        prices = self.binance_api.get_all_ticker_prices()
+        if prices is None:
+            return 0
+
+        positions = self.account_mirror.get_position_amounts()
+        open_order_ids = self.account_mirror.get_open_order_ids()
+        if positions is None and any(t.get('real_trade') for t in trades):
+            snapshot = self.account_snapshots.get()
+            account_info = snapshot.account_info if snapshot else None
+            open_orders = self.binance_api.get_open_orders()
+            if account_info is None or open_orders is None:
+                logger.warning("PositionMonitor: Account or open orders unavailable, real trades not checked this cycle.")
+            else:
+                positions = {
+                    (p['symbol'], p.get('positionSide', 'BOTH')): abs(float(p['positionAmt']))
+                    for p in account_info.get('positions', [])
+                }
+                open_order_ids = {order['orderId'] for order in open_orders}
+
+        grace_seconds = self.config.get("position_monitor_grace_seconds", 10)
+        completed = 0
+        for trade in trades:
+            symbol = trade['symbol']
+            last_price = prices.get(symbol)
+
+            if not trade.get('real_trade'):
+                if last_price is None:
+                    continue
+                is_long = trade['action'] == "LONG"
+                if (last_price >= trade['take_profit']) if is_long else (last_price <= trade['take_profit']):
+                    completed += bool(self.complete_trade(trade, trade['take_profit'], "take_profit"))
+                elif (last_price <= trade['stop_loss']) if is_long else (last_price >= trade['stop_loss']):
+                    completed += bool(self.complete_trade(trade, trade['stop_loss'], "stop_loss"))
+                continue
+
+            if positions is None or time.time() - trade['timestamp'] < grace_seconds:
+                continue
+            position_amt = positions.get((symbol, trade['position_side']), positions.get((symbol, 'BOTH'), 0.0))
+            if position_amt > 0:
+                continue
+
+            # Position is flat: work out which side closed it
+            exit_price, exit_reason = None, "manual"
+            for key, reason in (('tp_order_id', "take_profit"), ('sl_order_id', "stop_loss")):
+                order_id = trade.get(key)
+                if order_id and order_id not in open_order_ids:
+                    exit_price = self._get_fill_price(symbol, order_id)
+                    if exit_price is not None:
+                        exit_reason = reason
+                        break
+            if exit_price is None:
+                exit_price = last_price if last_price is not None else trade['entry_price']
+
+            logger.info(f"PositionMonitor: {symbol} {trade['action']} closed ({exit_reason}) at {exit_price}")
+            completed += bool(self.complete_trade(trade, exit_price, exit_reason, open_order_ids=open_order_ids))
+        return completed
+
+    def position_monitor_loop(self):
+        logger.info("Position monitor loop initiated.")
+        while self.running:
+            try:
+                self.check_active_trades()
+            except Exception as e:
+                logger.error(f"Error in position monitor loop: {e}")
+            time.sleep(self.config.get("position_monitor_interval", 5))
 
     def get_daily_stats_message(self):
         """Get a formatted message with daily trading statistics"""
@@ -2048,26 +5900,13 @@ class TelegramBotHandler:
                  active_pairs = bot_config.get("trading_pairs", []) # Ambil dari bot_config
             active_dynamic_pairs_text = f"\n  Active Dynamic Pairs: {', '.join(active_pairs) if active_pairs else 'None selected yet'}"
             
-        active_trades = [t for t in ACTIVE_TRADES if not t.get('completed', False)]
-        completed_trades = COMPLETED_TRADES # Ini adalah variabel global, pastikan konsisten
-
-        total_profit_pct_leveraged = 0.0 # Ganti nama agar lebih jelas
-        win_count = 0
-        loss_count = 0
-        total_profit_usdt = 0.0
-
-        for trade in completed_trades:
-            # Gunakan profit USDT untuk menentukan win/loss agar lebih akurat
-            profit_this_trade_usdt = trade.get('profit_usdt', 0.0)
-            total_profit_usdt += profit_this_trade_usdt
-            
-            # Akumulasi leveraged profit percentage jika ada
-            total_profit_pct_leveraged += trade.get('leveraged_profit_pct', 0.0)
-
-            if profit_this_trade_usdt > 0: # Menang jika profit USDT > 0
-                win_count += 1
-            elif profit_this_trade_usdt < 0: # Kalah jika profit USDT < 0 (abaikan jika 0)
-                loss_count += 1
+        active_trade_count = TRADE_STORE.open_count()
+        # Running totals kept by the trade store (win/loss by profit USDT; 0 counts as neither)
+        completed_totals = TRADE_STORE.get_completed_totals()
+        total_profit_pct_leveraged = completed_totals['leveraged_profit_pct']
+        win_count = completed_totals['wins']
+        loss_count = completed_totals['losses']
+        total_profit_usdt = completed_totals['profit_usdt']
         
         # Hitung win rate berdasarkan trade yang menghasilkan profit atau loss
         actual_trades_for_win_rate = win_count + loss_count
@@ -2083,8 +5922,8 @@ class TelegramBotHandler:
             f"<b>Take Profit:</b> {bot_config.get('take_profit', 0.0)}%\n"
             f"<b>Stop Loss:</b> {bot_config.get('stop_loss', 0.0)}%\n\n"
             f"<b>Real Trading:</b> {real_trading_status}\n"
-            f"<b>Active Trades:</b> {len(active_trades)}\n"
-            f"<b>Completed Trades (Win/Loss/Total):</b> {win_count}/{loss_count}/{len(completed_trades)}\n"
+            f"<b>Active Trades:</b> {active_trade_count}\n"
+            f"<b>Completed Trades (Win/Loss/Total):</b> {win_count}/{loss_count}/{completed_totals['count']}\n"
             f"<b>Total P/L (Leveraged %):</b> {total_profit_pct_leveraged:.2f}%\n" # Total dari leveraged_profit_pct
             f"<b>Total P/L (USDT):</b> ${total_profit_usdt:.2f}\n"
             f"<b>Win Rate:</b> {win_rate:.1f}% ({win_count}/{actual_trades_for_win_rate})\n\n"
@@ -2155,16 +5994,30 @@ class TelegramBotHandler:
         else:
             # Tampilkan beberapa kandidat teratas saja agar pesan tidak terlalu panjang
             display_limit = 10 
+            tickers_map = {}
+            if self.trading_bot.binance_api:
+                # Normally served from the cache the scanner just filled
+                tickers_map = await asyncio.to_thread(self.trading_bot.binance_api.get_ticker_24hr_map) or {}
             for i, signal_data in enumerate(self.trading_bot.currently_scanned_pairs[:display_limit]):
+                ticker_info = tickers_map.get(signal_data['symbol'])
+                volume_text = f"${float(ticker_info.get('quoteVolume', 0)):,.0f}" if ticker_info else "N/A"
                 scanned_info += (
                     f"<b>{i+1}. {signal_data['symbol']}</b>:\n"
                     f"  Action: <i>{signal_data['action']}</i>, Strength: {signal_data['strength']}\n"
-                    f"  Price: ${signal_data['price']:.4f}\n"
+                    f"  Price: ${signal_data['price']:.4f}, 24h Volume: {volume_text}\n"
                     f"  Reasons: {'; '.join(signal_data.get('reasons', ['N/A']))}\n\n"
                 )
             if len(self.trading_bot.currently_scanned_pairs) > display_limit:
                 scanned_info += f"... and {len(self.trading_bot.currently_scanned_pairs) - display_limit} more candidates.\n"
         
+        scan_stats = self.trading_bot.last_scan_stats
+        if scan_stats:
+            scanned_info += (
+                f"\nLast scan: {scan_stats['finished_at']}, {scan_stats['symbols_scanned']} pairs in "
+                f"{scan_stats['duration_seconds']:.2f}s ({len(scan_stats['timed_out'])} timed out, "
+                f"{len(scan_stats['failed'])} failed)\n"
+            )
+
         scanned_info += f"\nCurrently active trading pairs: {', '.join(self.trading_bot.config.get('trading_pairs',[])) if self.trading_bot.config.get('trading_pairs',[]) else 'None'}"
             
         # Batasi panjang pesan
@@ -2329,14 +6182,12 @@ class TelegramBotHandler:
         if not await self.is_authorized(update):
             return
 
-        all_trades = ACTIVE_TRADES + COMPLETED_TRADES
+        recent_trades = TRADE_STORE.get_recent_trades(5)
 
-        if not all_trades:
+        if not recent_trades:
             await update.message.reply_text("No trades recorded yet")
             return
 
-        recent_trades = sorted(all_trades, key=lambda x: x['timestamp'], reverse=True)[:5]
-
         trades_text = "📊 RECENT TRADES\n\n"
         for trade in recent_trades:
             status = "Active" if not trade.get('completed', False) else "Completed"
@@ -2422,14 +6273,17 @@ class TelegramBotHandler:
         if not await self.is_authorized(update):
             return
 
-        if not self.trading_bot or not self.trading_bot.binance_api:
+        if not self.trading_bot or not self.trading_bot.async_binance_api:
             await update.message.reply_text("Trading bot or Binance API not initialized")
             return
 
         status_msg = await update.message.reply_text("🔄 Fetching account balance... Please wait.")
 
         try:
-            balance = self.trading_bot.binance_api.get_balance()
+            balance = self.trading_bot.account_mirror.get_balance()
+            if balance is None:
+                snapshot = await self.trading_bot.account_snapshots.get_async()
+                balance = snapshot.balance if snapshot else None
             if balance:
                 balance_text = (
                     f"💰 ACCOUNT BALANCE\n\n"
@@ -2456,7 +6310,7 @@ class TelegramBotHandler:
                  await update.effective_chat.send_text("Error: Could not process positions request.")
             return
 
-        if not self.trading_bot or not self.trading_bot.binance_api:
+        if not self.trading_bot or not self.trading_bot.async_binance_api:
             await initial_reply_source_message.reply_text("Trading bot or Binance API not initialized.")
             return
 
@@ -2466,7 +6320,10 @@ class TelegramBotHandler:
         )
 
         try:
-            positions = self.trading_bot.binance_api.get_open_positions()
+            positions = self.trading_bot.account_mirror.get_open_positions()
+            if positions is None:
+                snapshot = await self.trading_bot.account_snapshots.get_async()
+                positions = snapshot.open_positions if snapshot else []
             positions_text = "📈 <b>OPEN POSITIONS</b> 📈\n\n"
             found_positions = False
 
@@ -2547,7 +6404,7 @@ class TelegramBotHandler:
         status_msg = await update.message.reply_text(f"🔄 Calculating indicators for {symbol}... Please wait.")
 
         try:
-            indicators = self.trading_bot.technical_analysis.calculate_indicators(symbol)
+            indicators = await asyncio.to_thread(self.trading_bot.technical_analysis.calculate_indicators, symbol)
             if indicators:
                 indicators_text = (
                     f"📊 TECHNICAL INDICATORS - {symbol}\n\n"
@@ -2565,7 +6422,7 @@ class TelegramBotHandler:
                 )
                 
                 # Get signal
-                signal = self.trading_bot.technical_analysis.get_signal(symbol)
+                signal = self.trading_bot.technical_analysis.get_signal(symbol, indicators=indicators)
                 if signal:
                     indicators_text += f"\n\nSignal: {signal['action']}\n"
                     indicators_text += f"Strength: {signal['strength']}/100\n\n"
@@ -2638,19 +6495,21 @@ class TelegramBotHandler:
         if not await self.is_authorized(update):
             return
 
-        if not self.trading_bot or not self.trading_bot.binance_api:
+        if not self.trading_bot or not self.trading_bot.async_binance_api:
             await update.message.reply_text("Trading bot or Binance API not initialized")
             return
 
         status_msg = await update.message.reply_text("🔄 Closing all open positions... Please wait.")
 
         try:
-            positions = self.trading_bot.binance_api.get_open_positions()
+            async_api = self.trading_bot.async_binance_api
+            snapshot = await self.trading_bot.account_snapshots.get_async(max_age=0)
+            positions = snapshot.open_positions if snapshot else []
             if not positions:
                 await status_msg.edit_text("No open positions to close.")
                 return
 
-            closed_count = 0
+            close_requests = []
             for position in positions:
                 symbol = position['symbol']
                 amount = float(position['positionAmt'])
@@ -2663,17 +6522,18 @@ class TelegramBotHandler:
                 position_side = "LONG" if amount > 0 else "SHORT"
                 
                 # Create market order to close position
-                close_order = self.trading_bot.binance_api.create_order(
+                close_requests.append(async_api.create_order(
                     symbol=symbol,
                     side=order_side,
                     order_type="MARKET",
                     quantity=abs(amount),
                     position_side=position_side,
                     reduce_only=True
-                )
-                
-                if close_order:
-                    closed_count += 1
+                ))
+
+            # Send all close orders concurrently instead of one round-trip after another
+            close_orders = await asyncio.gather(*close_requests)
+            closed_count = sum(1 for close_order in close_orders if close_order)
             
             if closed_count > 0:
                 await status_msg.edit_text(f"✅ Successfully closed {closed_count} positions.")
@@ -2776,8 +6636,8 @@ class TelegramBotHandler:
             return
             
         # Verify the pair exists on Binance
-        if self.trading_bot.binance_api:
-            price = self.trading_bot.binance_api.get_ticker_price(symbol)
+        if self.trading_bot.async_binance_api:
+            price = await self.trading_bot.async_binance_api.get_ticker_price(symbol)
             if not price:
                 await update.message.reply_text(f"Could not find pair {symbol} on Binance. Please check the symbol.")
                 return
@@ -2884,12 +6744,13 @@ class TelegramBotHandler:
 
         status_msg = await update.message.reply_text("🔄 Testing Binance API connection before enabling real trading...")
 
-        if self.trading_bot.binance_api:
+        if self.trading_bot.async_binance_api:
             try:
-                account_info = self.trading_bot.binance_api.get_account_info()
-                if account_info:
+                snapshot = await self.trading_bot.account_snapshots.get_async(max_age=0)
+                if snapshot:
+                    account_info = snapshot.account_info
                     self.trading_bot.config["use_real_trading"] = True
-                    balance = self.trading_bot.binance_api.get_balance()
+                    balance = snapshot.balance
                     await status_msg.edit_text(
                         f"✅ Real trading has been ENABLED!\n\n"
                         f"Mode: {'Testnet' if self.trading_bot.config['use_testnet'] else 'Production'}\n"
@@ -2941,8 +6802,23 @@ class TelegramBotHandler:
         self.trading_bot.config["use_testnet"] = not self.trading_bot.config["use_testnet"]
 
         # Reinitialize the Binance API with the new setting
+        if self.trading_bot.binance_api:
+            self.trading_bot.binance_api.transport.close()
+        if self.trading_bot.async_binance_api:
+            await self.trading_bot.async_binance_api.aclose()
         self.trading_bot.binance_api = BinanceFuturesAPI(self.trading_bot.config)
+        self.trading_bot.async_binance_api = AsyncBinanceFuturesAPI(self.trading_bot.config)
         self.trading_bot.technical_analysis = TechnicalAnalysis(self.trading_bot.binance_api)
+        self.trading_bot.account_settings = AccountSettingsCache(self.trading_bot.binance_api)
+        self.trading_bot.account_snapshots = AccountSnapshotProvider(
+            self.trading_bot.binance_api, self.trading_bot.async_binance_api,
+            self.trading_bot.config.get("account_snapshot_ttl_seconds", 2.0)
+        )
+        if self.trading_bot.running:
+            await asyncio.to_thread(self.trading_bot.account_settings.seed)
+            # The stream feeds the old candle store and points at the old endpoint
+            await asyncio.to_thread(self.trading_bot.start_market_stream)
+            await asyncio.to_thread(self.trading_bot.start_user_stream)
 
         mode = "Testnet" if self.trading_bot.config["use_testnet"] else "Production"
         await update.message.reply_text(
@@ -2974,19 +6850,24 @@ class TelegramBotHandler:
         status_msg = await update.message.reply_text("🔄 Testing Binance API connection... Please wait.")
 
         # Test the API connection
-        if self.trading_bot.binance_api:
+        if self.trading_bot.async_binance_api:
             try:
-                account_info = self.trading_bot.binance_api.get_account_info()
-                if account_info:
-                    balance = self.trading_bot.binance_api.get_balance()
-                    positions = self.trading_bot.binance_api.get_open_positions()
+                snapshot = await self.trading_bot.account_snapshots.get_async(max_age=0)
+                if snapshot:
+                    account_info, balance, positions = snapshot.account_info, snapshot.balance, snapshot.open_positions
+                    http_stats = self.trading_bot.binance_api.transport.get_connection_stats()
+                    headroom = BINANCE_RATE_LIMITER.get_headroom()
                     
                     await status_msg.edit_text(
                         f"✅ API connection test successful!\n\n"
                         f"Mode: {'Testnet' if self.trading_bot.config['use_testnet'] else 'Production'}\n"
                         f"Account Status: {account_info.get('status', 'Unknown')}\n"
                         f"Balance: ${balance['total'] if balance else 'Unknown'} USDT\n"
-                        f"Open Positions: {len([p for p in positions if float(p['positionAmt']) != 0])}\n\n"
+                        f"Open Positions: {len([p for p in positions if float(p['positionAmt']) != 0])}\n"
+                        f"HTTP: {http_stats['requests']} requests over {http_stats['connections_opened']} connections "
+                        f"(reuse {http_stats['reuse_ratio'] * 100:.0f}%, avg {http_stats['avg_latency_ms']:.0f} ms)\n"
+                        f"Rate Limit Headroom: {headroom['weight_available']:.0f}/{headroom['weight_limit']} weight "
+                        f"(server used: {headroom['server_used_weight_1m'] if headroom['server_used_weight_1m'] is not None else 'N/A'})\n\n"
                         f"Your API is working correctly!"
                     )
                 else:
@@ -3098,7 +6979,187 @@ class TelegramBotHandler:
         """Run the bot"""
         self.application.run_polling()
 
+def parse_time_ms(value):
+    """Parse a date/time such as 2024-01-31 or 2024-01-31T12:00 (UTC) into epoch milliseconds"""
+    return int(pd.Timestamp(value, tz='UTC').timestamp() * 1000)
+
+def download_history_command(args):
+    """CLI: download candle history into CONFIG['historical_data_dir']"""
+    downloader = HistoricalKlinesDownloader(
+        BinanceFuturesAPI(CONFIG), args.data_dir or CONFIG["historical_data_dir"], max_workers=args.workers
+    )
+    end_ms = parse_time_ms(args.end) if args.end else None
+    results = downloader.download_many(args.symbols, args.timeframes, parse_time_ms(args.start), end_ms)
+    for (symbol, timeframe), added in sorted(results.items()):
+        status = f"+{added} candles" if added is not None else "FAILED"
+        coverage = downloader.get_coverage(symbol, timeframe)
+        if coverage:
+            status += f" (on disk: {pd.to_datetime(coverage[0], unit='ms')} .. {pd.to_datetime(coverage[1], unit='ms')})"
+        print(f"{symbol}@{timeframe}: {status}")
+
+def backtest_command(args):
+    """CLI: replay the signal rules over downloaded history"""
+    downloader = HistoricalKlinesDownloader(None, args.data_dir or CONFIG["historical_data_dir"])
+    start_ms = parse_time_ms(args.start) if args.start else None
+    end_ms = parse_time_ms(args.end) if args.end else None
+    data_by_symbol = {}
+    for symbol in args.symbols:
+        data = downloader.load(symbol, args.timeframe)
+        if data is None:
+            print(f"{symbol}@{args.timeframe}: no stored history, run the download command first")
+            continue
+        first = np.searchsorted(data[:, 0], start_ms) if start_ms is not None else 0
+        last = np.searchsorted(data[:, 0], end_ms) if end_ms is not None else len(data)
+        data_by_symbol[symbol] = data[first:last]
+
+    settings = dict(INDICATOR_SETTINGS, candle_timeframe=args.timeframe)
+    technical_analysis = TechnicalAnalysis(None)
+    technical_analysis.settings = settings
+    started = time.monotonic()
+    result = Backtester(technical_analysis, CONFIG, mode=args.mode, starting_balance=args.balance,
+                        fee_pct=args.fee_pct).run(data_by_symbol, args.timeframe)
+    print(Backtester.format_stats(result['stats']))
+    print(f"\n{sum(len(d) for d in data_by_symbol.values())} candles, {len(data_by_symbol)} symbols in {time.monotonic() - started:.2f}s")
+
+def sweep_command(args):
+    """CLI: parameter sweep over downloaded history"""
+    data_dir = args.data_dir or CONFIG["historical_data_dir"]
+    downloader = HistoricalKlinesDownloader(None, data_dir)
+    paths = {}
+    for symbol in args.symbols:
+        if os.path.exists(downloader.get_path(symbol, args.timeframe)):
+            paths[symbol] = downloader.get_path(symbol, args.timeframe)
+        else:
+            print(f"{symbol}@{args.timeframe}: no stored history, run the download command first")
+    grid = parse_sweep_grid(args.param)
+
+    started = time.monotonic()
+    results = run_parameter_sweep(
+        paths, args.timeframe, grid, args.mode, CONFIG, random_samples=args.random, seed=args.seed,
+        workers=args.workers, start_ms=parse_time_ms(args.start) if args.start else None,
+        end_ms=parse_time_ms(args.end) if args.end else None, starting_balance=args.balance, fee_pct=args.fee_pct
+    )
+    write_sweep_results(results, args.output, list(grid))
+    print(f"{len(results)} combinations in {time.monotonic() - started:.1f}s, ranked results written to {args.output}")
+    for rank, (params, stats) in enumerate(results[:10], start=1):
+        print(f"{rank:>2}. {params} -> ${stats['total_profit_usdt']:.2f}, {stats['total_trades']} trades, "
+              f"win {stats['win_rate']:.1f}%, max DD {stats['max_drawdown_pct']:.2f}%")
+
+def bench_rounding_command(args):
+    """CLI: time and check the tick/step quantizers against the previous precision/modulo rounding"""
+    api = BinanceFuturesAPI(CONFIG)
+    if not api.get_symbol_info(args.symbols[0] if args.symbols else "BTCUSDT"):
+        print("Symbol metadata unavailable (no stored index and exchangeInfo download failed)")
+        return
+    symbols = [s for s in (args.symbols or sorted(api.symbol_index.symbols)[:args.max_symbols]) if api.symbol_index.get(s)]
+    rng = np.random.default_rng(args.seed)
+
+    def legacy_round_step_size(quantity, step_size):
+        step_size_decimal = len(str(step_size).split('.')[1]) if '.' in str(step_size) else 0
+        return round(quantity - (quantity % float(step_size)), step_size_decimal)
+
+    def timed(fn):
+        started = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - started
+
+    totals = {}
+    def add(name, seconds, invalid):
+        entry = totals.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += invalid
+
+    for symbol in symbols:
+        info = api.symbol_index.get(symbol)
+        quantizer = api.symbol_index.get_quantizer(symbol)
+        price_array = quantizer._tick * rng.uniform(100, 1_000_000, args.n)
+        quantity_array = quantizer._step * rng.uniform(1, 100_000, args.n)
+        prices, quantities = price_array.tolist(), quantity_array.tolist() # Scalar paths get Python floats, as in the bot
+
+        def off_tick(values, step):
+            return sum(1 for v in values if Decimal(repr(float(v))) % step != 0)
+
+        result, seconds = timed(lambda: [round(p, info['pricePrecision']) for p in prices])
+        add("price: round(pricePrecision)", seconds, off_tick(result, quantizer.tick_size))
+        result, seconds = timed(lambda: [quantizer.price(p) for p in prices])
+        add("price: quantizer (Decimal)", seconds, off_tick(result, quantizer.tick_size))
+        expected = result
+        result, seconds = timed(lambda: quantizer.price_array(price_array))
+        add("price: quantizer.price_array", seconds, int(np.count_nonzero(result != np.array(expected))))
+
+        result, seconds = timed(lambda: [round(q, info['quantityPrecision']) for q in quantities])
+        add("qty: round(quantityPrecision)", seconds, off_tick(result, quantizer.step_size))
+        result, seconds = timed(lambda: [legacy_round_step_size(q, info['stepSize']) for q in quantities])
+        add("qty: float modulo round_step_size", seconds, off_tick(result, quantizer.step_size))
+        result, seconds = timed(lambda: [quantizer.quantity(q) for q in quantities])
+        add("qty: quantizer (Decimal)", seconds, off_tick(result, quantizer.step_size))
+        expected = result
+        result, seconds = timed(lambda: quantizer.quantity_array(quantity_array))
+        add("qty: quantizer.quantity_array", seconds, int(np.count_nonzero(result != np.array(expected))))
+
+    values = args.n * len(symbols)
+    print(f"{len(symbols)} symbols x {args.n} values")
+    print(f"{'method':<36}{'ns/value':>10}{'invalid':>10}")
+    for name, (seconds, invalid) in totals.items():
+        print(f"{name:<36}{seconds / values * 1e9:>10.0f}{invalid:>10}")
+    print("invalid = not a tickSize/stepSize multiple (array variants: differs from the Decimal result)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Binance Futures Trading Bot")
+    subparsers = parser.add_subparsers(dest="command")
+
+    download_parser = subparsers.add_parser("download", help="Download historical candles to disk")
+    download_parser.add_argument("--symbols", nargs="+", required=True, help="e.g. BTCUSDT ETHUSDT")
+    download_parser.add_argument("--timeframes", nargs="+", default=[INDICATOR_SETTINGS["candle_timeframe"]])
+    download_parser.add_argument("--start", required=True, help="UTC start date, e.g. 2024-01-01")
+    download_parser.add_argument("--end", help="UTC end date (default: now)")
+    download_parser.add_argument("--data-dir", help="Default: CONFIG['historical_data_dir']")
+    download_parser.add_argument("--workers", type=int, default=4, help="Series downloaded in parallel")
+    download_parser.set_defaults(handler=download_history_command)
+
+    backtest_parser = subparsers.add_parser("backtest", help="Backtest the signal rules on downloaded history")
+    backtest_parser.add_argument("--symbols", nargs="+", required=True)
+    backtest_parser.add_argument("--timeframe", default=INDICATOR_SETTINGS["candle_timeframe"])
+    backtest_parser.add_argument("--mode", choices=list(TRADING_MODES), default=CONFIG["trading_mode"])
+    backtest_parser.add_argument("--start", help="UTC start date (default: all stored history)")
+    backtest_parser.add_argument("--end", help="UTC end date")
+    backtest_parser.add_argument("--balance", type=float, default=1000.0, help="Starting balance in USDT")
+    backtest_parser.add_argument("--fee-pct", type=float, default=0.05, help="Fee per side in percent")
+    backtest_parser.add_argument("--data-dir", help="Default: CONFIG['historical_data_dir']")
+    backtest_parser.set_defaults(handler=backtest_command)
+
+    sweep_parser = subparsers.add_parser("sweep", help="Rank parameter combinations by backtest result")
+    sweep_parser.add_argument("--symbols", nargs="+", required=True)
+    sweep_parser.add_argument("--timeframe", default=INDICATOR_SETTINGS["candle_timeframe"])
+    sweep_parser.add_argument("--mode", choices=list(TRADING_MODES), default=CONFIG["trading_mode"],
+                              help="Trading mode providing the parameters that are not swept")
+    sweep_parser.add_argument("--param", action="append", required=True,
+                              help="name=v1,v2,... (repeatable), e.g. --param rsi_period=10,14 --param take_profit=0.5,1")
+    sweep_parser.add_argument("--random", type=int, help="Test this many random combinations instead of the full grid")
+    sweep_parser.add_argument("--seed", type=int, help="Random search seed")
+    sweep_parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    sweep_parser.add_argument("--start", help="UTC start date")
+    sweep_parser.add_argument("--end", help="UTC end date")
+    sweep_parser.add_argument("--balance", type=float, default=1000.0)
+    sweep_parser.add_argument("--fee-pct", type=float, default=0.05)
+    sweep_parser.add_argument("--output", default="sweep_results.csv")
+    sweep_parser.add_argument("--data-dir", help="Default: CONFIG['historical_data_dir']")
+    sweep_parser.set_defaults(handler=sweep_command)
+
+    bench_parser = subparsers.add_parser("bench-rounding", help="Benchmark price/quantity rounding against the symbol filters")
+    bench_parser.add_argument("--symbols", nargs="+", help="Default: the first --max-symbols indexed symbols")
+    bench_parser.add_argument("--max-symbols", type=int, default=20)
+    bench_parser.add_argument("-n", type=int, default=20000, help="Values per symbol")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.set_defaults(handler=bench_rounding_command)
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.command:
+        args.handler(args)
+        return
+
     token = TELEGRAM_BOT_TOKEN
     admin_ids = ADMIN_USER_IDS
     
@@ -3107,6 +7168,9 @@ def main():
     
     # Initialize the trading bot
     trading_bot = TradingBot(CONFIG, telegram_handler)
+    trading_bot.warm_candle_store()
+    # Pick up trades from before a restart before any new signal is acted on
+    trading_bot.open_journal()
     
     # Set the trading bot in the Telegram handler
     telegram_handler.set_trading_bot(trading_bot)
@@ -0,0 +1,66 @@
+import asyncio
+import importlib.util
+import os
+import threading
+
+import pytest
+import websockets
+
+BOT_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "binance-futures-bot.py")
+
+
+@pytest.fixture(scope="session")
+def bot():
+    """The bot script loaded as a module (its file name is not importable as is)"""
+    for module in ("pandas_ta", "telegram"):
+        pytest.importorskip(module)
+    spec = importlib.util.spec_from_file_location("binance_futures_bot", BOT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ReplayServer:
+    """
+    Local stand-in for a Binance WebSocket endpoint, served from its own event loop thread.
+
+    `handler(ws, connection_number)` is run for every client connection; `url` is the
+    ws:// base URL to hand to the stream under test.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = 0
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._server = None
+
+    async def _handle(self, ws):
+        self.connections += 1
+        await self.handler(ws, self.connections)
+
+    async def _start(self):
+        self._server = await websockets.serve(self._handle, "127.0.0.1", 0)
+        port = next(iter(self._server.sockets)).getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}"
+
+    async def _stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result(5)
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+
+
+@pytest.fixture
+def replay_server():
+    return ReplayServer
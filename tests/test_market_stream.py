@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+
+T0 = 1700000000000 # Open time of the first recorded 1m candle
+
+
+def kline_frame(symbol, open_time, o, h, l, c, v, closed):
+    """A combined-stream kline frame as Binance sends it"""
+    return json.dumps({
+        "stream": f"{symbol.lower()}@kline_1m",
+        "data": {
+            "e": "kline", "E": open_time + 1000, "s": symbol,
+            "k": {"t": open_time, "T": open_time + 59999, "s": symbol, "i": "1m",
+                  "o": str(o), "h": str(h), "l": str(l), "c": str(c), "v": str(v), "x": closed}
+        }
+    })
+
+
+RECORDED_FRAMES = {
+    "btcusdt@kline_1m": [
+        kline_frame("BTCUSDT", T0, 100, 101, 99, 100.5, 10, False),
+        kline_frame("BTCUSDT", T0, 100, 102, 99, 101.5, 12, True), # Same candle, amended and closed
+        kline_frame("BTCUSDT", T0 + 60000, 101.5, 101.6, 101.4, 101.5, 1, False),
+    ],
+    "ethusdt@kline_1m": [
+        kline_frame("ETHUSDT", T0, 10, 11, 9, 10.5, 5, True),
+    ],
+}
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+class RecordingHandler:
+    """Acknowledges (UN)SUBSCRIBE requests and replays the recorded frames of new streams"""
+
+    def __init__(self, close_first_connection=False):
+        self.close_first_connection = close_first_connection
+        self.requests = [] # (connection number, method, stream names)
+        self.connected_at = []
+
+    async def __call__(self, ws, connection):
+        self.connected_at.append(time.monotonic())
+        async for raw in ws:
+            request = json.loads(raw)
+            self.requests.append((connection, request["method"], sorted(request["params"])))
+            await ws.send(json.dumps({"result": None, "id": request["id"]}))
+            if request["method"] == "SUBSCRIBE":
+                for stream in request["params"]:
+                    for frame in RECORDED_FRAMES.get(stream, []):
+                        await ws.send(frame)
+                if self.close_first_connection and connection == 1:
+                    await asyncio.sleep(0.2)
+                    await ws.close()
+                    return
+
+
+def make_stream(bot, url, symbols, on_candle=None):
+    store = bot.CandleStore(binance_api=None, capacity=50)
+    stream = bot.MarketDataStream(
+        store, "1m", lambda: list(symbols), url, on_candle=on_candle,
+        reconnect_min_delay=0.2, reconnect_max_delay=1.0
+    )
+    return store, stream
+
+
+def test_kline_frames_are_upserted(bot, replay_server):
+    handler = RecordingHandler()
+    candles = []
+    with replay_server(handler) as server:
+        store, stream = make_stream(bot, server.url, ["BTCUSDT"], on_candle=lambda *args: candles.append(args))
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.messages_received == 3)
+        finally:
+            stream.stop()
+
+    series = store.get_series("BTCUSDT", "1m")
+    open_times, ohlcv = series.window()
+    assert open_times.tolist() == [T0, T0 + 60000]
+    assert ohlcv[:, 0].tolist() == [100, 102, 99, 101.5, 12] # The amended values replaced the first frame
+    assert candles == [
+        ("BTCUSDT", "1m", T0, False),
+        ("BTCUSDT", "1m", T0, True),
+        ("BTCUSDT", "1m", T0 + 60000, False),
+    ]
+    assert len(store.get_series("ETHUSDT", "1m")) == 0
+
+
+def test_reconnects_with_backoff_and_resubscribes(bot, replay_server):
+    handler = RecordingHandler(close_first_connection=True)
+    with replay_server(handler) as server:
+        store, stream = make_stream(bot, server.url, ["BTCUSDT"])
+        stream.start()
+        try:
+            assert wait_until(lambda: server.connections >= 2 and stream.connected and len(handler.requests) >= 2)
+        finally:
+            stream.stop()
+
+    assert stream.reconnects >= 1
+    assert handler.requests[:2] == [
+        (1, "SUBSCRIBE", ["btcusdt@kline_1m"]),
+        (2, "SUBSCRIBE", ["btcusdt@kline_1m"]),
+    ]
+    # Jittered backoff: reconnect_min_delay * (0.5 .. 1.5)
+    assert handler.connected_at[1] - handler.connected_at[0] >= 0.1
+    # The replayed candles are upserted, not appended twice
+    assert store.get_series("BTCUSDT", "1m").window()[0].tolist() == [T0, T0 + 60000]
+
+
+def test_follows_trading_pairs_changes(bot, replay_server):
+    handler = RecordingHandler()
+    symbols = ["BTCUSDT"]
+    with replay_server(handler) as server:
+        store, stream = make_stream(bot, server.url, symbols)
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.messages_received == 3)
+            symbols[:] = ["ETHUSDT"]
+            assert wait_until(lambda: stream.subscribed == {"ethusdt@kline_1m"} and stream.messages_received == 4)
+            assert not store.get_series("BTCUSDT", "1m").streaming
+            assert store.get_series("ETHUSDT", "1m").streaming
+        finally:
+            stream.stop()
+
+    assert handler.requests == [
+        (1, "SUBSCRIBE", ["btcusdt@kline_1m"]),
+        (1, "UNSUBSCRIBE", ["btcusdt@kline_1m"]),
+        (1, "SUBSCRIBE", ["ethusdt@kline_1m"]),
+    ]
+    assert store.get_series("ETHUSDT", "1m").window()[0].tolist() == [T0]
+
+
+def test_first_frame_after_subscribing_drops_a_stale_candle(bot, replay_server):
+    handler = RecordingHandler()
+    with replay_server(handler) as server:
+        store, stream = make_stream(bot, server.url, ["BTCUSDT", "ETHUSDT"])
+        # BTC: the stored candle closed while we weren't subscribed, its close is unfinalised
+        store.update("BTCUSDT", "1m", [T0 - 60000], [[99], [100], [98], [99.5], [3]])
+        # ETH: the newest stored candle is the one the first frame amends, history is kept
+        store.update("ETHUSDT", "1m", [T0 - 60000, T0], [[9, 10], [10, 10.2], [8, 9.8], [10, 10.1], [4, 1]])
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.messages_received == 4)
+        finally:
+            stream.stop()
+
+    # Cleared, so CandleStore.refresh() reloads the window over REST
+    assert store.get_series("BTCUSDT", "1m").window()[0].tolist() == [T0, T0 + 60000]
+    open_times, ohlcv = store.get_series("ETHUSDT", "1m").window()
+    assert open_times.tolist() == [T0 - 60000, T0]
+    assert ohlcv[:, 1].tolist() == [10, 11, 9, 10.5, 5]
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+
+# The stand-in exchange clock runs an hour behind ours: events must be judged by Binance's time
+SERVER_TIME = int(time.time() * 1000) - 3600 * 1000
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+class FakeBinanceAPI:
+    """REST side of the user data stream: listenKeys, server time and the account snapshot"""
+
+    def __init__(self):
+        self.listen_keys = []
+        self.closed_keys = 0
+
+    def create_listen_key(self):
+        self.listen_keys.append(f"key-{len(self.listen_keys) + 1}")
+        return self.listen_keys[-1]
+
+    def keepalive_listen_key(self):
+        return True
+
+    def close_listen_key(self):
+        self.closed_keys += 1
+        return True
+
+    def get_server_time(self):
+        return SERVER_TIME
+
+    def get_account_info(self):
+        return {
+            'assets': [{'asset': 'USDT', 'walletBalance': '1000', 'crossWalletBalance': '1000',
+                        'availableBalance': '900', 'unrealizedProfit': '0'}],
+            'positions': [{'symbol': 'BTCUSDT', 'positionSide': 'LONG', 'positionAmt': '0',
+                           'entryPrice': '0', 'unrealizedProfit': '0', 'leverage': '10'}]
+        }
+
+    def get_open_orders(self):
+        return [{'symbol': 'BTCUSDT', 'orderId': 1, 'status': 'NEW', 'type': 'TAKE_PROFIT_MARKET'}]
+
+
+def order_update(order_id, status, event_time, executed='0', avg_price='0'):
+    return json.dumps({
+        'e': 'ORDER_TRADE_UPDATE', 'E': event_time, 'T': event_time,
+        'o': {'s': 'BTCUSDT', 'c': f'client-{order_id}', 'S': 'BUY', 'o': 'MARKET', 'f': 'GTC',
+              'q': '0.01', 'p': '0', 'ap': avg_price, 'sp': '0', 'x': 'TRADE', 'X': status,
+              'i': order_id, 'z': executed, 'ps': 'LONG', 'R': False}
+    })
+
+
+def account_update(event_time, wallet, position_amt, entry_price):
+    return json.dumps({
+        'e': 'ACCOUNT_UPDATE', 'E': event_time, 'T': event_time,
+        'a': {'m': 'ORDER',
+              'B': [{'a': 'USDT', 'wb': wallet, 'cw': wallet, 'bc': '0'}],
+              'P': [{'s': 'BTCUSDT', 'pa': position_amt, 'ep': entry_price, 'up': '0',
+                     'mt': 'cross', 'iw': '0', 'ps': 'LONG'}]}
+    })
+
+
+# Recorded frames of a market entry, as delivered right after connecting
+RECORDED_FRAMES = [
+    account_update(SERVER_TIME - 5000, '990', '5', '40000'), # Already part of the snapshot
+    order_update(2, 'NEW', SERVER_TIME + 100),
+    order_update(2, 'FILLED', SERVER_TIME + 120, executed='0.01', avg_price='50000'),
+    account_update(SERVER_TIME + 121, '999.9', '0.01', '50000'),
+]
+
+
+class UserStreamHandler:
+    def __init__(self, frames_by_connection):
+        self.frames_by_connection = frames_by_connection
+        self.paths = []
+
+    async def __call__(self, ws, connection):
+        self.paths.append(ws.request.path)
+        for frame in self.frames_by_connection.get(connection, []):
+            await ws.send(frame)
+        await ws.wait_closed()
+
+
+def make_stream(bot, url, api, on_order_update=None):
+    mirror = bot.AccountStateMirror()
+    stream = bot.UserDataStream(
+        api, mirror, url, on_order_update=on_order_update,
+        reconnect_min_delay=0.2, reconnect_max_delay=1.0
+    )
+    return mirror, stream
+
+
+def test_mirror_follows_recorded_events(bot, replay_server):
+    api = FakeBinanceAPI()
+    filled = []
+    filled_event = threading.Event()
+
+    def on_order_update(order):
+        if order['status'] == 'FILLED':
+            filled.append(order)
+            filled_event.set()
+
+    with replay_server(UserStreamHandler({1: RECORDED_FRAMES})) as server:
+        mirror, stream = make_stream(bot, server.url, api, on_order_update)
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.messages_received == len(RECORDED_FRAMES))
+            assert filled_event.wait(5)
+
+            assert mirror.snapshot_time == SERVER_TIME
+            assert mirror.events_applied == 3 # The pre-snapshot ACCOUNT_UPDATE is skipped
+            balance = mirror.get_balance()
+            assert balance['total'] == 999.9
+            # 900 available, -0.1 wallet change, -50 initial margin (0.01 * 50000 / 10x)
+            assert abs(balance['available'] - 849.9) < 1e-9
+            positions = mirror.get_open_positions()
+            assert [(p['symbol'], p['positionSide'], p['positionAmt'], p['entryPrice']) for p in positions] == [
+                ('BTCUSDT', 'LONG', '0.01', '50000')
+            ]
+            assert mirror.get_position_amounts()[('BTCUSDT', 'LONG')] == 0.01
+            assert mirror.get_open_order_ids() == {1}
+            assert filled[0]['orderId'] == 2 and filled[0]['avgPrice'] == '50000'
+        finally:
+            stream.stop()
+
+    assert api.closed_keys == 1
+    assert mirror.get_balance() is None # Not synced once the stream is gone
+
+
+def test_reconnects_with_a_new_key_when_the_listen_key_expires(bot, replay_server):
+    api = FakeBinanceAPI()
+    expired = json.dumps({'e': 'listenKeyExpired', 'E': SERVER_TIME + 1})
+    handler = UserStreamHandler({1: [expired], 2: [order_update(3, 'NEW', SERVER_TIME + 200)]})
+    with replay_server(handler) as server:
+        mirror, stream = make_stream(bot, server.url, api)
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.connected and mirror.get_open_order_ids() == {1, 3})
+        finally:
+            stream.stop()
+
+    assert handler.paths == ['/ws/key-1', '/ws/key-2']
+    assert stream.reconnects == 1